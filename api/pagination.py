@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from blog.pagination import CursorPaginator, DEFAULT_ORDERING
+from users.follows import FOLLOW_ORDERING
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on ``ordering`` (``(date_posted, id)`` by
+    default). Unlike PageNumberPagination it never issues a COUNT(*) and
+    deep pages cost the same as the first one.
+    """
+    page_size = 20
+    ordering = DEFAULT_ORDERING
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = CursorPaginator(queryset, self.page_size, self.ordering)
+        self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class NotificationPagination(KeysetPagination):
+    ordering = ('-date', '-id')
+
+
+class FollowPagination(KeysetPagination):
+    page_size = 50
+    ordering = FOLLOW_ORDERING
@@ -27,13 +27,14 @@ class ProfileSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Profile
-        fields = ['id', 'user', 'bio', 'image', 'favorites']
+        fields = ['id', 'user', 'bio', 'image', 'followers_count', 'following_count']
+        read_only_fields = ['followers_count', 'following_count']
 
 
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
     
     class Meta:
@@ -41,13 +42,10 @@ class PostSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'content', 'date_posted', 'author', 'likes_count', 'comments_count', 'is_liked']
         read_only_fields = ['id', 'date_posted', 'author']
     
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
-    
     def get_is_liked(self, obj):
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.id in liked_post_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.likes.filter(id=request.user.id).exists()
@@ -98,6 +96,8 @@ class ChatSerializer(serializers.ModelSerializer):
 
 
 class RoomSerializer(serializers.ModelSerializer):
+    # the room's primary key is room_id
+    id = serializers.IntegerField(source='room_id', read_only=True)
     author = UserSerializer(read_only=True)
     friend = UserSerializer(read_only=True)
     last_message = serializers.SerializerMethodField()
@@ -108,7 +108,11 @@ class RoomSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created']
     
     def get_last_message(self, obj):
-        last_chat = obj.chats.last()
+        # ChatViewSet.rooms prefetches it as last_chats
+        if hasattr(obj, 'last_chats'):
+            last_chat = obj.last_chats[0] if obj.last_chats else None
+        else:
+            last_chat = obj.chats.select_related('author').last()
         if last_chat:
             return {
                 'text': last_chat.text,
@@ -125,5 +129,6 @@ class NotificationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Notification
-        fields = ['id', 'post', 'sender', 'user', 'notification_type', 'text_preview', 'date', 'is_seen']
-        read_only_fields = ['id', 'date']
+        fields = ['id', 'post', 'sender', 'user', 'notification_type', 'text_preview', 'date', 'is_seen',
+                  'actor_count', 'recent_actors']
+        read_only_fields = ['id', 'date', 'actor_count', 'recent_actors']
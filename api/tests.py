@@ -0,0 +1,109 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from blog.models import Post
+from chat.models import Chat, Room
+from friend.models import befriend
+
+
+class PostViewSetQueryCountTest(TestCase):
+    """ Listing posts must cost a constant number of queries, whatever the page size """
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.author = User.objects.create_user('author', password='secret')
+        befriend(self.user.pk, self.author.pk)
+        self.client.login(username='reader', password='secret')
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(title=f'post {i}', content='body', author=self.author)
+            if i % 2:
+                post.add_like(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.json()['results']
+
+    def test_list_queries_independent_of_page_size(self):
+        self.create_posts(2)
+        small, results = self.count_queries('/api/posts/')
+        self.assertEqual(len(results), 2)
+
+        self.create_posts(18)
+        large, results = self.count_queries('/api/posts/')
+        self.assertEqual(len(results), 20)
+        self.assertEqual(small, large)
+
+    def test_feed_queries_independent_of_page_size(self):
+        self.create_posts(2)
+        small, _ = self.count_queries('/api/posts/feed/')
+        self.create_posts(18)
+        large, results = self.count_queries('/api/posts/feed/')
+        self.assertEqual(len(results), 20)
+        self.assertEqual(small, large)
+
+    def test_is_liked_and_counts(self):
+        self.create_posts(4)
+        _, results = self.count_queries('/api/posts/')
+        by_title = {post['title']: post for post in results}
+        self.assertTrue(by_title['post 1']['is_liked'])
+        self.assertFalse(by_title['post 0']['is_liked'])
+        self.assertEqual(by_title['post 3']['likes_count'], 1)
+
+
+class ChatViewSetQueryCountTest(TestCase):
+    """ Rooms come with their newest message, message lists with both users, in a constant number of queries """
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client.login(username='reader', password='secret')
+        self.rooms = []
+
+    def create_rooms(self, count):
+        for i in range(count):
+            friend = User.objects.create_user(f'friend{len(self.rooms)}')
+            room = Room.objects.create(author=self.user, friend=friend)
+            for text in ('first', 'second', f'last {len(self.rooms)}'):
+                Chat.objects.create(room_id=room, author=friend, friend=self.user, text=text)
+            self.rooms.append(room)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response.json()
+
+    def test_rooms_come_with_their_last_message(self):
+        self.create_rooms(1)
+        small, _ = self.get('/api/chats/rooms/')
+        self.create_rooms(4)
+        Room.objects.create(author=User.objects.create_user('quiet'), friend=self.user)
+        large, rooms = self.get('/api/chats/rooms/')
+        self.assertEqual(small, large)
+        last_messages = {room['id']: room['last_message'] for room in rooms}
+        for i, room in enumerate(self.rooms):
+            self.assertEqual(last_messages[room.pk]['text'], f'last {i}')
+            self.assertEqual(last_messages[room.pk]['author'], room.friend.username)
+        self.assertIsNone(rooms[0]['last_message'])
+
+    def test_messages_and_list_queries_independent_of_length(self):
+        self.create_rooms(1)
+        room = self.rooms[0]
+        small, _ = self.get(f'/api/chats/{room.pk}/messages/')
+        small_list, _ = self.get('/api/chats/')
+        for i in range(10):
+            Chat.objects.create(room_id=room, author=self.user, friend=room.friend, text=f'more {i}')
+        large, messages = self.get(f'/api/chats/{room.pk}/messages/')
+        large_list, _ = self.get('/api/chats/')
+        self.assertEqual((small, small_list), (large, large_list))
+        self.assertEqual(len(messages), 13)
+        self.assertEqual(messages[-1]['author']['username'], 'reader')
+
+    def test_messages_of_someone_elses_room(self):
+        others = Room.objects.create(author=User.objects.create_user('a'), friend=User.objects.create_user('b'))
+        response = self.client.get(f'/api/chats/{others.pk}/messages/')
+        self.assertEqual(response.status_code, 403)
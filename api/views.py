@@ -4,17 +4,22 @@ from rest_framework.response import Response
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import OuterRef, Prefetch, Q, Subquery
+from .pagination import FollowPagination, KeysetPagination, NotificationPagination
 from .serializers import (
     UserSerializer, ProfileSerializer, PostSerializer, CommentSerializer,
     FriendRequestSerializer, FriendListSerializer,
     ChatSerializer, RoomSerializer, NotificationSerializer
 )
 from blog.models import Post, Comment
+from users import follows
 from users.models import Profile
-from friend.models import FriendRequest, FriendList
+from friend.models import FriendRequest, friends_of
+from chat.history import HISTORY_ORDERING
 from chat.models import Room, Chat
 from notification.models import Notification
+from notification.services import notify, retract
+from notification.unread import mark_all_seen, mark_seen, unread_count
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -34,6 +39,37 @@ class UserViewSet(viewsets.ModelViewSet):
         except Profile.DoesNotExist:
             return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
     
+    def follow_page(self, rows, user_of):
+        paginator = FollowPagination()
+        page = paginator.paginate_queryset(rows, self.request, view=self)
+        serializer = self.get_serializer([user_of(row) for row in page], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def followers(self, request, pk=None):
+        """Users following this user, newest first"""
+        user = self.get_object()
+        return self.follow_page(follows.followers(user.pk), lambda row: row.profile.user)
+
+    @action(detail=True, methods=['get'])
+    def following(self, request, pk=None):
+        """Users this user follows, newest first"""
+        user = self.get_object()
+        return self.follow_page(follows.following(user.pk), lambda row: row.user)
+
+    @action(detail=True, methods=['post', 'delete'])
+    def follow(self, request, pk=None):
+        """Follow (POST) or unfollow (DELETE) this user; repeating either is a no-op"""
+        user = self.get_object()
+        if user == request.user:
+            return Response({'error': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.method == 'POST':
+            if follows.follow(request.user.profile, user.pk):
+                notify(user.pk, request.user, 2)
+        elif follows.unfollow(request.user.profile, user.pk):
+            retract(user.pk, request.user, 2)
+        return Response({'following': request.method == 'POST'})
+
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Get current user info"""
@@ -58,9 +94,36 @@ class UserViewSet(viewsets.ModelViewSet):
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all().order_by('-date_posted')
     serializer_class = PostSerializer
+    pagination_class = KeysetPagination
     authentication_classes = [SessionAuthentication, TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_queryset(self):
+        return Post.objects.select_related('author__profile').order_by('-date_posted')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['liked_post_ids'] = getattr(self, 'liked_post_ids', None)
+        return context
+    
+    def serialize_posts(self, posts):
+        """Serialize a page of posts, resolving is_liked for all of them in one query"""
+        posts = list(posts)
+        self.liked_post_ids = set(
+            Post.likes.through.objects.filter(
+                user_id=self.request.user.id,
+                post_id__in=[post.id for post in posts]
+            ).values_list('post_id', flat=True)
+        )
+        return self.get_serializer(posts, many=True).data
+    
+    def list(self, request, *args, **kwargs):
+        posts = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(posts)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_posts(page))
+        return Response(self.serialize_posts(posts))
+    
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
     
@@ -70,10 +133,9 @@ class PostViewSet(viewsets.ModelViewSet):
         post = self.get_object()
         user = request.user
         
-        if post.likes.filter(id=user.id).exists():
-            post.likes.remove(user)
+        if post.remove_like(user):
             return Response({'liked': False})
-        post.likes.add(user)
+        post.add_like(user)
         return Response({'liked': True})
     
     @action(detail=True, methods=['post'])
@@ -87,8 +149,8 @@ class PostViewSet(viewsets.ModelViewSet):
         
         comment = Comment.objects.create(
             post=post,
-            author=request.user,
-            content=content
+            name=request.user,
+            body=content
         )
         
         serializer = CommentSerializer(comment, context={'request': request})
@@ -98,7 +160,7 @@ class PostViewSet(viewsets.ModelViewSet):
     def comments(self, request, pk=None):
         """Get post comments"""
         post = self.get_object()
-        comments = post.comments.all().order_by('date_added')
+        comments = post.comments.select_related('name__profile').order_by('date_added')
         serializer = CommentSerializer(comments, many=True, context={'request': request})
         return Response(serializer.data)
     
@@ -107,21 +169,15 @@ class PostViewSet(viewsets.ModelViewSet):
         """Get user's feed"""
         user = request.user
         # Get posts from user and friends
-        friends = FriendList.objects.filter(user=user).first()
-        if friends:
-            friend_ids = [friend.id for friend in friends.friends.all()]
-            friend_ids.append(user.id)
-            posts = Post.objects.filter(author__id__in=friend_ids).order_by('-date_posted')
-        else:
-            posts = Post.objects.filter(author=user).order_by('-date_posted')
+        posts = self.get_queryset().filter(
+            Q(author_id=user.id) | Q(author_id__in=friends_of(user.id).values('pk'))
+        )
         
         page = self.paginate_queryset(posts)
         if page is not None:
-            serializer = self.get_serializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(self.serialize_posts(page))
         
-        serializer = self.get_serializer(posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(self.serialize_posts(posts))
 
 
 class FriendRequestViewSet(viewsets.ModelViewSet):
@@ -147,16 +203,8 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
         if friend_request.receiver != request.user:
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Add to friend list
-        sender_list, _ = FriendList.objects.get_or_create(user=friend_request.sender)
-        receiver_list, _ = FriendList.objects.get_or_create(user=friend_request.receiver)
-        
-        sender_list.friends.add(friend_request.receiver)
-        receiver_list.friends.add(friend_request.sender)
-        
-        # Deactivate request
-        friend_request.is_active = False
-        friend_request.save()
+        # Add the friendship and deactivate the request
+        friend_request.accept()
         
         return Response({'message': 'Friend request accepted'})
     
@@ -184,7 +232,7 @@ class ChatViewSet(viewsets.ModelViewSet):
         """Filter chats for current user"""
         return Chat.objects.filter(
             Q(author=self.request.user) | Q(friend=self.request.user)
-        )
+        ).select_related('author__profile', 'friend__profile').order_by(*HISTORY_ORDERING)
     
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -192,8 +240,13 @@ class ChatViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def rooms(self, request):
         """Get user's chat rooms"""
+        # the newest message of every room, fetched for the whole page in one query
+        newest = Chat.objects.filter(room_id=OuterRef('room_id')).order_by(*HISTORY_ORDERING).values('pk')[:1]
+        last_chats = Chat.objects.filter(pk=Subquery(newest)).select_related('author')
         rooms = Room.objects.filter(
             Q(author=request.user) | Q(friend=request.user)
+        ).select_related('author__profile', 'friend__profile').prefetch_related(
+            Prefetch('chats', queryset=last_chats, to_attr='last_chats')
         ).order_by('-created')
         
         serializer = RoomSerializer(rooms, many=True, context={'request': request})
@@ -204,10 +257,10 @@ class ChatViewSet(viewsets.ModelViewSet):
         """Get messages from a room"""
         room = get_object_or_404(Room, pk=pk)
         
-        if room.author != request.user and room.friend != request.user:
+        if request.user.pk not in (room.author_id, room.friend_id):
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
         
-        messages = room.chats.all().order_by('date')
+        messages = room.chats.select_related('author__profile', 'friend__profile').order_by('date')
         serializer = ChatSerializer(messages, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -215,29 +268,46 @@ class ChatViewSet(viewsets.ModelViewSet):
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    pagination_class = NotificationPagination
     authentication_classes = [SessionAuthentication, TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         """Filter notifications for current user"""
-        return Notification.objects.filter(user=self.request.user).order_by('-date')
+        return Notification.objects.filter(user=self.request.user).select_related(
+            'sender__profile', 'user__profile', 'post__author__profile'
+        ).order_by('-date')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['liked_post_ids'] = getattr(self, 'liked_post_ids', None)
+        return context
+    
+    def list(self, request, *args, **kwargs):
+        notifications = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        post_ids = [n.post_id for n in notifications if n.post_id]
+        self.liked_post_ids = set(
+            Post.likes.through.objects.filter(
+                user_id=request.user.id, post_id__in=post_ids
+            ).values_list('post_id', flat=True)
+        ) if post_ids else set()
+        serializer = self.get_serializer(notifications, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def mark_seen(self, request, pk=None):
         """Mark notification as seen"""
         notification = self.get_object()
-        notification.is_seen = True
-        notification.save()
+        mark_seen(notification)
         return Response({'message': 'Notification marked as seen'})
     
     @action(detail=False, methods=['post'])
     def mark_all_seen(self, request):
         """Mark all notifications as seen"""
-        self.get_queryset().update(is_seen=True)
+        mark_all_seen(request.user.id)
         return Response({'message': 'All notifications marked as seen'})
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get count of unread notifications"""
-        count = self.get_queryset().filter(is_seen=False).count()
-        return Response({'unread_count': count})
+        return Response({'unread_count': unread_count(request.user.id)})
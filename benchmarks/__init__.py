@@ -0,0 +1,24 @@
+"""
+Query-count / latency / memory regression benchmarks for SocialSphere.
+
+The suite seeds a synthetic social graph, requests every URL of the
+blog, users, friend, chat, notification and api url modules, and compares
+the per-endpoint numbers against ``benchmarks/baseline.json``.
+
+    python -m benchmarks                 # compare against the baseline
+    python -m benchmarks --update        # record a new baseline
+    python -m benchmarks --users 200     # bigger graph (numbers are not compared)
+
+Channel layer fan-out throughput (in-memory vs. the sharded Redis layer on
+fake nodes, or on real ones with ``--hosts``):
+
+    python -m benchmarks.fanout --shards 3 --groups 20 --members 10
+
+Search backend latency on a synthetic corpus (table scan vs. the local
+index, add ``elasticsearch`` when a cluster is running):
+
+    python -m benchmarks.search --posts 20000 --backends database,local,elasticsearch
+
+``benchmarks/tests.py`` runs the query-count part of the comparison as a
+regular Django test so N+1 regressions fail ``manage.py test``.
+"""
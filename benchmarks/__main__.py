@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+
+def main():
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from benchmarks.endpoints import uncovered
+    from benchmarks.runner import BASELINE_PATH, compare, load_baseline, ok_status, run_suite, save_baseline
+    from benchmarks.seed import DEFAULT_CONFIG
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Per-endpoint query/time/memory benchmarks')
+    parser.add_argument('--update', action='store_true', help='record the status and query counts as the new baseline')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH))
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per endpoint (median is kept)')
+    parser.add_argument('--queries-only', action='store_true',
+                        help='only compare query counts, when the baseline is a full --output file')
+    parser.add_argument('--output', help='also write the full results, timings included, to this JSON file')
+    for key, value in DEFAULT_CONFIG.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=int, default=value)
+    args = parser.parse_args()
+
+    seed_options = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        results = run_suite(repeat=args.repeat, **seed_options)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    width = max(len(name) for name in results['endpoints'])
+    print(f'{"endpoint":<{width}}  status  queries   wall_ms   peak_kb')
+    for name, m in sorted(results['endpoints'].items()):
+        print(f'{name:<{width}}  {m["status"]:>6}  {m["queries"]:>7}  {m["wall_ms"]:>8.2f}  {m["peak_kb"]:>8.1f}')
+
+    if args.output:
+        save_baseline(results, args.output, fields=None)
+
+    if args.update:
+        failed = sorted(name for name, m in results['endpoints'].items() if not ok_status(m['status']))
+        if failed:
+            print('\nNot recording a baseline with failing endpoints: ' + ', '.join(failed))
+            return 1
+        save_baseline(results, args.baseline)
+        print(f'\nBaseline written to {args.baseline}')
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline['config'] != results['config']:
+        print('\nSeed configuration differs from the baseline, not comparing.')
+        return 0
+
+    # the committed baseline has query counts only, a full --output file has timings too
+    metrics = ('queries',) if args.queries_only else None
+    problems = compare(results, baseline, metrics=metrics)
+    missing = uncovered(results['endpoints'])
+    problems += [f'{name}: route has no benchmark entry' for name in missing]
+    if problems:
+        print('\nRegressions:')
+        for problem in problems:
+            print('  ' + problem)
+        return 1
+    print('\nNo regressions.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import json
+from collections import namedtuple
+from importlib import import_module
+from django.urls import URLPattern, URLResolver, reverse
+
+
+# url modules under benchmark and the namespace they are included with
+URLCONFS = [
+    ('blog.urls', ''),
+    ('users.urls', ''),
+    ('friend.urls', 'friend:'),
+    ('chat.urls', ''),
+    ('notification.urls', ''),
+    ('api.urls', 'api:'),
+]
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+Endpoint = namedtuple('Endpoint', ['name', 'method', 'path', 'data', 'extra'])
+
+
+def endpoint(name, method='get', args=None, kwargs=None, data=None, query='', **extra):
+    path = reverse(name, args=args, kwargs=kwargs) + query
+    return Endpoint(name, method, path, data, extra)
+
+
+def url_names():
+    """ Every named route of the benchmarked url modules """
+    names = set()
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                # the api includes DRF's login/logout views, which are not ours
+                if pattern.namespace != 'rest_framework':
+                    walk(pattern.url_patterns, prefix)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                names.add(prefix + pattern.name)
+
+    for module, prefix in URLCONFS:
+        walk(import_module(module).urlpatterns, prefix)
+    return names
+
+
+def build_endpoints(data):
+    """ The request issued for every route, using objects created by seed_graph() """
+    viewer, friend = data.viewer, data.friend
+    post, comment, room = data.post, data.comment, data.room
+    api = 'api:'
+    return [
+        # blog
+        endpoint('firsthome'),
+        endpoint('blog-home'),
+        endpoint('posts-follow-view'),
+        endpoint('user-posts', kwargs={'username': friend.username}),
+        endpoint('post-detail', kwargs={'pk': post.pk}),
+        endpoint('post-update', kwargs={'pk': data.viewer_post.pk}),
+        endpoint('post-delete', kwargs={'pk': data.viewer_post.pk}),
+        endpoint('post-create'),
+        endpoint('post-like', 'post', data={'id': post.pk}, **AJAX),
+        endpoint('all-like'),
+        endpoint('post-save', 'post', data={'id': post.pk}, **AJAX),
+        endpoint('all-save'),
+        endpoint('comment-like', 'post', data={'id': comment.pk}, **AJAX),
+        endpoint('comment-replies', kwargs={'pk': comment.pk}),
+        endpoint('blog-about'),
+        endpoint('search', query='?query=post'),
+        endpoint('dashboard'),
+        endpoint('dashboard-stats'),
+        # users
+        endpoint('profile-list-view'),
+        endpoint('follow-unfollow-view', 'post', data={'profile_pk': data.stranger.profile.pk}, HTTP_REFERER='/'),
+        endpoint('profile-detail-view', kwargs={'pk': friend.profile.pk}),
+        endpoint('public-profile', kwargs={'username': friend.username}),
+        endpoint('profile-followers', kwargs={'pk': friend.profile.pk}),
+        endpoint('profile-following', kwargs={'pk': viewer.profile.pk}),
+        # friend
+        endpoint('friend:list', kwargs={'user_id': viewer.pk}),
+        endpoint('friend:friend-request', 'post', data={'receiver_user_id': data.stranger.pk}),
+        endpoint('friend:friend-requests', kwargs={'user_id': viewer.pk}),
+        endpoint('friend:friend-request-accept', kwargs={'friend_request_id': data.incoming_request.pk}),
+        endpoint('friend:remove-friend', 'post', data={'receiver_user_id': friend.pk}),
+        endpoint('friend:friend-request-decline', kwargs={'friend_request_id': data.incoming_request.pk}),
+        endpoint('friend:friend-request-cancel', 'post', data={'receiver_user_id': data.requested.pk}),
+        # chat
+        endpoint('room-enroll'),
+        endpoint('room-choice', kwargs={'friend_id': friend.pk}),
+        endpoint('room', kwargs={'room_name': room.pk, 'friend_id': friend.pk}),
+        endpoint('room-history', kwargs={'room_name': room.pk}),
+        # notification
+        endpoint('show-notifications'),
+        endpoint('mark-notification-read', 'post', data=json.dumps({'notification_id': data.notification.pk}),
+                 content_type='application/json'),
+        endpoint('mark-all-notifications-read', 'post'),
+        endpoint('get-unread-count'),
+        # api
+        endpoint(api + 'api-root'),
+        endpoint(api + 'user-list'),
+        endpoint(api + 'user-me'),
+        endpoint(api + 'user-search', query='?q=bench'),
+        endpoint(api + 'user-detail', kwargs={'pk': friend.pk}),
+        endpoint(api + 'user-profile', kwargs={'pk': friend.pk}),
+        endpoint(api + 'user-followers', kwargs={'pk': friend.pk}),
+        endpoint(api + 'user-following', kwargs={'pk': viewer.pk}),
+        endpoint(api + 'user-follow', 'post', kwargs={'pk': data.stranger.pk}),
+        endpoint(api + 'post-list'),
+        endpoint(api + 'post-feed'),
+        endpoint(api + 'post-detail', kwargs={'pk': post.pk}),
+        endpoint(api + 'post-like', 'post', kwargs={'pk': post.pk}),
+        endpoint(api + 'post-comment', 'post', kwargs={'pk': post.pk}, data={'content': 'benchmark'}),
+        endpoint(api + 'post-comments', kwargs={'pk': post.pk}),
+        endpoint(api + 'friend-request-list'),
+        endpoint(api + 'friend-request-detail', kwargs={'pk': data.incoming_request.pk}),
+        endpoint(api + 'friend-request-accept', 'post', kwargs={'pk': data.incoming_request.pk}),
+        endpoint(api + 'friend-request-decline', 'post', kwargs={'pk': data.incoming_request.pk}),
+        endpoint(api + 'chat-list'),
+        endpoint(api + 'chat-rooms'),
+        endpoint(api + 'chat-detail', kwargs={'pk': data.chat.pk}),
+        endpoint(api + 'chat-messages', kwargs={'pk': room.pk}),
+        endpoint(api + 'notification-list'),
+        endpoint(api + 'notification-detail', kwargs={'pk': data.notification.pk}),
+        endpoint(api + 'notification-mark-seen', 'post', kwargs={'pk': data.notification.pk}),
+        endpoint(api + 'notification-mark-all-seen', 'post'),
+        endpoint(api + 'notification-unread-count'),
+    ]
+
+
+def uncovered(names):
+    """ Routes that exist but have no entry in the endpoint table """
+    return sorted(url_names() - set(names))
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+
+async def measure_fanout(layer, groups=20, members=10, messages=20):
+    """
+    Add ``members`` channels to each of ``groups`` groups, group_send
+    ``messages`` messages to every group and wait until every member has
+    received all of them. Returns the delivered count and the rate.
+    """
+    channels = {}
+    for g in range(groups):
+        group = f'chat_{g}'
+        channels[group] = [await layer.new_channel() for _ in range(members)]
+        for channel in channels[group]:
+            await layer.group_add(group, channel)
+
+    async def drain(channel):
+        for _ in range(messages):
+            await layer.receive(channel)
+
+    start = time.perf_counter()
+    receivers = [asyncio.ensure_future(drain(c)) for names in channels.values() for c in names]
+    for i in range(messages):
+        await asyncio.gather(*(layer.group_send(group, {'type': 'chatroom_message', 'message': str(i)})
+                               for group in channels))
+    await asyncio.gather(*receivers)
+    elapsed = time.perf_counter() - start
+
+    delivered = groups * members * messages
+    await layer.flush()
+    if hasattr(layer, 'close'):
+        await layer.close()
+    return {'delivered': delivered, 'seconds': round(elapsed, 3), 'per_second': round(delivered / elapsed)}
+
+
+def main():
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from channels.layers import InMemoryChannelLayer
+    from myproject.layers import FakeRedisServer, ShardedChannelLayer
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.fanout', description='Channel layer fan-out throughput')
+    parser.add_argument('--shards', type=int, default=3, help='fake Redis nodes to start')
+    parser.add_argument('--hosts', help='comma separated host:port list of real nodes instead of fake ones')
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--messages', type=int, default=20)
+    args = parser.parse_args()
+
+    servers = []
+    if args.hosts:
+        hosts = args.hosts.split(',')
+    else:
+        servers = [FakeRedisServer().start_in_thread() for _ in range(args.shards)]
+        hosts = [server.address for server in servers]
+    # the channels of a process share one queue on the sharded layer, which may
+    # hold every message of the run before the receivers catch up
+    capacity = max(args.groups * args.members * args.messages, 100)
+
+    try:
+        for name, layer in [('in-memory', InMemoryChannelLayer(capacity=capacity)),
+                            (f'sharded x{len(hosts)}', ShardedChannelLayer(hosts=hosts, capacity=capacity))]:
+            result = asyncio.run(measure_fanout(layer, args.groups, args.members, args.messages))
+            print(f'{name:<12} {result["delivered"]:>8} messages  {result["seconds"]:>8.3f}s  {result["per_second"]:>8}/s')
+    finally:
+        for server in servers:
+            server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from .endpoints import build_endpoints
+from .seed import seed_graph
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+# timings and memory vary from machine to machine, the committed baseline only keeps these
+BASELINE_FIELDS = ('status', 'queries')
+
+# A metric regresses when current > baseline * (1 + relative) + absolute
+DEFAULT_THRESHOLDS = {
+    'queries': (0.0, 0),
+    'wall_ms': (0.5, 5.0),
+    'peak_kb': (0.5, 64.0),
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def call(client, ep):
+    kwargs = dict(ep.extra)
+    if ep.data is not None:
+        kwargs['data'] = ep.data
+    return getattr(client, ep.method)(ep.path, **kwargs)
+
+
+def isolated(client, ep, measure):
+    """ Issue the request inside a transaction that is rolled back afterwards """
+    result = {}
+    try:
+        with transaction.atomic():
+            result = measure(client, ep)
+            raise Rollback
+    except Rollback:
+        pass
+    return result
+
+
+def measure_queries(client, ep):
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        response = call(client, ep)
+        elapsed = (time.perf_counter() - start) * 1000
+    return {'status': response.status_code, 'queries': len(ctx), 'wall_ms': elapsed}
+
+
+def measure_memory(client, ep):
+    tracemalloc.start()
+    try:
+        call(client, ep)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_kb': peak / 1024}
+
+
+def run_suite(repeat=3, **seed_options):
+    """
+    Seed a graph, then request every endpoint as the seeded viewer.
+    Returns ``{'config': ..., 'endpoints': {name: metrics}}``.
+    """
+    # batch workers run inline throughout: their writes are then part of the request
+    # that queued them, counted with its queries and rolled back with it
+    with override_settings(BATCH_WORKERS_SYNC=True):
+        data = seed_graph(**seed_options)
+        client = Client(raise_request_exception=False)
+        client.force_login(data.viewer)
+
+        results = {}
+        for ep in build_endpoints(data):
+            isolated(client, ep, measure_queries)  # warm-up: template loading, url resolving, ...
+            runs = [isolated(client, ep, measure_queries) for _ in range(max(repeat, 1))]
+            metrics = runs[0]
+            metrics['wall_ms'] = round(statistics.median(run['wall_ms'] for run in runs), 3)
+            metrics.update(isolated(client, ep, measure_memory))
+            metrics['peak_kb'] = round(metrics['peak_kb'], 1)
+            results[ep.name] = metrics
+    return {'config': data.config, 'endpoints': results}
+
+
+def ok_status(status):
+    return 200 <= status < 400
+
+
+def compare(current, baseline, metrics=None, thresholds=None):
+    """
+    Return a list of human readable regressions of ``current`` against
+    ``baseline``: any error status, and every metric of ``metrics`` (by
+    default those the baseline recorded) above its threshold.
+    """
+    thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+    problems = []
+    for name, now in sorted(current['endpoints'].items()):
+        if not ok_status(now['status']):
+            problems.append(f'{name}: status {now["status"]}')
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            problems.append(f'{name}: not in baseline (run with --update)')
+            continue
+        for metric in metrics or DEFAULT_THRESHOLDS:
+            if metric not in before:
+                continue
+            relative, absolute = thresholds[metric]
+            limit = before[metric] * (1 + relative) + absolute
+            if now[metric] > limit:
+                problems.append(f'{name}: {metric} {before[metric]} -> {now[metric]} (limit {limit:g})')
+    return problems
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH, fields=BASELINE_FIELDS):
+    """ Write ``results`` keeping only ``fields`` of every endpoint (all of them with ``fields=None``) """
+    if fields is not None:
+        results = dict(results, endpoints={
+            name: {field: metrics[field] for field in fields} for name, metrics in results['endpoints'].items()
+        })
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,141 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pra', 'sto', 'gle', 'dun', 'mar', 'bel']
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed_corpus(users, posts, words_per_post, vocabulary, rng):
+    """ ``users`` users and ``posts`` posts of Zipf distributed words, created without signals """
+    from django.contrib.auth.models import User
+    from blog.models import Post
+
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+
+    def text(length):
+        return ' '.join(rng.choices(vocabulary, weights, k=length))
+
+    authors = User.objects.bulk_create([
+        User(username=f'{rng.choice(vocabulary)}{i}', first_name=rng.choice(vocabulary).title(),
+             last_name=rng.choice(vocabulary).title(), email=f'user{i}@example.com')
+        for i in range(users)
+    ])
+    authors = list(User.objects.filter(username__in=[author.username for author in authors]))
+    Post.objects.bulk_create([
+        Post(title=text(rng.randint(3, 8)), content=text(words_per_post), author=rng.choice(authors))
+        for _ in range(posts)
+    ], batch_size=500)
+
+
+def make_queries(vocabulary, count, rng):
+    """ Exact words, word pairs, prefixes and one-typo words, in equal parts """
+    queries = []
+    for i in range(count):
+        word = rng.choice(vocabulary)
+        kind = i % 4
+        if kind == 0:
+            queries.append(word)
+        elif kind == 1:
+            queries.append(f'{word} {rng.choice(vocabulary)}')
+        elif kind == 2:
+            queries.append(word[:max(3, len(word) // 2)])
+        else:
+            position = rng.randrange(1, len(word))
+            queries.append(word[:position] + rng.choice('aeiou') + word[position + 1:])
+    return queries
+
+
+def database_search(query, limit):
+    from django.db.models import Q
+    from blog.models import Post
+    return list(Post.objects.filter(Q(title__icontains=query) | Q(content__icontains=query))
+                .select_related('author')[:limit])
+
+
+def measure(search, queries, limit):
+    timings = []
+    hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        hits += len(search(query, limit))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean_ms': statistics.mean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[int(len(timings) * 0.95) - 1],
+        'hits': hits / len(queries),
+    }
+
+
+def main():
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from search.backends import SearchUnavailable, get_backend
+    from search.backends.local import LocalBackend
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.search', description='Search backend latency')
+    parser.add_argument('--backends', default='database,local',
+                        help='comma separated: database (icontains scan), local, elasticsearch')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=80, help='words per post')
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    queries = make_queries(vocabulary, args.queries, rng)
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        seed_corpus(args.users, args.posts, args.words, vocabulary, rng)
+        with tempfile.TemporaryDirectory() as index_dir:
+            print(f'{"backend":<14} {"build_s":>8} {"mean_ms":>8} {"p50_ms":>8} {"p95_ms":>8} {"hits/q":>7}')
+            for name in args.backends.split(','):
+                if name == 'database':
+                    build, search = 0.0, database_search
+                else:
+                    backend = LocalBackend(index_dir) if name == 'local' else get_backend(name)
+                    start = time.perf_counter()
+                    try:
+                        backend.rebuild()
+                    except SearchUnavailable as e:
+                        print(f'{name:<14} skipped: {e}')
+                        continue
+                    build = time.perf_counter() - start
+                    search = backend.search_posts
+                result = measure(search, queries, args.limit)
+                print(f'{name:<14} {build:>8.2f} {result["mean_ms"]:>8.2f} {result["p50_ms"]:>8.2f} '
+                      f'{result["p95_ms"]:>8.2f} {result["hits"]:>7.1f}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
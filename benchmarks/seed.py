@@ -0,0 +1,114 @@
+import random
+from io import StringIO
+from types import SimpleNamespace
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from blog.models import Comment, Post
+from chat.models import Chat, Room
+from friend.models import FriendRequest, befriend
+from notification.models import Notification
+from notification.services import event, write_events
+from users.follows import follow
+
+
+DEFAULT_CONFIG = {
+    'users': 12,
+    'posts_per_user': 3,
+    'likes_per_post': 4,
+    'comments_per_post': 3,
+    'replies_per_comment': 1,
+    'friends_per_user': 3,
+    'follows_per_user': 4,
+    'messages_per_room': 10,
+    'seed': 0,
+}
+
+
+def make_friends(a, b):
+    befriend(a.pk, b.pk)
+
+
+def seed_graph(**options):
+    """
+    Create a synthetic social graph and return the objects the endpoint
+    table needs. The first users play fixed roles:
+
+    viewer     the logged-in user, follows and is friends with ``friend``
+    friend     has a chat room with the viewer
+    stranger   no relationship with the viewer
+    requester  has a pending friend request to the viewer
+    requested  has a pending friend request from the viewer
+    """
+    config = dict(DEFAULT_CONFIG, **options)
+    rng = random.Random(config['seed'])
+
+    users = []
+    for i in range(max(config['users'], 5)):
+        user = User(username=f'bench{i}', email=f'bench{i}@example.com', first_name='Bench', last_name=str(i))
+        user.set_unusable_password()
+        user.save()
+        users.append(user)
+    viewer, friend, stranger, requester, requested = users[:5]
+    others = users[5:]
+
+    # Friendships and follows, keeping the stranger/requester/requested roles clean
+    make_friends(viewer, friend)
+    follow(viewer.profile, friend.pk)
+    for user in [viewer, friend] + others:
+        candidates = [u for u in [viewer, friend] + others if u != user]
+        for other in rng.sample(candidates, min(config['friends_per_user'], len(candidates))):
+            make_friends(user, other)
+        for other in rng.sample(candidates, min(config['follows_per_user'], len(candidates))):
+            follow(user.profile, other.pk)
+
+    FriendRequest.objects.create(sender=requester, receiver=viewer)
+    FriendRequest.objects.create(sender=viewer, receiver=requested)
+
+    posts = []
+    for user in users:
+        for i in range(config['posts_per_user']):
+            posts.append(Post.objects.create(title=f'{user.username} post {i}', content=f'<p>Body {i} of {user.username}</p>', author=user))
+
+    likes = []
+    for post in posts:
+        for user in rng.sample(users, min(config['likes_per_post'], len(users))):
+            likes.append(Post.likes.through(post_id=post.pk, user_id=user.pk))
+    Post.likes.through.objects.bulk_create(likes, ignore_conflicts=True)
+
+    comments = []
+    for post in posts:
+        for i in range(config['comments_per_post']):
+            comment = Comment.objects.create(post=post, name=rng.choice(users), body=f'comment {i}')
+            comments.append(comment)
+            for j in range(config['replies_per_comment']):
+                Comment.objects.create(post=post, name=rng.choice(users), body=f'reply {j}', reply=comment)
+    comment_likes = [
+        Comment.likes.through(comment_id=comment.pk, user_id=user.pk)
+        for comment in comments for user in rng.sample(users, min(2, len(users)))
+    ]
+    Comment.likes.through.objects.bulk_create(comment_likes, ignore_conflicts=True)
+    call_command('reconcile_counters', stdout=StringIO())
+
+    room = Room.objects.create(author=viewer, friend=friend)
+    for i in range(config['messages_per_room']):
+        author, other = (viewer, friend) if i % 2 else (friend, viewer)
+        Chat.objects.create(room_id=room, author=author, friend=other, text=f'message {i}')
+
+    viewer_post = Post.objects.filter(author=viewer).first()
+    write_events(event(user, viewer, 1 + i % 4, viewer_post, 'hello') for i, user in enumerate(others or [friend]))
+
+    return SimpleNamespace(
+        config=config,
+        viewer=viewer,
+        friend=friend,
+        stranger=stranger,
+        requester=requester,
+        requested=requested,
+        viewer_post=viewer_post,
+        post=Post.objects.filter(author=friend).first(),
+        comment=Comment.objects.filter(post__author=friend, reply=None).first(),
+        room=room,
+        chat=Chat.objects.filter(room_id=room).first(),
+        notification=Notification.objects.filter(user=viewer).first(),
+        incoming_request=FriendRequest.objects.get(sender=requester, receiver=viewer),
+    )
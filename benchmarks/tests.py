@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase, TestCase
+from .endpoints import uncovered
+from .runner import BASELINE_FIELDS, compare, load_baseline, ok_status, run_suite
+
+
+class QueryCountRegressionTest(TestCase):
+    """ Fails when an endpoint errors or issues more queries than recorded in baseline.json """
+
+    def test_query_counts(self):
+        baseline = load_baseline()
+        results = run_suite(repeat=1, **baseline['config'])
+        problems = compare(results, baseline)
+        self.assertEqual(problems, [], 'Regressions:\n' + '\n'.join(problems))
+
+    def test_every_route_is_benchmarked(self):
+        baseline = load_baseline()
+        self.assertEqual(uncovered(baseline['endpoints']), [])
+
+    def test_baseline_keeps_status_and_queries_only(self):
+        baseline = load_baseline()
+        for name, metrics in baseline['endpoints'].items():
+            self.assertEqual(sorted(metrics), sorted(BASELINE_FIELDS), name)
+            self.assertTrue(ok_status(metrics['status']), name)
+
+
+class CompareTest(SimpleTestCase):
+    def results(self, status=200, queries=3, **metrics):
+        return {'endpoints': {'home': dict(status=status, queries=queries, **metrics)}}
+
+    def test_error_status_fails(self):
+        baseline = self.results()
+        self.assertEqual(compare(self.results(), baseline), [])
+        self.assertEqual(compare(self.results(status=302), baseline), [])
+        for status in (403, 404, 500):
+            self.assertEqual(compare(self.results(status=status), baseline), [f'home: status {status}'])
+
+    def test_any_extra_query_fails(self):
+        self.assertEqual(compare(self.results(queries=4), self.results()), ['home: queries 3 -> 4 (limit 3)'])
+        self.assertEqual(compare(self.results(queries=2), self.results()), [])
+
+    def test_only_recorded_metrics_are_compared(self):
+        current = self.results(wall_ms=500.0, peak_kb=1.0)
+        self.assertEqual(compare(current, self.results()), [])
+        self.assertEqual(len(compare(current, self.results(wall_ms=10.0, peak_kb=1.0))), 1)
+        self.assertEqual(compare(current, self.results(wall_ms=10.0), metrics=('queries',)), [])
@@ -0,0 +1,70 @@
+from django.db.models import Count, F, Prefetch, Window, prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from .models import Comment
+from .pagination import CursorPaginator, encode_cursor
+
+
+COMMENTS_PER_PAGE = 10
+REPLIES_PREVIEW = 3
+REPLIES_PER_PAGE = 20
+
+COMMENT_ORDERINGS = {
+    'new': ('-date_added', '-id'),
+    'top': ('-likes_count', '-id'),
+}
+REPLY_ORDERING = ('id',)
+
+
+def liked_comment_ids(user, comments):
+    """ IDs of ``comments`` liked by ``user``, in one query """
+    if not user.is_authenticated or not comments:
+        return set()
+    return set(
+        Comment.likes.through.objects.filter(
+            user_id=user.id, comment_id__in=[comment.id for comment in comments]
+        ).values_list('comment_id', flat=True)
+    )
+
+
+def reply_previews(thread_ids):
+    """ The first REPLIES_PREVIEW replies of each of ``thread_ids``, ranked in SQL """
+    ranked = Comment.objects.filter(reply_id__in=thread_ids).annotate(
+        position=Window(RowNumber(), partition_by=[F('reply')], order_by=[F(field).asc() for field in REPLY_ORDERING])
+    ).order_by().values('id', 'position')
+    # a window function cannot be filtered on directly, so the ranking becomes a derived table
+    sql, params = ranked.query.sql_with_params()
+    first = RawSQL(f'SELECT ranked.id FROM ({sql}) ranked WHERE ranked.position <= %s', (*params, REPLIES_PREVIEW))
+    return Comment.objects.filter(id__in=first).select_related('name__profile').order_by(*REPLY_ORDERING)
+
+
+def comment_page(post, user, cursor=None, sort='new'):
+    """
+    One page of top-level comments with a preview of each reply thread.
+    Costs three queries whatever the number of comments on the post.
+    Returns ``(page, liked_comment_ids)``.
+    """
+    ordering = COMMENT_ORDERINGS.get(sort, COMMENT_ORDERINGS['new'])
+    comments = post.comments.filter(reply=None).select_related('name__profile').annotate(
+        num_replies=Count('replies')
+    )
+    page = CursorPaginator(comments, COMMENTS_PER_PAGE, ordering).page(cursor)
+    previews = reply_previews([comment.id for comment in page])
+    prefetch_related_objects(page.object_list, Prefetch('replies', queryset=previews, to_attr='reply_list'))
+
+    loaded = []
+    for comment in page:
+        loaded.append(comment)
+        loaded.extend(comment.reply_list)
+        comment.more_replies_cursor = None
+        if comment.num_replies > len(comment.reply_list):
+            last = comment.reply_list[-1]
+            comment.more_replies_cursor = encode_cursor([last.id])
+    return page, liked_comment_ids(user, loaded)
+
+
+def reply_page(comment, user, cursor=None):
+    """ The next REPLIES_PER_PAGE replies of a thread. Returns ``(page, liked_comment_ids)`` """
+    replies = comment.replies.select_related('name__profile')
+    page = CursorPaginator(replies, REPLIES_PER_PAGE, REPLY_ORDERING).page(cursor)
+    return page, liked_comment_ids(user, page.object_list)
@@ -0,0 +1,76 @@
+from django.conf import settings
+from users.models import Profile
+from .models import FeedEntry, Post
+
+
+FEED_BATCH_SIZE = getattr(settings, 'FEED_BATCH_SIZE', 1000)
+
+# How many of an author's latest posts a new follower gets copied into their timeline
+FEED_BACKFILL_POSTS = getattr(settings, 'FEED_BACKFILL_POSTS', 100)
+
+# Keyset used to page through a timeline, matches blog_feed_user_date_idx
+TIMELINE_ORDERING = ('-feed_entries__date_posted', '-feed_entries__post')
+
+
+def timeline_readers(author_id):
+    """
+    Users whose timeline shows posts written by ``author_id``:
+    everyone following the author plus the author themself.
+    """
+    readers = set(
+        Profile.following.through.objects.filter(user_id=author_id).values_list('profile__user_id', flat=True)
+    )
+    readers.add(author_id)
+    return readers
+
+
+def fan_out_post(post):
+    """ Write a new post into the timeline of every reader """
+    entries = [
+        FeedEntry(user_id=reader_id, post_id=post.pk, author_id=post.author_id, date_posted=post.date_posted)
+        for reader_id in timeline_readers(post.author_id)
+    ]
+    FeedEntry.objects.bulk_create(entries, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True)
+
+
+def refresh_post(post):
+    """ Keep the denormalized ordering key in step with the post """
+    FeedEntry.objects.filter(post=post).exclude(date_posted=post.date_posted).update(date_posted=post.date_posted)
+
+
+def backfill_author(reader_id, author_id, limit=FEED_BACKFILL_POSTS):
+    """
+    Copy the latest ``limit`` posts of a newly followed author into the
+    reader's timeline (all of them with ``limit=None``). It runs inside the
+    follow request, so by default it does not grow with the author's history.
+    """
+    posts = Post.objects.filter(author_id=author_id).order_by('-date_posted', '-pk').values_list('pk', 'date_posted')
+    if limit is not None:
+        posts = posts[:limit]
+    entries = [
+        FeedEntry(user_id=reader_id, post_id=pk, author_id=author_id, date_posted=date_posted)
+        for pk, date_posted in posts.iterator()
+    ]
+    FeedEntry.objects.bulk_create(entries, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True)
+
+
+def drop_author(reader_id, author_id):
+    """ Remove the posts of an unfollowed author from the reader's timeline """
+    if reader_id != author_id:
+        FeedEntry.objects.filter(user_id=reader_id, author_id=author_id).delete()
+
+
+def rebuild_timeline(user_id):
+    """ Recompute a user's timeline from scratch """
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    authors = set(
+        Profile.following.through.objects.filter(profile__user_id=user_id).values_list('user_id', flat=True)
+    )
+    authors.add(user_id)
+    for author_id in authors:
+        backfill_author(user_id, author_id, limit=None)
+
+
+def timeline_posts(user):
+    """ Posts on the user's timeline, newest first, read from the materialized entries """
+    return Post.objects.filter(feed_entries__user=user).select_related('author__profile').order_by(*TIMELINE_ORDERING)
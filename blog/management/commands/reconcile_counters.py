@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from blog.models import Comment, Post
+
+
+BATCH_SIZE = 500
+
+
+def counted(model, fk):
+    """ Correlated COUNT(*) of ``model`` rows pointing at the outer row through ``fk`` """
+    rows = model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(rows), 0)
+
+
+# (model, counter column, related model, fk from related model to ``model``)
+COUNTERS = [
+    (Post, 'likes_count', Post.likes.through, 'post'),
+    (Post, 'saves_count', Post.saves.through, 'post'),
+    (Post, 'comments_count', Comment, 'post'),
+    (Comment, 'likes_count', Comment.likes.through, 'comment'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like/save/comment counters and fix any drift'
+
+    def handle(self, *args, **options):
+        for model, column, related, fk in COUNTERS:
+            drifted = model.objects.annotate(actual=counted(related, fk)).exclude(**{column: F('actual')})
+            pks = list(drifted.values_list('pk', flat=True))
+            for start in range(0, len(pks), BATCH_SIZE):
+                batch = pks[start:start + BATCH_SIZE]
+                model.objects.filter(pk__in=batch).update(**{column: counted(related, fk)})
+            self.stdout.write(f'{model.__name__}.{column}: fixed {len(pks)} row(s)')
+
+        self.stdout.write(self.style.SUCCESS('Counters reconciled'))
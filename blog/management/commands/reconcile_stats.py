@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from blog.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the cached dashboard statistics from the database'
+
+    def handle(self, *args, **options):
+        for name, value in reconcile().items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS('Statistics reconciled'))
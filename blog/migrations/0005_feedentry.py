@@ -0,0 +1,56 @@
+# Generated by Django 3.2.23 on 2026-10-17 17:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_timelines(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    FeedEntry = apps.get_model('blog', 'FeedEntry')
+    Profile = apps.get_model('users', 'Profile')
+
+    followers = {}
+    for reader_id, author_id in Profile.following.through.objects.values_list('profile__user_id', 'user_id'):
+        followers.setdefault(author_id, set()).add(reader_id)
+
+    entries = []
+    for pk, author_id, date_posted in Post.objects.values_list('pk', 'author_id', 'date_posted').iterator():
+        for reader_id in followers.get(author_id, set()) | {author_id}:
+            entries.append(FeedEntry(user_id=reader_id, post_id=pk, author_id=author_id, date_posted=date_posted))
+    FeedEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0004_auto_20210215_1727'),
+        ('users', '0007_auto_20210403_2153'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_posted', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='blog.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-date_posted', '-post'], name='blog_feed_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='blog_feed_user_author_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedentry',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
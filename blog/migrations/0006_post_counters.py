@@ -0,0 +1,52 @@
+# Generated by Django 3.2.23 on 2026-10-17 17:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+
+    def counted(model, fk):
+        rows = model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(rows), 0)
+
+    Post.objects.update(
+        likes_count=counted(Post.likes.through, 'post'),
+        saves_count=counted(Post.saves.through, 'post'),
+        comments_count=counted(Comment, 'post'),
+    )
+    Comment.objects.update(likes_count=counted(Comment.likes.through, 'comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='saves_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,55 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.urls import reverse
 from ckeditor.fields import RichTextField
 
+def _bump(instance, field, delta):
+    """ Atomically add ``delta`` to a counter column and mirror it on the instance """
+    type(instance).objects.filter(pk=instance.pk).update(**{field: F(field) + delta})
+    instance.refresh_from_db(fields=[field])
+
+
+def _m2m_changed(instance, through, action, user):
+    """ Send the m2m_changed signal .add() / .remove() would have sent """
+    m2m_changed.send(
+        sender=through, instance=instance, action=action, reverse=False,
+        model=User, pk_set={user.pk}, using=instance._state.db,
+    )
+
+
+def _add_member(instance, m2m, user, counter):
+    """ Add ``user`` to the ``m2m`` relation, bumping ``counter`` if it is new """
+    field = type(instance)._meta.get_field(m2m)
+    through = getattr(type(instance), m2m).through
+    with transaction.atomic():
+        _, created = through.objects.get_or_create(**{
+            field.m2m_field_name(): instance,
+            field.m2m_reverse_field_name(): user,
+        })
+        if created:
+            _bump(instance, counter, 1)
+            _m2m_changed(instance, through, 'post_add', user)
+    return created
+
+
+def _remove_member(instance, m2m, user, counter):
+    """ Remove ``user`` from the ``m2m`` relation, dropping ``counter`` if it was there """
+    field = type(instance)._meta.get_field(m2m)
+    through = getattr(type(instance), m2m).through
+    with transaction.atomic():
+        deleted, _ = through.objects.filter(**{
+            field.m2m_field_name(): instance,
+            field.m2m_reverse_field_name(): user,
+        }).delete()
+        if deleted:
+            _bump(instance, counter, -deleted)
+            _m2m_changed(instance, through, 'post_remove', user)
+    return bool(deleted)
+
+
 """ Post model """
 class Post(models.Model):
     title = models.CharField(max_length=150)
@@ -13,12 +59,27 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     likes = models.ManyToManyField(User, related_name="blogpost", blank=True)
     saves = models.ManyToManyField(User, related_name="blogsave", blank=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    saves_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
 
     def total_likes(self):
-        return self.likes.count()
+        return self.likes_count
 
     def total_saves(self):
-        return self.saves.count()
+        return self.saves_count
+
+    def add_like(self, user):
+        return _add_member(self, 'likes', user, 'likes_count')
+
+    def remove_like(self, user):
+        return _remove_member(self, 'likes', user, 'likes_count')
+
+    def add_save(self, user):
+        return _add_member(self, 'saves', user, 'saves_count')
+
+    def remove_save(self, user):
+        return _remove_member(self, 'saves', user, 'saves_count')
 
     def __str__(self):
         return self.title
@@ -35,9 +96,16 @@ class Comment(models.Model):
     date_added = models.DateTimeField(auto_now_add=True)
     likes = models.ManyToManyField(User, related_name="blogcomment", blank=True)
     reply = models.ForeignKey('self', null=True, related_name="replies", on_delete=models.CASCADE)
+    likes_count = models.PositiveIntegerField(default=0)
 
     def total_clikes(self):
-        return self.likes.count()
+        return self.likes_count
+
+    def add_like(self, user):
+        return _add_member(self, 'likes', user, 'likes_count')
+
+    def remove_like(self, user):
+        return _remove_member(self, 'likes', user, 'likes_count')
 
     def __str__(self):
         return '%s - %s - %s' %(self.post.title, self.name, self.id)
@@ -45,3 +113,21 @@ class Comment(models.Model):
     def get_absolute_url(self):
         return reverse('post-detail', kwargs={"pk":self.pk})
 
+
+
+""" Materialized timeline entry, one row per (reader, post) """
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="feed_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="feed_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    date_posted = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-date_posted', '-post'], name='blog_feed_user_date_idx'),
+            models.Index(fields=['user', 'author'], name='blog_feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return '%s - %s' %(self.user, self.post_id)
@@ -0,0 +1,153 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+
+""" Keyset (cursor) pagination
+
+Pages are addressed by the ordering key of their first/last row instead of an
+offset, so every page costs one indexed range read and no COUNT(*).
+"""
+
+DEFAULT_ORDERING = ('-date_posted', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, reverse=False):
+    payload = []
+    for value in values:
+        if isinstance(value, datetime):
+            payload.append(['d', value.isoformat()])
+        else:
+            payload.append(['v', value])
+    raw = json.dumps({'k': payload, 'r': int(reverse)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        values = []
+        for kind, value in data['k']:
+            value = parse_datetime(value) if kind == 'd' else value
+            # cursors come from the client, only the scalars encode_cursor() writes are accepted
+            if not isinstance(value, (datetime, str, int, float)):
+                raise InvalidCursor(cursor)
+            values.append(value)
+        return values, bool(data['r'])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginates ``queryset`` on the (unique) key given by ``ordering``.
+    Ordering entries may follow relations, e.g. ``-feed_entries__date_posted``.
+    """
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+
+    def _keyed(self):
+        keys = {f'_cursor_{i}': F(name) for i, (name, _) in enumerate(self.ordering)}
+        return self.queryset.annotate(**keys)
+
+    def _order_by(self, reverse):
+        order = []
+        for i, (_, desc) in enumerate(self.ordering):
+            order.append(f'-_cursor_{i}' if desc != reverse else f'_cursor_{i}')
+        return order
+
+    def _after(self, values, reverse):
+        """ Rows strictly after ``values`` in the (possibly reversed) ordering """
+        condition = Q()
+        for i in reversed(range(len(self.ordering))):
+            desc = self.ordering[i][1] != reverse
+            step = Q(**{f'_cursor_{i}__{"lt" if desc else "gt"}': values[i]})
+            if i < len(self.ordering) - 1:
+                step |= Q(**{f'_cursor_{i}': values[i]}) & condition
+            condition = step
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, f'_cursor_{i}') for i in range(len(self.ordering))]
+
+    def page(self, cursor=None):
+        """ Return the page addressed by ``cursor`` (first page when empty or invalid) """
+        values, reverse = None, False
+        if cursor:
+            try:
+                values, reverse = decode_cursor(cursor)
+            except InvalidCursor:
+                values = None
+            if values is not None and len(values) != len(self.ordering):
+                values, reverse = None, False
+
+        qs = self._keyed().order_by(*self._order_by(reverse))
+        if values is not None:
+            try:
+                qs = qs.filter(self._after(values, reverse))
+            except (ValueError, TypeError, ValidationError):
+                # a value that does not fit its column, e.g. text for an id
+                values, reverse = None, False
+                qs = self._keyed().order_by(*self._order_by(reverse))
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor = encode_cursor(self._key(rows[-1])) if rows and has_next else None
+        previous_cursor = encode_cursor(self._key(rows[0]), reverse=True) if rows and has_previous else None
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+class CursorPaginationMixin:
+    """ ListView mixin replacing offset pagination with CursorPaginator """
+    cursor_ordering = DEFAULT_ORDERING
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
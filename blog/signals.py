@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from users.models import follow_changed
+from .models import Comment, Post
+from . import feed, stats
+
+
+""" Fan a post out to the followers' timelines """
+@receiver(post_save, sender=Post)
+def post_save_fan_out(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_post(instance)
+    else:
+        feed.refresh_post(instance)
+
+
+""" Keep timelines in step with follow / unfollow """
+@receiver(follow_changed)
+def following_changed(sender, follower_id, followee_id, following, **kwargs):
+    if following:
+        feed.backfill_author(follower_id, followee_id)
+    else:
+        feed.drop_author(follower_id, followee_id)
+
+
+""" Keep Post.comments_count in step with comment writes """
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(comments_count=F('comments_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comments_count__gt=0).update(comments_count=F('comments_count') - 1)
+
+
+
+
+""" Keep the cached site statistics in step, once the write is committed """
+STAT_SENDERS = {
+    User: 'users',
+    Post: 'posts',
+    Comment: 'comments',
+}
+
+
+def bump_on_commit(name, delta):
+    transaction.on_commit(lambda: stats.bump(name, delta))
+
+
+def stat_created(sender, created, **kwargs):
+    if created:
+        bump_on_commit(STAT_SENDERS[sender], 1)
+
+
+def stat_deleted(sender, **kwargs):
+    bump_on_commit(STAT_SENDERS[sender], -1)
+
+
+# connected per sender, a catch-all receiver would disable fast deletes of every model
+for model in STAT_SENDERS:
+    post_save.connect(stat_created, sender=model, dispatch_uid=f'stats-created-{model._meta.label}')
+    post_delete.connect(stat_deleted, sender=model, dispatch_uid=f'stats-deleted-{model._meta.label}')
+
+
+# Auto-created through models send no save/delete signals, likes are counted from m2m_changed
+@receiver(m2m_changed, sender=Post.likes.through)
+def post_likes_changed(sender, action, pk_set, **kwargs):
+    if action == 'post_add':
+        bump_on_commit('likes', len(pk_set))
+    elif action == 'post_remove':
+        bump_on_commit('likes', -len(pk_set))
+
+
+@receiver(post_delete, sender=Post)
+def post_likes_deleted(sender, instance, **kwargs):
+    if instance.likes_count:
+        bump_on_commit('likes', -instance.likes_count)
@@ -0,0 +1,53 @@
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from .models import Comment, Post
+
+
+# Site wide counters kept in the cache: bumped by signals, recounted from the database periodically
+STATS = {
+    'users': lambda: User.objects.count(),
+    'posts': lambda: Post.objects.count(),
+    'comments': lambda: Comment.objects.count(),
+    'likes': lambda: Post.likes.through.objects.count(),
+}
+KEY_PREFIX = 'stats:'
+RECONCILED_KEY = KEY_PREFIX + 'reconciled_at'
+
+
+def reconcile_interval():
+    return getattr(settings, 'STATS_RECONCILE_INTERVAL', 300)
+
+
+def key(name):
+    return KEY_PREFIX + name
+
+
+def reconcile():
+    """ Recount every statistic from the database and store the result """
+    stats = {name: count() for name, count in STATS.items()}
+    values = {key(name): value for name, value in stats.items()}
+    values[RECONCILED_KEY] = time.time()
+    cache.set_many(values, timeout=None)
+    return stats
+
+
+def bump(name, delta=1):
+    """ Adjust one counter. A missing counter is left alone, the next read recounts it """
+    try:
+        cache.incr(key(name), delta)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    """ All statistics as a dict, recounted only when missing or older than the reconcile interval """
+    keys = [key(name) for name in STATS]
+    values = cache.get_many(keys + [RECONCILED_KEY])
+    reconciled_at = values.get(RECONCILED_KEY)
+    if (len(values) < len(keys) + 1
+            or reconciled_at is None
+            or time.time() - reconciled_at > reconcile_interval()):
+        return reconcile()
+    return {name: values[key(name)] for name in STATS}
@@ -1,3 +1,374 @@
-from django.test import TestCase
+import base64
+import json
+import time
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from blog import stats
+from blog.comments import REPLIES_PREVIEW, comment_page, reply_page
+from blog.feed import backfill_author, rebuild_timeline, timeline_posts
+from blog.models import Comment, FeedEntry, Post
+from blog.pagination import CursorPaginator, encode_cursor
+from users.follows import follow, unfollow
 
-# Create your tests here.
+
+class CommentPageTest(TestCase):
+    """ Top-level comments come a page at a time, each with the first replies of its thread """
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer', password='secret')
+        self.post = Post.objects.create(title='thread', content='body', author=self.user)
+
+    def comment(self, body, reply=None):
+        return Comment.objects.create(post=self.post, name=self.user, body=body, reply=reply)
+
+    def test_previews_are_the_first_replies_of_each_thread(self):
+        first, second = self.comment('first'), self.comment('second')
+        for i in range(5):
+            self.comment(f'first reply {i}', reply=first)
+        self.comment('second reply', reply=second)
+
+        page, _ = comment_page(self.post, self.user)
+        by_body = {comment.body: comment for comment in page}
+        self.assertEqual(
+            [reply.body for reply in by_body['first'].reply_list],
+            [f'first reply {i}' for i in range(REPLIES_PREVIEW)],
+        )
+        self.assertEqual([reply.body for reply in by_body['second'].reply_list], ['second reply'])
+        self.assertIsNotNone(by_body['first'].more_replies_cursor)
+        self.assertIsNone(by_body['second'].more_replies_cursor)
+
+    def test_more_replies_continue_after_the_preview(self):
+        top = self.comment('top')
+        for i in range(5):
+            self.comment(f'reply {i}', reply=top)
+        page, _ = comment_page(self.post, self.user)
+
+        replies, _ = reply_page(top, self.user, page[0].more_replies_cursor)
+        self.assertEqual([reply.body for reply in replies], ['reply 3', 'reply 4'])
+        self.assertFalse(replies.has_next())
+
+    def test_query_count_independent_of_thread_sizes(self):
+        for i in range(3):
+            top = self.comment(f'top {i}')
+            for j in range(10 * i):
+                self.comment(f'reply {i}.{j}', reply=top)
+        with CaptureQueriesContext(connection) as ctx:
+            page, _ = comment_page(self.post, self.user)
+        self.assertEqual(len(ctx), 3)
+        self.assertEqual(len(page), 3)
+
+    def test_liked_comment_ids_cover_previewed_replies(self):
+        top = self.comment('top')
+        reply = self.comment('reply', reply=top)
+        reply.add_like(self.user)
+        _, liked = comment_page(self.post, self.user)
+        self.assertEqual(liked, {reply.id})
+
+
+class CounterTest(TestCase):
+    """ The stored like/save/comment counters follow the rows they count """
+
+    def setUp(self):
+        self.author = User.objects.create_user('writer', password='secret')
+        self.readers = [User.objects.create_user(f'reader{i}', password='secret') for i in range(3)]
+        self.post = Post.objects.create(title='counted', content='body', author=self.author)
+
+    def stored(self, obj, field='likes_count'):
+        obj.refresh_from_db(fields=[field])
+        return getattr(obj, field)
+
+    def test_likes_are_counted_once(self):
+        for reader in self.readers:
+            self.assertTrue(self.post.add_like(reader))
+        self.assertFalse(self.post.add_like(self.readers[0]))
+        self.assertEqual(self.stored(self.post), 3)
+        self.assertTrue(self.post.remove_like(self.readers[0]))
+        self.assertFalse(self.post.remove_like(self.readers[0]))
+        self.assertEqual(self.stored(self.post), 2)
+        self.assertEqual(self.post.likes.count(), 2)
+
+    def test_like_view_toggles(self):
+        self.client.login(username='reader0', password='secret')
+        for liked, total in ((True, 1), (False, 0), (True, 1)):
+            response = self.client.post(reverse('post-like'), {'id': self.post.pk}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.stored(self.post), total)
+            self.assertEqual(self.post.likes.filter(pk=self.readers[0].pk).exists(), liked)
+
+    def test_comment_likes_are_counted_once(self):
+        comment = Comment.objects.create(post=self.post, name=self.author, body='hi')
+        self.assertTrue(comment.add_like(self.readers[0]))
+        self.assertFalse(comment.add_like(self.readers[0]))
+        self.assertEqual(self.stored(comment), 1)
+        self.assertTrue(comment.remove_like(self.readers[0]))
+        self.assertFalse(comment.remove_like(self.readers[0]))
+        self.assertEqual(self.stored(comment), 0)
+
+    def test_comment_like_fragment_shows_the_new_state(self):
+        comment = Comment.objects.create(post=self.post, name=self.author, body='hi')
+        self.client.login(username='reader0', password='secret')
+        for liked, heart in ((True, 'fas fa-heart'), (False, 'far fa-heart')):
+            response = self.client.post(reverse('comment-like'), {'id': comment.pk}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            data = response.json()
+            self.assertEqual((data['comment_id'], data['liked'], data['total_clikes']), (comment.pk, liked, int(liked)))
+            self.assertIn(heart, data['form'])
+            self.assertIn(f'value="{comment.pk}"', data['form'])
+
+    def test_comments_are_counted_with_their_replies(self):
+        top = Comment.objects.create(post=self.post, name=self.readers[0], body='top')
+        for reader in self.readers[1:]:
+            Comment.objects.create(post=self.post, name=reader, body='reply', reply=top)
+        Comment.objects.create(post=self.post, name=self.author, body='other')
+        self.assertEqual(self.stored(self.post, 'comments_count'), 4)
+        # the replies go with the thread
+        top.delete()
+        self.assertEqual(self.stored(self.post, 'comments_count'), 1)
+        self.assertEqual(self.post.comments.count(), 1)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        comment = Comment.objects.create(post=self.post, name=self.author, body='hi')
+        self.post.add_like(self.readers[0])
+        self.post.add_save(self.readers[1])
+        comment.add_like(self.readers[2])
+        other = Post.objects.create(title='exact', content='body', author=self.author)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=9, saves_count=0, comments_count=5)
+        Comment.objects.filter(pk=comment.pk).update(likes_count=0)
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.saves_count, self.post.comments_count), (1, 1, 1))
+        self.assertEqual(self.stored(comment), 1)
+        self.assertEqual(self.stored(other), 0)
+        self.assertIn('Post.likes_count: fixed 1 row(s)', out.getvalue())
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertNotIn('fixed 1', out.getvalue())
+
+
+class StatsTest(TestCase):
+    """ Dashboard statistics are served from the cache, bumped on commit and recounted when stale """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('writer')
+        self.post = Post.objects.create(title='counted', content='body', author=self.author)
+
+    def dashboard(self):
+        response = self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cached_after_the_first_read(self):
+        self.assertEqual(self.dashboard(), {'users': 1, 'posts': 1, 'comments': 0, 'likes': 0})
+        with CaptureQueriesContext(connection) as ctx:
+            stats.get_stats()
+        self.assertEqual(len(ctx), 0)
+
+    def test_writes_bump_the_cached_counters(self):
+        stats.get_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            reader = User.objects.create_user('reader')
+            self.post.add_like(reader)
+            Comment.objects.create(post=self.post, name=reader, body='hi')
+            Post.objects.create(title='second', content='body', author=reader)
+        self.assertEqual(self.dashboard(), {'users': 2, 'posts': 2, 'comments': 1, 'likes': 1})
+        # the post takes its comment and like with it
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        self.assertEqual(self.dashboard(), {'users': 2, 'posts': 1, 'comments': 0, 'likes': 0})
+
+    def test_nothing_is_bumped_before_commit(self):
+        stats.get_stats()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Post.objects.create(title='second', content='body', author=self.author)
+        self.assertEqual(cache.get(stats.key('posts')), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.get(stats.key('posts')), 2)
+
+    def test_missing_counter_is_recounted(self):
+        Post.objects.create(title='second', content='body', author=self.author)
+        stats.bump('posts')
+        self.assertIsNone(cache.get(stats.key('posts')))
+        self.assertEqual(stats.get_stats()['posts'], 2)
+
+    @override_settings(STATS_RECONCILE_INTERVAL=60)
+    def test_stale_counters_are_reconciled(self):
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            stats.get_stats()
+        stats.bump('posts', 5)
+        with mock.patch('time.time', return_value=now + 30):
+            self.assertEqual(stats.get_stats()['posts'], 6)
+        with mock.patch('time.time', return_value=now + 61):
+            self.assertEqual(stats.get_stats()['posts'], 1)
+        self.assertEqual(cache.get(stats.RECONCILED_KEY), now + 61)
+
+    def test_reconcile_command_repairs_drift(self):
+        stats.get_stats()
+        stats.bump('comments', 3)
+        stats.bump('users', -1)
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertEqual(stats.get_stats(), {'users': 1, 'posts': 1, 'comments': 0, 'likes': 0})
+        self.assertIn('comments: 0', out.getvalue())
+
+
+class FeedTest(TestCase):
+    """ Timelines are written when posts and follows change, and rebuilt to the same rows """
+
+    def setUp(self):
+        self.reader = User.objects.create_user('reader')
+        self.other = User.objects.create_user('other')
+        self.author = User.objects.create_user('author')
+        self.posts = [self.post(f'post {i}') for i in range(4)]
+
+    def post(self, title, author=None):
+        return Post.objects.create(title=title, content='body', author=author or self.author)
+
+    def timeline(self, user=None):
+        return set(FeedEntry.objects.filter(user=user or self.reader).values_list('post_id', flat=True))
+
+    def entries(self):
+        return sorted(FeedEntry.objects.values_list('user_id', 'post_id', 'author_id', 'date_posted'))
+
+    def test_new_post_reaches_followers_and_its_author(self):
+        follow(self.reader.profile, self.author.pk)
+        post = self.post('fresh')
+        self.assertIn(post.pk, self.timeline())
+        self.assertIn(post.pk, self.timeline(self.author))
+        self.assertNotIn(post.pk, self.timeline(self.other))
+        self.assertEqual(list(timeline_posts(self.reader))[0], post)
+
+    def test_follow_backfills_and_unfollow_drops(self):
+        own = self.post('mine', author=self.reader)
+        follow(self.reader.profile, self.author.pk)
+        self.assertEqual(self.timeline(), {own.pk} | {post.pk for post in self.posts})
+        unfollow(self.reader.profile, self.author.pk)
+        self.assertEqual(self.timeline(), {own.pk})
+
+    def test_deleted_post_leaves_every_timeline(self):
+        follow(self.reader.profile, self.author.pk)
+        follow(self.other.profile, self.author.pk)
+        self.posts[0].delete()
+        self.assertFalse(FeedEntry.objects.filter(post_id=self.posts[0].pk).exists())
+        self.assertEqual(len(self.timeline()), 3)
+
+    def test_edited_date_moves_the_entries(self):
+        follow(self.reader.profile, self.author.pk)
+        post = self.posts[0]
+        post.date_posted = timezone.now() + timezone.timedelta(days=1)
+        post.save()
+        self.assertEqual(set(FeedEntry.objects.filter(post=post).values_list('date_posted', flat=True)),
+                         {post.date_posted})
+
+    def test_backfill_is_capped_to_the_latest_posts(self):
+        backfill_author(self.reader.pk, self.author.pk, limit=2)
+        self.assertEqual(self.timeline(), {post.pk for post in self.posts[-2:]})
+
+    def test_rebuild_is_not_capped(self):
+        follow(self.reader.profile, self.author.pk)
+        FeedEntry.objects.filter(user=self.reader).delete()
+        rebuild_timeline(self.reader.pk)
+        self.assertEqual(self.timeline(), {post.pk for post in self.posts})
+
+    def test_rebuild_feeds_is_idempotent(self):
+        follow(self.reader.profile, self.author.pk)
+        follow(self.author.profile, self.other.pk)
+        self.post('by other', author=self.other)
+        written = self.entries()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.entries(), written)
+        out = StringIO()
+        call_command('rebuild_feeds', 'reader', stdout=out)
+        self.assertEqual(self.entries(), written)
+        self.assertIn('Rebuilt 1 timeline(s)', out.getvalue())
+
+    def test_rebuild_repairs_a_drifted_timeline(self):
+        follow(self.reader.profile, self.author.pk)
+        stray = self.post('stray', author=self.other)
+        FeedEntry.objects.filter(user=self.reader, post=self.posts[0]).delete()
+        FeedEntry.objects.create(user=self.reader, post=stray, author=self.other, date_posted=stray.date_posted)
+        call_command('rebuild_feeds', 'reader', stdout=StringIO())
+        self.assertEqual(self.timeline(), {post.pk for post in self.posts})
+
+
+def raw_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+class CursorPaginatorTest(TestCase):
+    """ Keyset pages on (date_posted, id): no gaps or repeats, even between posts of the same date """
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer', password='secret')
+        date = timezone.now()
+        # pairs of posts share their date, the id breaks the tie
+        self.posts = [Post.objects.create(title=f'post {i}', content='body', author=self.user,
+                                          date_posted=date - timezone.timedelta(minutes=i // 2))
+                      for i in range(7)]
+        self.paginator = CursorPaginator(Post.objects.all(), 3)
+
+    def titles(self, page):
+        return [post.title for post in page]
+
+    def test_next_pages_cover_every_post_once(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        self.assertEqual([self.titles(page) for page in pages],
+                         [['post 1', 'post 0', 'post 3'], ['post 2', 'post 5', 'post 4'], ['post 6']])
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+    def test_previous_returns_to_the_same_page(self):
+        first = self.paginator.page()
+        second = self.paginator.page(first.next_cursor)
+        third = self.paginator.page(second.next_cursor)
+        self.assertEqual(self.titles(self.paginator.page(third.previous_cursor)), self.titles(second))
+        back = self.paginator.page(second.previous_cursor)
+        self.assertEqual(self.titles(back), self.titles(first))
+        self.assertFalse(back.has_previous())
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+    def test_posts_added_meanwhile_do_not_shift_the_pages(self):
+        first = self.paginator.page()
+        Post.objects.create(title='new', content='body', author=self.user)
+        self.assertEqual(self.titles(self.paginator.page(first.next_cursor)), ['post 2', 'post 5', 'post 4'])
+
+    def test_bad_cursors_give_the_first_page(self):
+        first = self.titles(self.paginator.page())
+        date = timezone.now().isoformat()
+        for cursor in [
+            '!!!not base64',
+            base64.urlsafe_b64encode(b'not json').decode(),
+            raw_cursor(['k']),
+            raw_cursor({'k': [['d', date]], 'r': 0}),
+            raw_cursor({'k': [['d', 'yesterday'], ['v', 1]], 'r': 0}),
+            raw_cursor({'k': [['d', date], ['v', 'abc']], 'r': 0}),
+            raw_cursor({'k': [['d', date], ['v', {'id': 1}]], 'r': 0}),
+            raw_cursor({'k': [['v', 'abc'], ['v', 1]], 'r': 0}),
+            raw_cursor({'k': [['d', date], ['v', None]], 'r': 1}),
+            raw_cursor({'k': [1, 2], 'r': 0}),
+        ]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.titles(self.paginator.page(cursor)), first)
+
+    def test_views_survive_tampered_cursors(self):
+        self.client.login(username='writer', password='secret')
+        cursor = encode_cursor(['abc', 'abc'])
+        for url in (reverse('blog-home'), reverse('user-posts', kwargs={'username': 'writer'})):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'post 1')
@@ -1,6 +1,6 @@
 from django.urls import path
 from . import views
-from .views import AllSaveView, PostListView, PostDetailView, PostCreateView, PostUpdateView, PostDeleteView, SaveView, UserPostListView, LikeView,LikeCommentView, posts_of_following_profiles,  AllLikeView, dashboard
+from .views import AllSaveView, PostListView, PostDetailView, PostCreateView, PostUpdateView, PostDeleteView, SaveView, UserPostListView, LikeView,LikeCommentView, CommentRepliesView, posts_of_following_profiles,  AllLikeView, dashboard, dashboard_stats
 
 urlpatterns = [
     path('', views.first, name='firsthome'),
@@ -16,7 +16,9 @@ urlpatterns = [
     path('post/save/', SaveView, name='post-save'),
     path('saved-posts/', AllSaveView, name='all-save'),
     path('post/comment/like/', LikeCommentView, name='comment-like'),
+    path('post/comment/<int:pk>/replies/', CommentRepliesView, name='comment-replies'),
     path('about/', views.about, name='blog-about'),
     path('search/', views.search, name='search'),
     path('dashboard/', dashboard, name='dashboard'),
+    path('dashboard/stats/', dashboard_stats, name='dashboard-stats'),
 ]
\ No newline at end of file
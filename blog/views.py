@@ -1,4 +1,4 @@
-from notification.models import Notification
+from notification.services import notify, retract
 from django.core.checks import messages
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -9,13 +9,18 @@ from .models import Comment, Post
 from .forms import CommentForm
 from django.http import HttpResponseRedirect, JsonResponse
 from users.models import Profile
-from itertools import chain
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.template.loader import render_to_string
-import random
 from blog.utils import is_ajax
+from blog.feed import timeline_posts, TIMELINE_ORDERING
+from blog.pagination import CursorPaginator, CursorPaginationMixin
+from blog.comments import comment_page, reply_page
+from blog.stats import get_stats
+from users.presence import online_user_ids
+from users.suggestions import suggested_users
+from search.analytics import record_search, trending_searches
+from search.backends import SearchUnavailable, get_backend
 from django.db.models import Count
 
 
@@ -31,46 +36,29 @@ def first(request):
 def posts_of_following_profiles(request):
 
     profile = Profile.objects.get(user = request.user)
-    users = [user for user in profile.following.all()]
-    posts = []
-    qs = None
-    for u in users:
-        p = Profile.objects.get(user=u)
-        p_posts = p.user.post_set.all()
-        posts.append(p_posts)
-    my_posts = profile.profile_posts()
-    posts.append(my_posts)
-    if len(posts)>0:
-        qs = sorted(chain(*posts), reverse=True, key=lambda obj:obj.date_posted)
-
-    paginator = Paginator(qs, 5)
-    page = request.GET.get('page')
-    try:
-        posts_list = paginator.page(page)
-    except PageNotAnInteger:
-        posts_list = paginator.page(1)
-    except EmptyPage:
-        posts_list = paginator.page(paginator.num_pages)
+    qs = timeline_posts(request.user)
+
+    paginator = CursorPaginator(qs, 5, ordering=TIMELINE_ORDERING)
+    posts_list = paginator.page(request.GET.get('cursor'))
   
-    return render(request,'blog/feeds.html',{'profile':profile,'posts':posts_list})
+    online = online_user_ids({post.author_id for post in posts_list})
+    return render(request,'blog/feeds.html',{'profile':profile,'posts':posts_list,'online_user_ids':online})
 
 
 """ Post Like """
 @login_required
 def LikeView(request):
 
-    post = get_object_or_404(Post, id=request.POST.get('id'))
+    # the author is notified
+    post = get_object_or_404(Post.objects.select_related('author'), id=request.POST.get('id'))
     liked = False
-    if post.likes.filter(id=request.user.id).exists():
-        post.likes.remove(request.user)
+    if post.remove_like(request.user):
         liked = False
-        notify = Notification.objects.filter(post=post, sender=request.user, notification_type=1)
-        notify.delete()
+        retract(post.author, request.user, 1, post=post)
     else:
-        post.likes.add(request.user)
+        post.add_like(request.user)
         liked = True
-        notify = Notification(post=post, sender=request.user, user=post.author, notification_type=1)
-        notify.save()
+        notify(post.author, request.user, 1, post=post)
 
     context = {
         'post':post,
@@ -89,11 +77,10 @@ def SaveView(request):
 
     post = get_object_or_404(Post, id=request.POST.get('id'))
     saved = False
-    if post.saves.filter(id=request.user.id).exists():
-        post.saves.remove(request.user)
+    if post.remove_save(request.user):
         saved = False
     else:
-        post.saves.add(request.user)
+        post.add_save(request.user)
         saved = True
     
     context = {
@@ -109,45 +96,27 @@ def SaveView(request):
 
 """ Like post comments """
 @login_required
-def LikeCommentView(request): # , id1, id2              id1=post.pk id2=reply.pk
-    post = get_object_or_404(Comment, id=request.POST.get('id'))
-    cliked = False
-    if post.likes.filter(id=request.user.id).exists():
-        post.likes.remove(request.user)
+def LikeCommentView(request):
+    comment = get_object_or_404(Comment, id=request.POST.get('id'))
+    if comment.remove_like(request.user):
         cliked = False
     else:
-        post.likes.add(request.user)
+        comment.add_like(request.user)
         cliked = True
 
-    cpost = get_object_or_404(Post, id=request.POST.get('pid'))
-    total_comments2 = cpost.comments.all().order_by('-id')
-    total_comments = cpost.comments.all().filter(reply=None).order_by('-id')
-    tcl={}
-    for cmt in total_comments2:
-        total_clikes = cmt.total_clikes()
-        cliked = False
-        if cmt.likes.filter(id=request.user.id).exists():
-            cliked = True
-
-        tcl[cmt.id] = cliked
-
-
     context = {
-        'comment_form':CommentForm(),
-        'post':cpost,
-        'comments':total_comments,
-        'total_clikes':post.total_clikes(),
-        'clikes':tcl
+        'comment':comment,
+        'liked_comment_ids':{comment.id} if cliked else set(),
     }
 
     if is_ajax(request=request):
-        html = render_to_string('blog/comments.html',context, request=request)
-        return JsonResponse({'form':html})
+        html = render_to_string('blog/comment_like_section.html',context, request=request)
+        return JsonResponse({'form':html, 'comment_id':comment.id, 'liked':cliked, 'total_clikes':comment.total_clikes()})
 
 
 """ Home page with all posts """
-class PostListView(ListView):
-    model = Post
+class PostListView(CursorPaginationMixin, ListView):
+    queryset = Post.objects.select_related('author__profile')
     template_name = 'blog/home.html' 
     context_object_name = 'posts'
     ordering = ['-date_posted']
@@ -155,38 +124,27 @@ class PostListView(ListView):
 
     def get_context_data(self, *args,**kwargs):
         context = super(PostListView, self).get_context_data()
-        users = list(User.objects.exclude(pk=self.request.user.pk))
-        if len(users) > 3:
-            cnt = 3
-        else:
-            cnt = len(users)
-        random_users = random.sample(users, cnt)
-        context['random_users'] = random_users
+        context['random_users'] = suggested_users(self.request.user)
         return context
 
 
 """ All the posts of the user """
-class UserPostListView(ListView):
+class UserPostListView(CursorPaginationMixin, ListView):
     model = Post
     template_name = 'blog/user_posts.html' 
     context_object_name = 'posts'
     paginate_by = 5
 
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs.get('username'))
-        return Post.objects.filter(author=user).order_by('-date_posted')
+        author = get_object_or_404(User, username=self.kwargs.get('username'))
+        return Post.objects.filter(author=author).select_related('author__profile')
 
 
 
 """ Post detail view """
 def PostDetailView(request,pk):
 
-    stuff = get_object_or_404(Post, id=pk)
-    total_likes = stuff.total_likes()
-    total_saves = stuff.total_saves()
-    total_comments = stuff.comments.all().filter(reply=None).order_by('-id')
-    total_comments2 = stuff.comments.all().order_by('-id')
-
+    stuff = get_object_or_404(Post.objects.select_related('author__profile'), id=pk)
     context = {}
 
     if request.method == "POST":
@@ -199,41 +157,28 @@ def PostDetailView(request,pk):
                 comment_qs = Comment.objects.get(id=reply_id)
             
             comment = Comment.objects.create(name=request.user,post=stuff,body=form, reply=comment_qs)
-            comment.save()
-            if reply_id:
-                notify = Notification(post=stuff, sender=request.user, user=stuff.author, text_preview=form, notification_type=4)
-                notify.save()
-            else:
-                notify = Notification(post=stuff, sender=request.user, user=stuff.author, text_preview=form, notification_type=3)
-                notify.save()
-            total_comments = stuff.comments.all().filter(reply=None).order_by('-id')
-            total_comments2 = stuff.comments.all().order_by('-id')
+            notify(stuff.author, request.user, 4 if reply_id else 3, post=stuff, text_preview=form)
+            stuff.refresh_from_db(fields=['comments_count'])
     else:
         comment_form = CommentForm()
-             
 
-    tcl={}
-    for cmt in total_comments2:
-        total_clikes = cmt.total_clikes()
-        cliked = False
-        if cmt.likes.filter(id=request.user.id).exists():
-            cliked = True
-
-        tcl[cmt.id] = cliked
-    context["clikes"]=tcl
+    comment_sort = request.GET.get('csort', 'new')
+    total_comments, liked_comment_ids = comment_page(stuff, request.user, request.GET.get('ccursor'), comment_sort)
+    context["liked_comment_ids"]=liked_comment_ids
+    context["comment_sort"]=comment_sort
 
 
     liked = False
     if stuff.likes.filter(id=request.user.id).exists():
         liked = True
-    context["total_likes"]=total_likes
+    context["total_likes"]=stuff.total_likes()
     context["liked"]=liked
 
 
     saved = False
     if stuff.saves.filter(id=request.user.id).exists():
         saved = True
-    context["total_saves"]=total_saves
+    context["total_saves"]=stuff.total_saves()
     context["saved"]=saved
     
 
@@ -249,6 +194,19 @@ def PostDetailView(request,pk):
     return render(request, 'blog/post_detail.html', context)
 
 
+""" Load more replies of a comment thread """
+def CommentRepliesView(request, pk):
+    comment = get_object_or_404(Comment, id=pk)
+    replies, liked_comment_ids = reply_page(comment, request.user, request.GET.get('cursor'))
+
+    context = {
+        'replies':replies,
+        'liked_comment_ids':liked_comment_ids,
+    }
+    html = render_to_string('blog/comment_replies.html', context, request=request)
+    return JsonResponse({'form':html, 'next':replies.next_cursor})
+
+
 """ Create post """
 class PostCreateView(LoginRequiredMixin, CreateView):
     model = Post
@@ -293,7 +251,10 @@ def about(request):
     return render(request, 'blog/about.html', {'title':'About'})
 
 
-""" Search by post title or username """
+BLOG_SEARCH_RESULTS = 50
+
+
+""" Search posts through the search backend """
 def search(request):
     query = request.GET['query']
     if len(query) >= 150 or len(query) < 1:
@@ -301,9 +262,19 @@ def search(request):
     elif len(query.strip()) == 0:
         allposts = Post.objects.none()
     else:
-        allpostsTitle = Post.objects.filter(title__icontains=query)
-        allpostsAuthor = Post.objects.filter(author__username = query)
-        allposts = allpostsAuthor.union(allpostsTitle)
+        try:
+            hits = get_backend().search_posts(query, limit=BLOG_SEARCH_RESULTS)
+            posts = Post.objects.select_related('author__profile').in_bulk([hit.id for hit in hits])
+            allposts = [posts[hit.id] for hit in hits if hit.id in posts]
+        except SearchUnavailable:
+            # no index to ask, scan the table instead
+            allpostsTitle = Post.objects.filter(title__icontains=query).values_list('pk', flat=True)
+            allpostsAuthor = Post.objects.filter(author__username = query).values_list('pk', flat=True)
+            ids = set(allpostsAuthor) | set(allpostsTitle)
+            # a union can't select_related, load the matches with their authors in one query
+            allposts = list(Post.objects.filter(pk__in=ids).select_related('author__profile').order_by('-date_posted'))
+        # written in the background, see search.analytics
+        record_search(request.user, query, len(allposts))
     
     params = {'allposts': allposts}
     return render(request, 'blog/search_results.html', params)
@@ -313,7 +284,7 @@ def search(request):
 @login_required
 def AllLikeView(request):
     user = request.user
-    liked_posts = user.blogpost.all()
+    liked_posts = user.blogpost.select_related('author__profile')
     context = {
         'liked_posts':liked_posts
     }
@@ -324,7 +295,7 @@ def AllLikeView(request):
 @login_required
 def AllSaveView(request):
     user = request.user
-    saved_posts = user.blogsave.all()
+    saved_posts = user.blogsave.select_related('author__profile')
     context = {
         'saved_posts':saved_posts
     }
@@ -333,22 +304,25 @@ def AllSaveView(request):
 
 """ Dashboard view """
 def dashboard(request):
-    # Get statistics
-    total_users = User.objects.count()
-    total_posts = Post.objects.count()
-    total_comments = Comment.objects.count()
-    total_likes = sum([post.likes.count() for post in Post.objects.all()])
-    
+    # Cached counters, see blog.stats
+    stats = get_stats()
+
     # Get recent posts for activity feed
     recent_posts = Post.objects.select_related('author__profile').order_by('-date_posted')[:10]
-    
+
     context = {
-        'total_users': total_users,
-        'total_posts': total_posts,
-        'total_comments': total_comments,
-        'total_likes': total_likes,
+        'total_users': stats['users'],
+        'total_posts': stats['posts'],
+        'total_comments': stats['comments'],
+        'total_likes': stats['likes'],
         'recent_posts': recent_posts,
+        # daily roll-ups, see search.analytics
+        'trending_searches': trending_searches(),
     }
-    
+
     return render(request, 'blog/dashboard.html', context)
 
+
+""" Site statistics as JSON, for monitoring """
+def dashboard_stats(request):
+    return JsonResponse(get_stats())
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from functools import partial
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .models import Chat
+
+
+""" Write-behind buffer for chat messages
+
+With CHAT_WRITE_BEHIND_MS set, messages received by the consumers of this
+process are collected and inserted with one bulk_create per interval (or as
+soon as CHAT_WRITE_BEHIND_MAX messages are waiting) instead of one INSERT each.
+A batch that fails to insert goes back to the front of the buffer and is
+retried with the next one, up to CHAT_WRITE_BEHIND_RETRIES times in a row.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def write_behind_ms():
+    return getattr(settings, 'CHAT_WRITE_BEHIND_MS', 0)
+
+
+def write_behind_max():
+    return getattr(settings, 'CHAT_WRITE_BEHIND_MAX', 100)
+
+
+def write_behind_retries():
+    return getattr(settings, 'CHAT_WRITE_BEHIND_RETRIES', 3)
+
+
+@database_sync_to_async
+def save_chats(chats):
+    Chat.objects.bulk_create(chats)
+
+
+class ChatBuffer:
+    def __init__(self):
+        self.pending = []
+        self.timer = None
+        # inserts in progress, kept so that they are not garbage collected
+        self.tasks = set()
+        self.failures = 0
+
+    async def add(self, chat):
+        """ Queue ``chat``; saved right away when write-behind is disabled """
+        # dated on receipt, the insert may come a window later
+        chat.date = timezone.now()
+        if write_behind_ms() <= 0:
+            await save_chats([chat])
+            return
+        self.pending.append(chat)
+        if len(self.pending) >= write_behind_max():
+            await self.flush()
+        else:
+            self.schedule()
+
+    def schedule(self):
+        if self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(write_behind_ms() / 1000, self.start_flush)
+
+    def start_flush(self):
+        """ Insert the buffered messages in the background, returns the task (None when empty) """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        chats, self.pending = self.pending, []
+        if not chats:
+            return None
+        task = asyncio.ensure_future(save_chats(chats))
+        self.tasks.add(task)
+        task.add_done_callback(partial(self.saved, chats))
+        return task
+
+    async def flush(self):
+        task = self.start_flush()
+        if task is not None:
+            await asyncio.wait([task])
+
+    def saved(self, chats, task):
+        self.tasks.discard(task)
+        error = None if task.cancelled() else task.exception()
+        if not task.cancelled() and error is None:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures > write_behind_retries():
+            logger.error('Dropping %d chat message(s) after %d failed inserts', len(chats), self.failures - 1,
+                         exc_info=error)
+            self.failures = 0
+            return
+        logger.error('Could not save %d chat message(s), retrying', len(chats), exc_info=error)
+        self.pending[:0] = chats
+        self.schedule()
+
+
+buffer = ChatBuffer()
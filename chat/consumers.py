@@ -1,22 +1,27 @@
 from chat.models import Chat, Room
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.contrib.auth.models import User
-from asgiref.sync import sync_to_async, async_to_sync
-
-
-"""MESSAGE DB ENTRY"""
-@sync_to_async
-def create_new_message(me,friend,message,room_id):
-    get_room = Room.objects.filter(room_id=room_id)[0]
-    author_user = User.objects.filter(username=me)[0]
-    friend_user = User.objects.filter(username=friend)[0]
-    new_chat = Chat.objects.create(
-        author=author_user,
-        friend=friend_user,
-        room_id=get_room,
-        text=message)
-        
+from django.db.models import Q
+from .buffer import buffer
+
+
+"""ROOM LOOKUP"""
+@database_sync_to_async
+def get_room(room_id, user):
+    room = Room.objects.select_related('author__profile', 'friend__profile').filter(
+        Q(author=user) | Q(friend=user), room_id=room_id
+    ).first()
+    if room is None:
+        return None, None
+    friend = room.friend if room.author_id == user.pk else room.author
+    return room, friend
+
+
+@database_sync_to_async
+def get_user_image(user):
+    return user.profile.image.url
+
 
 class ChatRoomConsumer(AsyncWebsocketConsumer):
 
@@ -24,6 +29,16 @@ class ChatRoomConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = 'chat_%s' % self.room_name
+        self.user = self.scope['user']
+
+        # resolved once per connection instead of once per message
+        self.room, self.friend = (None, None)
+        if self.user.is_authenticated:
+            self.room, self.friend = await get_room(self.room_name, self.user)
+        if self.room is None:
+            await self.close()
+            return
+        self.user_image = await get_user_image(self.user)
 
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -34,6 +49,9 @@ class ChatRoomConsumer(AsyncWebsocketConsumer):
 
     """Disconnect"""
     async def disconnect(self, close_code):
+        if self.room is None:
+            return
+        await buffer.flush()
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -43,16 +61,17 @@ class ChatRoomConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message = text_data_json['message']
-        username = text_data_json['username']
-        user_image = text_data_json['user_image']
+
+        # persisted once here, not in every participant's handler
+        await buffer.add(Chat(room_id=self.room, author=self.user, friend=self.friend, text=message))
 
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chatroom_message',
                 'message': message,
-                'username': username,
-                'user_image': user_image,
+                'username': self.user.username,
+                'user_image': self.user_image,
             }
         )
 
@@ -60,15 +79,8 @@ class ChatRoomConsumer(AsyncWebsocketConsumer):
 
     """Messages"""
     async def chatroom_message(self, event):
-        message = event['message']
-        username = event['username']
-        user_image = event['user_image']
-
-        await create_new_message(me=self.scope["user"], friend=username, message=message, room_id=self.room_name)
-        
         await self.send(text_data=json.dumps({
-            'message': message,
-            'username': username,
-            'user_image': user_image,
+            'message': event['message'],
+            'username': event['username'],
+            'user_image': event['user_image'],
         }))
-
@@ -0,0 +1,16 @@
+from blog.pagination import CursorPaginator
+from .models import Chat
+
+
+CHATS_PER_PAGE = 30
+HISTORY_ORDERING = ('-date', '-id')
+
+
+def history_page(room_id, cursor=None):
+    """
+    The newest CHATS_PER_PAGE messages of a room older than ``cursor``.
+    ``page.next_cursor`` addresses the page before it. The messages come
+    newest first, reverse them for display.
+    """
+    chats = Chat.objects.filter(room_id=room_id).select_related('author__profile')
+    return CursorPaginator(chats, CHATS_PER_PAGE, HISTORY_ORDERING).page(cursor)
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_auto_20210215_2113'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chat',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
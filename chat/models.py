@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 
 # Create your models here.
@@ -20,7 +21,8 @@ class Chat(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='author_msg')
     friend = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_msg')
     text = models.CharField(max_length=300)
-    date = models.DateTimeField(auto_now_add=True)
+    # set when the consumer receives the message, see chat.buffer
+    date = models.DateTimeField(default=timezone.now)
     has_seen = models.BooleanField(default=False)
 
     def __str__(self):
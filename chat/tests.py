@@ -1,3 +1,156 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .buffer import ChatBuffer
+from .consumers import ChatRoomConsumer
+from .history import CHATS_PER_PAGE, history_page
+from .models import Chat, Room
 
-# Create your tests here.
+
+class ChatTestCase(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='secret')
+        self.bob = User.objects.create_user('bob', password='secret')
+        self.room = Room.objects.create(author=self.alice, friend=self.bob)
+
+    def chat(self, text):
+        return Chat(room_id=self.room, author=self.alice, friend=self.bob, text=text)
+
+
+count_chats = database_sync_to_async(lambda: Chat.objects.count())
+
+
+class ChatRoomConsumerTest(ChatTestCase):
+    """ A message is stored once however many members are connected """
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(ChatRoomConsumer.as_asgi(), f'/ws/chat/{self.room.pk}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'room_name': str(self.room.pk)}}
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_message_is_saved_once(self):
+        (alice, _), (bob, _) = await self.connect(self.alice), await self.connect(self.bob)
+        await alice.send_json_to({'message': 'hello'})
+        for communicator in (alice, bob):
+            self.assertEqual((await communicator.receive_json_from())['message'], 'hello')
+        await alice.disconnect()
+        await bob.disconnect()
+        self.assertEqual(await count_chats(), 1)
+
+    @override_settings(CHAT_WRITE_BEHIND_MS=60000)
+    async def test_buffer_is_flushed_on_disconnect(self):
+        alice, _ = await self.connect(self.alice)
+        await alice.send_json_to({'message': 'buffered'})
+        await alice.receive_json_from()
+        self.assertEqual(await count_chats(), 0)
+        await alice.disconnect()
+        self.assertEqual(await count_chats(), 1)
+
+    async def test_strangers_are_turned_away(self):
+        eve = await database_sync_to_async(User.objects.create_user)('eve')
+        communicator, connected = await self.connect(eve)
+        self.assertFalse(connected)
+
+
+@override_settings(CHAT_WRITE_BEHIND_MS=60000, CHAT_WRITE_BEHIND_MAX=3, CHAT_WRITE_BEHIND_RETRIES=1)
+class ChatBufferTest(ChatTestCase):
+    """ Buffered messages keep their receive time and survive a failed insert """
+
+    async def test_full_buffer_is_written_at_once(self):
+        buffer = ChatBuffer()
+        for i in range(3):
+            await buffer.add(self.chat(f'message {i}'))
+        self.assertEqual(await count_chats(), 3)
+        self.assertEqual(buffer.pending, [])
+        self.assertIsNone(buffer.timer)
+
+    async def test_messages_are_dated_on_receipt(self):
+        buffer = ChatBuffer()
+        received = timezone.now()
+        await buffer.add(self.chat('early'))
+        await asyncio.sleep(0.05)
+        await buffer.flush()
+        chat = await database_sync_to_async(Chat.objects.get)()
+        self.assertLess(chat.date - received, timezone.timedelta(seconds=0.05))
+
+    async def test_failed_insert_is_requeued_then_dropped(self):
+        buffer = ChatBuffer()
+        await buffer.add(self.chat('first'))
+        with mock.patch('chat.models.Chat.objects.bulk_create', side_effect=DatabaseError('down')), \
+                self.assertLogs('chat.buffer', 'ERROR'):
+            await buffer.flush()
+            self.assertEqual([chat.text for chat in buffer.pending], ['first'])
+            self.assertIsNotNone(buffer.timer)
+
+            await buffer.add(self.chat('second'))
+            await buffer.flush()
+            # retried once with the next batch, then given up
+            self.assertEqual(buffer.pending, [])
+        self.assertEqual(buffer.tasks, set())
+
+        await buffer.add(self.chat('third'))
+        await buffer.flush()
+        texts = await database_sync_to_async(lambda: list(Chat.objects.values_list('text', flat=True)))()
+        self.assertEqual(texts, ['third'])
+
+    async def test_requeued_messages_go_first(self):
+        buffer = ChatBuffer()
+        await buffer.add(self.chat('first'))
+        with mock.patch('chat.models.Chat.objects.bulk_create', side_effect=DatabaseError('down')), \
+                self.assertLogs('chat.buffer', 'ERROR'):
+            await buffer.flush()
+        await buffer.add(self.chat('second'))
+        await buffer.flush()
+        texts = await database_sync_to_async(lambda: list(Chat.objects.order_by('id').values_list('text', flat=True)))()
+        self.assertEqual(texts, ['first', 'second'])
+
+
+class HistoryTest(ChatTestCase):
+    """ Room history pages backwards from the newest message, for the room's members only """
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        chats = [self.chat(f'message {i}') for i in range(CHATS_PER_PAGE + 5)]
+        for i, chat in enumerate(chats):
+            chat.date = now - timezone.timedelta(minutes=len(chats) - i)
+        Chat.objects.bulk_create(chats)
+        self.client.login(username='bob', password='secret')
+
+    def test_pages_cover_the_history_once(self):
+        first = history_page(self.room.pk)
+        self.assertEqual(first[0].text, f'message {CHATS_PER_PAGE + 4}')
+        self.assertEqual(len(first), CHATS_PER_PAGE)
+        second = history_page(self.room.pk, first.next_cursor)
+        self.assertEqual([chat.text for chat in second], [f'message {i}' for i in reversed(range(5))])
+        self.assertIsNone(second.next_cursor)
+
+    def test_history_view(self):
+        response = self.client.get(reverse('room-history', kwargs={'room_name': self.room.pk}))
+        self.assertEqual(response.status_code, 200)
+        cursor = response.json()['next']
+        response = self.client.get(reverse('room-history', kwargs={'room_name': self.room.pk}), {'cursor': cursor})
+        self.assertIn('message 4', response.json()['form'])
+        self.assertIsNone(response.json()['next'])
+
+    def test_members_only(self):
+        User.objects.create_user('eve', password='secret')
+        self.client.login(username='eve', password='secret')
+        response = self.client.get(reverse('room-history', kwargs={'room_name': self.room.pk}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('room', kwargs={'room_name': self.room.pk, 'friend_id': self.alice.pk}))
+        self.assertRedirects(response, reverse('room-enroll'))
+
+    def test_room_page_shows_the_latest_page(self):
+        response = self.client.get(reverse('room', kwargs={'room_name': self.room.pk, 'friend_id': self.alice.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'message {CHATS_PER_PAGE + 4}')
+        self.assertNotContains(response, 'message 4</p>')
@@ -1,22 +1,31 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Room, Chat
 from django.db.models import Q
-from friend.models import FriendList
+from friend.graph import friend_graph
+from friend.models import friends_of
 from django.contrib.auth.models import User
+from .history import history_page
+from users.presence import is_online, online_user_ids
 
 
 @login_required
 def room_enroll(request):
-    friends = FriendList.objects.filter(user=request.user)[0].friends.all()
+    friends = friends_of(request.user.id)
     all_rooms = Room.objects.filter(
         Q(author=request.user) | Q(friend=request.user)
     ).order_by('-created')
 
+    all_rooms = list(all_rooms)
     context = {
         'all_rooms':all_rooms,
         'all_friends':friends,
+        'online_user_ids':online_user_ids(
+            {room.author_id for room in all_rooms} | {room.friend_id for room in all_rooms}
+        ),
     }
     return render(request, 'chat/join_room.html', context)
 
@@ -28,7 +37,7 @@ def room_choice(request, friend_id):
     if not friend:
         messages.error(request, 'Invalid User ID')
         return redirect('room-enroll') 
-    if not FriendList.objects.filter(user=request.user, friends=friend[0]):
+    if not friend_graph.are_friends(request.user.id, friend[0].id):
         messages.error(request, 'You need to be friends to chat')
         return redirect('room-enroll') 
 
@@ -47,19 +56,30 @@ def room_choice(request, friend_id):
 """ Chatroom between users """
 @login_required
 def room(request, room_name, friend_id):
-    all_rooms = Room.objects.filter(room_id=room_name)
+    # only its two members may read a room
+    all_rooms = Room.objects.filter(Q(author=request.user) | Q(friend=request.user), room_id=room_name)
     if not all_rooms:  
         messages.error(request, 'Invalid Room ID')
         return redirect('room-enroll')
 
-    chats = Chat.objects.filter(
-        room_id=room_name
-    ).order_by('date')
+    chats = history_page(room_name)
 
     context = {
-        'old_chats':chats,
+        'old_chats':reversed(chats.object_list),
+        'older_cursor':chats.next_cursor,
         'my_name':request.user,
-        'friend_name':User.objects.get(pk=friend_id),
+        'friend_name':User.objects.select_related('profile').get(pk=friend_id),
+        'friend_online':is_online(friend_id),
         'room_name': room_name
     }
     return render(request, 'chat/chatroom.html', context)
+
+
+""" Older messages of a chatroom, loaded on demand """
+@login_required
+def room_history(request, room_name):
+    room = get_object_or_404(Room, Q(author=request.user) | Q(friend=request.user), room_id=room_name)
+    chats = history_page(room.room_id, request.GET.get('cursor'))
+
+    html = render_to_string('chat/chat_messages.html', {'chats':reversed(chats.object_list)}, request=request)
+    return JsonResponse({'form':html, 'next':chats.next_cursor})
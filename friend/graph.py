@@ -0,0 +1,235 @@
+import bisect
+import random
+import threading
+from array import array
+from collections import Counter
+from django.core.cache import cache
+from django.db import transaction
+from .models import Friendship
+
+
+""" In-memory friend graph
+
+Every process keeps the whole friendship graph in compressed sparse row
+form: ``users`` holds the sorted ids of the users with friends, and the
+friends of ``users[i]`` are ``indices[indptr[i]:indptr[i + 1]]``, sorted.
+That is three flat int arrays, about 16 bytes per friendship, loaded with
+one query the first time the graph is asked something.
+
+The graph version is a counter in the shared cache (see CACHE_REDIS_URL),
+bumped when a friendship change commits, with the change itself stored
+under the new version. A process behind the counter replays the changes
+it missed into small per user overrides of the arrays; only a process too
+far behind (or missing a change) reloads the Friendship table. Either way
+a question costs one cache read when nothing changed.
+"""
+
+VERSION_KEY = 'friend:graph:version'
+# a process further behind than this reloads the table rather than replaying
+MAX_REPLAY = 1000
+CHANGE_TIMEOUT = 24 * 60 * 60
+# the overrides are folded back into the arrays once they cover this many users
+MAX_OVERRIDES = 10000
+
+# "every friendship may have changed", e.g. a user and their friendships were deleted
+RELOAD = 'reload'
+
+
+def change_key(version):
+    return f'friend:graph:change:{version}'
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # a random start, so a lost counter does not replay versions processes already have
+        cache.add(VERSION_KEY, random.randrange(1 << 48), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def publish(change):
+    """ Bump the version and record ``change``: ``(user_id, friend_id, are_friends)`` or RELOAD """
+    current_version()
+    version = cache.incr(VERSION_KEY)
+    cache.set(change_key(version), change, CHANGE_TIMEOUT)
+    return version
+
+
+def friendship_changed_on_commit(user_id, friend_id, are_friends):
+    transaction.on_commit(lambda: publish((user_id, friend_id, are_friends)))
+
+
+def invalidate():
+    """ Make every process reload the graph once the transaction commits """
+    transaction.on_commit(lambda: publish(RELOAD))
+
+
+def changes_between(version, latest):
+    """ The changes after ``version`` up to ``latest`` in order, None when they cannot be replayed """
+    if not 0 < latest - version <= MAX_REPLAY:
+        return None
+    keys = [change_key(v) for v in range(version + 1, latest + 1)]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        return None
+    changes = [found[key] for key in keys]
+    if RELOAD in changes:
+        return None
+    return changes
+
+
+def intersect(a, b):
+    """ Common items of the sorted sequences ``a`` and ``b`` """
+    common = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            common.append(a[i])
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return common
+
+
+class Adjacency:
+    """ ``edges`` are ``(user_id, friend_id)`` pairs sorted by both """
+    def __init__(self, edges):
+        self.users = array('q')
+        self.indptr = array('q', [0])
+        self.indices = array('q')
+        # rows changed since the arrays were built, {user_id: sorted array of friend ids}
+        self.overrides = {}
+        for user_id, friend_id in edges:
+            if not self.users or self.users[-1] != user_id:
+                if self.users:
+                    self.indptr.append(len(self.indices))
+                self.users.append(user_id)
+            self.indices.append(friend_id)
+        if self.users:
+            self.indptr.append(len(self.indices))
+
+    def __len__(self):
+        return len(set(self.users) | set(self.overrides))
+
+    def friends(self, user_id):
+        if user_id in self.overrides:
+            return self.overrides[user_id]
+        row = bisect.bisect_left(self.users, user_id)
+        if row == len(self.users) or self.users[row] != user_id:
+            return self.indices[0:0]
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def _set_edge(self, user_id, friend_id, are_friends):
+        friends = array('q', self.friends(user_id))
+        position = bisect.bisect_left(friends, friend_id)
+        present = position < len(friends) and friends[position] == friend_id
+        if are_friends and not present:
+            friends.insert(position, friend_id)
+        elif not are_friends and present:
+            del friends[position]
+        else:
+            return
+        self.overrides[user_id] = friends
+
+    def apply(self, user_id, friend_id, are_friends):
+        """ Add or remove one friendship in place, in both directions """
+        self._set_edge(user_id, friend_id, are_friends)
+        self._set_edge(friend_id, user_id, are_friends)
+
+    def edges(self):
+        """ ``(user_id, friend_id)`` pairs sorted by both, overrides included """
+        user_ids = sorted(set(self.users) | set(self.overrides))
+        for user_id in user_ids:
+            for friend_id in self.friends(user_id):
+                yield user_id, friend_id
+
+    def copy(self):
+        """ Shares the arrays, which are never modified, and copies the overrides """
+        adjacency = Adjacency(())
+        adjacency.users, adjacency.indptr, adjacency.indices = self.users, self.indptr, self.indices
+        adjacency.overrides = dict(self.overrides)
+        return adjacency
+
+    def compacted(self):
+        return Adjacency(self.edges()) if self.overrides else self
+
+
+class FriendGraph:
+    def __init__(self):
+        self.adjacency = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        edges = []
+        for low, high in Friendship.objects.values_list('user_low_id', 'user_high_id').iterator():
+            edges.append((low, high))
+            edges.append((high, low))
+        edges.sort()
+        return Adjacency(edges)
+
+    def get_adjacency(self):
+        version = current_version()
+        if self.adjacency is None or self.version != version:
+            with self.lock:
+                if self.adjacency is None or self.version != version:
+                    self.catch_up(version)
+        return self.adjacency
+
+    def catch_up(self, version):
+        """ Replay the changes up to ``version``, or reload when they are not all at hand """
+        changes = None
+        if self.adjacency is not None:
+            changes = changes_between(self.version, version)
+        if changes is None:
+            # the version read before loading, so a change committed during the load is replayed next time
+            self.adjacency = self.load()
+        else:
+            # a copy, so a reader holding the current one never sees it half updated
+            adjacency = self.adjacency.copy()
+            for user_id, friend_id, are_friends in changes:
+                adjacency.apply(user_id, friend_id, are_friends)
+            if len(adjacency.overrides) > MAX_OVERRIDES:
+                adjacency = adjacency.compacted()
+            self.adjacency = adjacency
+        self.version = version
+
+    def friends(self, user_id):
+        """ Sorted ids of ``user_id``'s friends """
+        return self.get_adjacency().friends(user_id)
+
+    def friend_count(self, user_id):
+        return len(self.friends(user_id))
+
+    def are_friends(self, user_id, other_id):
+        friends = self.friends(user_id)
+        position = bisect.bisect_left(friends, other_id)
+        return position < len(friends) and friends[position] == other_id
+
+    def mutual_friends(self, user_id, other_id):
+        """ Sorted ids of the friends ``user_id`` and ``other_id`` have in common """
+        adjacency = self.get_adjacency()
+        return intersect(adjacency.friends(user_id), adjacency.friends(other_id))
+
+    def mutual_count(self, user_id, other_id):
+        return len(self.mutual_friends(user_id, other_id))
+
+    def friends_of_friends(self, user_id, limit=None):
+        """ ``[(id, mutual friends), ...]`` of the users two steps away, most mutual friends first """
+        adjacency = self.get_adjacency()
+        friends = adjacency.friends(user_id)
+        counts = Counter()
+        for friend_id in friends:
+            counts.update(adjacency.friends(friend_id))
+        counts.pop(user_id, None)
+        for friend_id in friends:
+            counts.pop(friend_id, None)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+
+friend_graph = FriendGraph()
@@ -0,0 +1,80 @@
+# Generated by Django 3.2.23 on 2026-10-17 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+def copy_friendships(apps, schema_editor):
+    """ One Friendship per pair found in FriendList.friends, Profile.friends or an accepted Relationship """
+    FriendList = apps.get_model('friend', 'FriendList')
+    Friendship = apps.get_model('friend', 'Friendship')
+    Profile = apps.get_model('users', 'Profile')
+    Relationship = apps.get_model('users', 'Relationship')
+
+    pairs = set()
+    pairs.update(FriendList.friends.through.objects.values_list('friendlist__user_id', 'user_id'))
+    pairs.update(Profile.friends.through.objects.values_list('profile__user_id', 'user_id'))
+    pairs.update(Relationship.objects.filter(status='accepted')
+                 .values_list('sender__user_id', 'receiver__user_id'))
+    edges = {tuple(sorted(pair)) for pair in pairs if pair[0] != pair[1]}
+    Friendship.objects.bulk_create([
+        Friendship(user_low_id=low, user_high_id=high) for low, high in sorted(edges)
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+def restore_friend_lists(apps, schema_editor):
+    FriendList = apps.get_model('friend', 'FriendList')
+    Friendship = apps.get_model('friend', 'Friendship')
+    Profile = apps.get_model('users', 'Profile')
+
+    lists = dict(FriendList.objects.values_list('user_id', 'pk'))
+    profiles = dict(Profile.objects.values_list('user_id', 'pk'))
+    list_rows, profile_rows = [], []
+    for low, high in Friendship.objects.values_list('user_low_id', 'user_high_id'):
+        for user_id, friend_id in [(low, high), (high, low)]:
+            if user_id in lists:
+                list_rows.append(FriendList.friends.through(friendlist_id=lists[user_id], user_id=friend_id))
+            if user_id in profiles:
+                profile_rows.append(Profile.friends.through(profile_id=profiles[user_id], user_id=friend_id))
+    FriendList.friends.through.objects.bulk_create(list_rows, batch_size=1000, ignore_conflicts=True)
+    Profile.friends.through.objects.bulk_create(profile_rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('friend', '0001_initial'),
+        ('users', '0007_auto_20210403_2153'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['user_high', 'user_low'], name='friendship_high_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='friendship_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.CheckConstraint(check=models.Q(('user_low__lt', django.db.models.expressions.F('user_high'))), name='friendship_ordered'),
+        ),
+        migrations.RunPython(copy_friendships, restore_friend_lists),
+        migrations.RemoveField(
+            model_name='friendlist',
+            name='friends',
+        ),
+    ]
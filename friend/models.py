@@ -1,38 +1,82 @@
-from django.db import models
-from django.db.models.fields.related import ForeignKey
-from django.utils import timezone
+from django.db import models, transaction
+from django.dispatch import Signal
 from django.contrib.auth.models import User
 
 
-""" FriendList model """
+""" One row per pair of friends, the lower user id first """
+class Friendship(models.Model):
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='friendship_unique'),
+            models.CheckConstraint(check=models.Q(user_low__lt=models.F('user_high')), name='friendship_ordered'),
+        ]
+        # the unique index serves lookups by user_low
+        indexes = [models.Index(fields=['user_high', 'user_low'], name='friendship_high_idx')]
+
+    def __str__(self):
+        return f'{self.user_low_id}-{self.user_high_id}'
+
+
+# Sent with the two user ids and whether they are now friends after a friendship starts or ends
+friendship_changed = Signal()
+
+
+def edge(user_id, other_id):
+    low, high = sorted((user_id, other_id))
+    return {'user_low_id': low, 'user_high_id': high}
+
+
+def friends_q(user_id):
+    """ Filter of ``User`` rows that are friends of ``user_id`` """
+    return (models.Q(pk__in=Friendship.objects.filter(user_low_id=user_id).values('user_high_id'))
+            | models.Q(pk__in=Friendship.objects.filter(user_high_id=user_id).values('user_low_id')))
+
+
+def friends_of(user_id):
+    return User.objects.filter(friends_q(user_id))
+
+
+def befriend(user_id, other_id):
+    """ Make the two users friends: one insert, a no-op when they already are """
+    if user_id == other_id:
+        return
+    Friendship.objects.bulk_create([Friendship(**edge(user_id, other_id))], ignore_conflicts=True)
+    friendship_changed.send(sender=Friendship, user_ids=(user_id, other_id), are_friends=True)
+
+
+def end_friendship(user_id, other_id):
+    Friendship.objects.filter(**edge(user_id, other_id)).delete()
+    friendship_changed.send(sender=Friendship, user_ids=(user_id, other_id), are_friends=False)
+
+
+""" FriendList model, a per user view of the Friendship rows """
 class FriendList(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='user')
-    friends = models.ManyToManyField(User, blank=True, related_name='friends')
     
     def __str__(self):
         return self.user.username
 
+    @property
+    def friends(self):
+        return friends_of(self.user_id)
+
     def add_friend(self, account):
-        if not account in self.friends.all():
-            self.friends.add(account)
-            self.save()
+        befriend(self.user_id, account.pk)
 
     def remove_friend(self, account):
-        if account in self.friends.all():
-            self.friends.remove(account)
-            self.save()
+        end_friendship(self.user_id, account.pk)
 
     def unfriend(self, removee):
-        remover_friends_list = self
-        remover_friends_list.remove_friend(removee)
-
-        friends_list = FriendList.objects.get(user=removee)
-        friends_list.remove_friend(self.user)
+        # the single Friendship row covers both lists
+        self.remove_friend(removee)
 
     def is_mutual_friend(self, friend):
-        if friend in self.friends.all():
-            return True
-        return False
+        from .graph import friend_graph
+        return friend_graph.are_friends(self.user_id, friend.pk)
 
 
 """ Friend Request model """
@@ -46,15 +90,10 @@ class FriendRequest(models.Model):
         return self.sender.username
 
     def accept(self):
-        # update both sender and receiver friend list
-        receiver_friend_list = FriendList.objects.get(user=self.receiver)
-        if receiver_friend_list:
-            receiver_friend_list.add_friend(self.sender)
-            sender_friend_list = FriendList.objects.get(user=self.sender)
-            if sender_friend_list:
-                sender_friend_list.add_friend(self.receiver)
-                self.is_active = False
-                self.save()
+        with transaction.atomic():
+            befriend(self.sender_id, self.receiver_id)
+            self.is_active = False
+            self.save(update_fields=['is_active'])
 
     def decline(self):
         self.is_active = False
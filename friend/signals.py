@@ -0,0 +1,17 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .graph import friendship_changed_on_commit, invalidate
+from .models import friendship_changed
+
+
+""" Pass every friendship that starts or ends on to the friend graphs of all processes """
+@receiver(friendship_changed)
+def friendship_changed_graph(sender, user_ids, are_friends, **kwargs):
+    friendship_changed_on_commit(*user_ids, are_friends)
+
+
+""" Deleting a user deletes their friendships with it """
+@receiver(post_delete, sender=User)
+def user_deleted_graph(sender, instance, **kwargs):
+    invalidate()
@@ -1,3 +1,197 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from . import graph
+from .graph import Adjacency, FriendGraph
+from .models import FriendList, FriendRequest, Friendship, befriend, end_friendship, friends_of, friendship_changed
 
-# Create your tests here.
+
+class AdjacencyTest(TestCase):
+    def test_apply_matches_a_rebuild(self):
+        pairs = [(1, 2), (1, 3), (2, 3), (3, 4)]
+        adjacency = Adjacency(sorted(pairs + [(b, a) for a, b in pairs]))
+        adjacency.apply(1, 4, True)
+        adjacency.apply(2, 3, False)
+        adjacency.apply(5, 1, True)
+        adjacency.apply(5, 1, True)
+
+        self.assertEqual(list(adjacency.friends(1)), [2, 3, 4, 5])
+        self.assertEqual(list(adjacency.friends(2)), [1])
+        self.assertEqual(list(adjacency.friends(5)), [1])
+        compacted = adjacency.compacted()
+        self.assertEqual(compacted.overrides, {})
+        self.assertEqual(list(compacted.edges()), list(adjacency.edges()))
+
+
+class FriendGraphTest(TestCase):
+    """ Processes share the version and the changes through the cache; each keeps its own graph """
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(f'user{i}') for i in range(5)]
+        self.ids = [user.pk for user in self.users]
+
+    def befriend(self, a, b):
+        with self.captureOnCommitCallbacks(execute=True):
+            befriend(self.ids[a], self.ids[b])
+
+    def test_queries(self):
+        self.befriend(0, 1)
+        self.befriend(0, 2)
+        self.befriend(1, 2)
+        self.befriend(2, 3)
+        friends = FriendGraph()
+        a, b, c, d, e = self.ids
+        self.assertEqual(list(friends.friends(a)), [b, c])
+        self.assertEqual(friends.friend_count(c), 3)
+        self.assertTrue(friends.are_friends(d, c))
+        self.assertFalse(friends.are_friends(a, d))
+        self.assertEqual(friends.mutual_friends(a, b), [c])
+        self.assertEqual(friends.friends_of_friends(a), [(d, 1)])
+        self.assertEqual(list(friends.friends(e)), [])
+
+    def test_other_processes_replay_changes_without_reloading(self):
+        first, second = FriendGraph(), FriendGraph()
+        self.befriend(0, 1)
+        self.assertTrue(second.are_friends(self.ids[0], self.ids[1]))
+        self.assertFalse(first.are_friends(self.ids[0], self.ids[2]))
+
+        self.befriend(0, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            end_friendship(self.ids[0], self.ids[1])
+        for process in (first, second):
+            with self.assertNumQueries(0):
+                self.assertEqual(list(process.friends(self.ids[0])), [self.ids[2]])
+                self.assertFalse(process.are_friends(self.ids[1], self.ids[0]))
+
+    def test_nothing_is_published_before_commit(self):
+        friends = FriendGraph()
+        friends.friends(self.ids[0])
+        version = graph.current_version()
+        befriend(self.ids[0], self.ids[1])
+        self.assertEqual(graph.current_version(), version)
+
+    def test_missing_change_reloads(self):
+        friends = FriendGraph()
+        friends.friends(self.ids[0])
+        self.befriend(0, 1)
+        cache.delete(graph.change_key(graph.current_version()))
+        with self.assertNumQueries(1):
+            self.assertTrue(friends.are_friends(self.ids[0], self.ids[1]))
+
+    def test_deleted_user_reloads(self):
+        self.befriend(0, 1)
+        friends = FriendGraph()
+        self.assertTrue(friends.are_friends(self.ids[0], self.ids[1]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[1].delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(list(friends.friends(self.ids[0])), [])
+
+    def test_far_behind_reloads(self):
+        friends = FriendGraph()
+        friends.friends(self.ids[0])
+        cache.incr(graph.VERSION_KEY, graph.MAX_REPLAY + 1)
+        with self.assertNumQueries(1):
+            friends.friends(self.ids[0])
+
+
+class FriendshipTest(TestCase):
+    """ One canonical row per pair of friends """
+
+    def setUp(self):
+        self.alice, self.bob, self.carol = [User.objects.create_user(name) for name in ('alice', 'bob', 'carol')]
+
+    def edges(self):
+        return set(Friendship.objects.values_list('user_low_id', 'user_high_id'))
+
+    def test_befriend_stores_the_pair_once_in_order(self):
+        befriend(self.bob.pk, self.alice.pk)
+        befriend(self.alice.pk, self.bob.pk)
+        self.assertEqual(self.edges(), {(self.alice.pk, self.bob.pk)})
+        self.assertEqual(list(friends_of(self.alice.pk)), [self.bob])
+        self.assertEqual(list(friends_of(self.bob.pk)), [self.alice])
+
+    def test_befriend_oneself_is_ignored(self):
+        befriend(self.alice.pk, self.alice.pk)
+        self.assertEqual(self.edges(), set())
+
+    def test_end_friendship_from_either_side(self):
+        befriend(self.alice.pk, self.bob.pk)
+        befriend(self.alice.pk, self.carol.pk)
+        end_friendship(self.bob.pk, self.alice.pk)
+        self.assertEqual(self.edges(), {(self.alice.pk, self.carol.pk)})
+        end_friendship(self.bob.pk, self.alice.pk)
+        self.assertEqual(self.edges(), {(self.alice.pk, self.carol.pk)})
+
+    def test_changes_are_signalled(self):
+        received = []
+
+        def receiver(sender, user_ids, are_friends, **kwargs):
+            received.append((user_ids, are_friends))
+        friendship_changed.connect(receiver)
+        self.addCleanup(friendship_changed.disconnect, receiver)
+
+        befriend(self.alice.pk, self.bob.pk)
+        end_friendship(self.alice.pk, self.bob.pk)
+        self.assertEqual(received, [((self.alice.pk, self.bob.pk), True), ((self.alice.pk, self.bob.pk), False)])
+
+    def test_friend_list_and_accepted_request(self):
+        FriendRequest.objects.create(sender=self.alice, receiver=self.bob).accept()
+        friend_list = FriendList.objects.get(user=self.bob)
+        self.assertEqual(list(friend_list.friends), [self.alice])
+        friend_list.unfriend(self.alice)
+        self.assertEqual(self.edges(), set())
+        self.assertFalse(FriendRequest.objects.get().is_active)
+
+
+class FriendshipMigrationTest(TransactionTestCase):
+    """ 0002_friendship folds the three older friend tables into Friendship """
+    before = [('friend', '0001_initial'), ('users', '0007_auto_20210403_2153')]
+    after = [('friend', '0002_friendship'), ('users', '0008_remove_profile_friends')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_copy_friendships_dedupes_pairs(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        FriendList = apps.get_model('friend', 'FriendList')
+        Profile = apps.get_model('users', 'Profile')
+        Relationship = apps.get_model('users', 'Relationship')
+        a, b, c, d = [User.objects.create(username=name) for name in 'abcd']
+        lists = {user.pk: FriendList.objects.create(user=user) for user in (a, b, c, d)}
+        profiles = {user.pk: Profile.objects.create(user=user) for user in (a, b, c, d)}
+        # a-b on one side of the friend lists only, and again as an accepted relationship
+        lists[b.pk].friends.add(a)
+        Relationship.objects.create(sender=profiles[a.pk], receiver=profiles[b.pk], status='accepted')
+        # a-c on both profiles and both friend lists
+        profiles[a.pk].friends.add(c)
+        profiles[c.pk].friends.add(a)
+        lists[a.pk].friends.add(c)
+        lists[c.pk].friends.add(a)
+        Relationship.objects.create(sender=profiles[d.pk], receiver=profiles[b.pk], status='accepted')
+        # neither a pending relationship nor a self friendship counts
+        Relationship.objects.create(sender=profiles[d.pk], receiver=profiles[c.pk], status='send')
+        profiles[d.pk].friends.add(d)
+
+        apps = self.migrate(self.after)
+        Friendship = apps.get_model('friend', 'Friendship')
+        self.assertEqual(
+            sorted(Friendship.objects.values_list('user_low_id', 'user_high_id')),
+            sorted([(a.pk, b.pk), (a.pk, c.pk), (b.pk, d.pk)]),
+        )
+
+        apps = self.migrate(self.before)
+        FriendList = apps.get_model('friend', 'FriendList')
+        self.assertEqual(set(FriendList.objects.get(user_id=a.pk).friends.values_list('pk', flat=True)), {b.pk, c.pk})
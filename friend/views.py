@@ -2,6 +2,7 @@ from django.shortcuts import redirect, render
 from django.http import HttpResponse
 import json
 from django.contrib.auth.models import User
+from friend.graph import friend_graph
 from friend.models import FriendList, FriendRequest
 
 
@@ -16,20 +17,19 @@ def friends_list_view(request, *args, **kwargs):
                 context['this_user'] = this_user
             except User.DoesNotExist:
                 return HttpResponse("That user does not exist.")
-            try:
-                friend_list = FriendList.objects.get(user=this_user)
-            except FriendList.DoesNotExist:
+            if not FriendList.objects.filter(user=this_user).exists():
                 return HttpResponse(f"Could not find a friends list for {this_user.username}")
             
             # Must be friends to view a friends list
             if user != this_user:
-                if not user in friend_list.friends.all():
+                if not friend_graph.are_friends(this_user.pk, user.pk):
                     return HttpResponse("You must be friends to view their friends list.")
             friends = [] # [(friend1, True), (friend2, False), ...]
-            # get the authenticated user's friend list
-            auth_user_friend_list = FriendList.objects.get(user=user)
-            for friend in friend_list.friends.all():
-                friends.append((friend, auth_user_friend_list.is_mutual_friend(friend)))
+            friend_ids = list(friend_graph.friends(this_user.pk))
+            accounts = User.objects.select_related('profile').in_bulk(friend_ids)
+            for friend_id in friend_ids:
+                if friend_id in accounts:
+                    friends.append((accounts[friend_id], friend_graph.are_friends(user.pk, friend_id)))
             context['friends'] = friends
     else:		
         return HttpResponse("You must be friends to view their friends list.")
@@ -0,0 +1,2 @@
+# system checks of the project wide settings
+from . import checks
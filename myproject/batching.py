@@ -0,0 +1,104 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+# queued by stop(): the thread handles what came before it and exits
+STOP = object()
+
+
+class BatchWorker:
+    """
+    Collects items from any thread and hands them to ``handler`` in batches
+    from one background thread: a batch is handled as soon as ``max_batch``
+    items are waiting or ``interval`` seconds after its first item.
+
+    With ``settings.BATCH_WORKERS_SYNC`` the handler runs inline instead,
+    which keeps tests deterministic. Whatever is still queued when the
+    process exits is handled by ``stop()``.
+    """
+    def __init__(self, handler, name, interval=0.05, max_batch=500):
+        self.handler = handler
+        self.name = name
+        self.interval = interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        atexit.register(self.stop)
+
+    def sync(self):
+        return getattr(settings, 'BATCH_WORKERS_SYNC', False)
+
+    def put_many(self, items):
+        items = list(items)
+        if not items:
+            return
+        if self.sync():
+            self.handler(items)
+            return
+        for item in items:
+            self.queue.put(item)
+        self._ensure_thread()
+
+    def put(self, item):
+        self.put_many([item])
+
+    def flush(self):
+        """ Handle everything queued so far in the calling thread """
+        items = [item for item in self._drain(self.queue.qsize()) if item is not STOP]
+        if items:
+            self.handler(items)
+
+    def stop(self, timeout=5):
+        """ Let the thread handle what is queued and exit, then handle anything left here """
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None and thread.is_alive():
+            self.queue.put(STOP)
+            thread.join(timeout)
+        self.flush()
+
+    def _ensure_thread(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name=f'batch-{self.name}', daemon=True)
+                self.thread.start()
+
+    def _drain(self, limit, wait=0):
+        """ Up to ``limit`` queued items, waiting at most ``wait`` seconds in total for them """
+        items = []
+        deadline = time.monotonic() + wait
+        while len(items) < limit:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            if item is STOP:
+                break
+        return items
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            if batch[0] is not STOP:
+                batch += self._drain(self.max_batch - 1, wait=self.interval)
+            stopping = batch[-1] is STOP
+            batch = [item for item in batch if item is not STOP]
+            if not batch:
+                continue
+            try:
+                self.handler(batch)
+            except Exception:
+                logger.exception('%s worker dropped a batch of %d item(s)', self.name, len(batch))
+            finally:
+                close_old_connections()
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+
+""" The default cache must be shared once the site runs in several processes
+
+Counters and state kept in the default cache are adjusted in place by the
+process that changes them. With a per process backend the other processes
+never see those adjustments, so their copies drift apart for good.
+"""
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+HINT = 'Set CACHE_REDIS_URL so that every process uses the same Redis cache.'
+
+
+def cache_is_process_local():
+    return settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_BACKENDS
+
+
+@register(Tags.caches)
+def check_cache_shared_by_workers(app_configs, **kwargs):
+    """ Workers sharing the sharded channel layer are separate processes """
+    if getattr(settings, 'CHANNEL_REDIS_HOSTS', None) and cache_is_process_local():
+        return [Error(
+            'Several workers share the channel layer but the default cache is local to each process.',
+            hint=HINT, id='myproject.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_cache_shared_in_production(app_configs, **kwargs):
+    if cache_is_process_local():
+        return [Warning(
+            'The default cache is local to each process; unread counts, friend graphs and presence diverge between workers.',
+            hint=HINT, id='myproject.W001',
+        )]
+    return []
@@ -0,0 +1,3 @@
+from .core import ShardedChannelLayer
+from .fakeserver import FakeRedisServer
+from .hashring import HashRing
@@ -0,0 +1,254 @@
+import asyncio
+import time
+import uuid
+import weakref
+from collections import Counter, defaultdict, deque
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from .hashring import HashRing
+from .resp import Connection
+
+
+def parse_host(host):
+    """ Accept ``(host, port)``, ``"host:port"`` or ``"redis://host:port"`` """
+    if isinstance(host, (list, tuple)):
+        return host[0], int(host[1])
+    host = host.split('://', 1)[-1].rstrip('/')
+    name, _, port = host.rpartition(':')
+    if not name:
+        return port, 6379
+    return name, int(port)
+
+
+class ShardedChannelLayer(BaseChannelLayer):
+    """
+    Channel layer storing its queues on several Redis protocol nodes.
+
+    Every channel queue and every group lives on the node the consistent hash
+    ring picks for its name, so ``chat_<room>`` and ``notifications_<id>``
+    groups spread over the nodes and any number of ASGI workers share them.
+    Channels are lists (RPUSH / BLPOP), groups are sorted sets of channel
+    names scored by the time they were added.
+
+    As in channels_redis, the channels of consumers (``new_channel()``) are
+    process-local: ``specific.<layer id>!<id>``. Their messages all go to the
+    one list of ``specific.<layer id>!``, tagged with the full channel name,
+    and every receive on a node shares one blocking connection that reads for
+    all of them and hands each message to its channel's buffer. Redis
+    connections grow with nodes and processes, not with open WebSockets.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self,
+        hosts=None,
+        prefix='asgi',
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        replicas=128,
+        poll_timeout=1,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.hosts = [parse_host(host) for host in hosts or [('127.0.0.1', 6379)]]
+        self.ring = HashRing([f'{host}:{port}' for host, port in self.hosts], replicas)
+        self.prefix = prefix
+        self.group_expiry = group_expiry
+        self.poll_timeout = poll_timeout
+        self.client_prefix = uuid.uuid4().hex
+        # connections are bound to the event loop that opened them
+        self.loops = weakref.WeakKeyDictionary()
+
+    # Connections
+
+    def _connections(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.loops:
+            self.loops[loop] = {
+                'nodes': {},
+                'receivers': {},
+                # per node: the lock of its receiving connection and the keys receives wait on
+                'receive_locks': defaultdict(asyncio.Lock),
+                'waiting': defaultdict(Counter),
+                # messages read for a channel before its consumer asked for them
+                'buffers': defaultdict(deque),
+            }
+        return self.loops[loop]
+
+    def connection(self, index):
+        nodes = self._connections()['nodes']
+        if index not in nodes:
+            nodes[index] = Connection(*self.hosts[index])
+        return nodes[index]
+
+    def receiver(self, index):
+        """ The connection doing the blocking reads of every receive on node ``index`` """
+        receivers = self._connections()['receivers']
+        if index not in receivers:
+            receivers[index] = Connection(*self.hosts[index])
+        return receivers[index]
+
+    @staticmethod
+    def non_local_name(channel):
+        """ ``specific.abc!def`` -> ``specific.abc!``, the list that holds the channel's messages """
+        if '!' in channel:
+            return channel[:channel.index('!') + 1]
+        return channel
+
+    def node_index(self, channel):
+        return self.ring.index(self.non_local_name(channel))
+
+    def channel_key(self, channel):
+        return f'{self.prefix}:{self.non_local_name(channel)}'
+
+    def group_key(self, group):
+        return f'{self.prefix}:group:{group}'
+
+    def serialize(self, message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    def deserialize(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+    # Channel layer API
+
+    def pack(self, channel, message):
+        """ Serialize ``message`` for ``channel``; process-local channels share a list, so it is tagged """
+        if '!' in channel:
+            message = dict(message, __asgi_channel__=channel)
+        return self.serialize(message)
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        connection = self.connection(self.node_index(channel))
+        key = self.channel_key(channel)
+        if await connection.execute('LLEN', key) >= self.get_capacity(channel):
+            raise ChannelFull(channel)
+        await connection.pipeline([
+            ('RPUSH', key, self.pack(channel, message)),
+            ('EXPIRE', key, int(self.expiry)),
+        ])
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        connections = self._connections()
+        buffers = connections['buffers']
+        index = self.node_index(channel)
+        key = self.channel_key(channel)
+        waiting = connections['waiting'][index]
+        waiting[key] += 1
+        try:
+            while not buffers.get(channel):
+                # one receive at a time reads for all of them; the others wait for
+                # the lock and usually find their message buffered once they get it
+                async with connections['receive_locks'][index]:
+                    if not buffers.get(channel):
+                        await self._read(index, list(waiting))
+            return buffers[channel].popleft()
+        finally:
+            waiting[key] -= 1
+            if waiting[key] <= 0:
+                del waiting[key]
+            if channel in buffers and not buffers[channel]:
+                del buffers[channel]
+
+    async def _read(self, index, keys):
+        """ Block on ``keys`` of node ``index`` for at most poll_timeout and buffer what comes """
+        connections = self._connections()
+        connection = self.receiver(index)
+        try:
+            reply = await connection.execute('BLPOP', *keys, self.poll_timeout)
+        except BaseException:
+            # cancelled (the consumer went away) or broken: the connection was dropped
+            connections['receivers'].pop(index, None)
+            raise
+        if reply is None:
+            return
+        key, data = reply
+        message = self.deserialize(data)
+        channel = message.pop('__asgi_channel__', None)
+        if channel is None:
+            channel = key.decode()[len(self.prefix) + 1:]
+            if not connections['waiting'][index].get(key.decode()):
+                # its receive was cancelled meanwhile: leave it to the other processes
+                await self.connection(index).execute('LPUSH', key, data)
+                return
+        connections['buffers'][channel].append(message)
+
+    async def new_channel(self, prefix='specific.'):
+        return f'{prefix}{self.client_prefix}!{uuid.uuid4().hex}'
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        key = self.group_key(group)
+        await self.connection(self.ring.index(group)).pipeline([
+            ('ZADD', key, time.time(), channel),
+            ('EXPIRE', key, int(self.group_expiry)),
+        ])
+
+    async def group_discard(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self.connection(self.ring.index(group)).execute('ZREM', self.group_key(group), channel)
+
+    async def group_send(self, group, message):
+        assert self.valid_group_name(group), 'Group name not valid'
+        key = self.group_key(group)
+        _, members = await self.connection(self.ring.index(group)).pipeline([
+            ('ZREMRANGEBYSCORE', key, 0, time.time() - self.group_expiry),
+            ('ZRANGE', key, 0, -1),
+        ])
+        by_node = defaultdict(list)
+        for member in members:
+            channel = member.decode()
+            by_node[self.node_index(channel)].append(channel)
+
+        await asyncio.gather(*(
+            self._push_many(index, channels, message) for index, channels in by_node.items()
+        ))
+
+    async def _push_many(self, index, channels, message):
+        """ Push ``message`` onto every channel of one node, skipping full ones, in two round trips """
+        connection = self.connection(index)
+        keys = list(dict.fromkeys(self.channel_key(channel) for channel in channels))
+        lengths = dict(zip(keys, await connection.pipeline([('LLEN', key) for key in keys])))
+        data = self.serialize(message)
+        commands = []
+        for channel in channels:
+            key = self.channel_key(channel)
+            if lengths[key] < self.get_capacity(channel):
+                lengths[key] += 1
+                packed = self.pack(channel, message) if '!' in channel else data
+                commands += [('RPUSH', key, packed), ('EXPIRE', key, int(self.expiry))]
+        if commands:
+            await connection.pipeline(commands)
+
+    # Flush extension
+
+    async def flush(self):
+        """ Delete every key of this layer on every node, walking them with SCAN rather than KEYS """
+        for index in range(len(self.hosts)):
+            connection = self.connection(index)
+            cursor = b'0'
+            while True:
+                cursor, keys = await connection.execute('SCAN', cursor, 'MATCH', f'{self.prefix}:*', 'COUNT', 1000)
+                if keys:
+                    await connection.execute('DEL', *keys)
+                if cursor in (b'0', 0):
+                    break
+        self._connections()['buffers'].clear()
+
+    async def close(self):
+        connections = self._connections()
+        for connection in list(connections['nodes'].values()) + list(connections['receivers'].values()):
+            connection.close()
+        connections['nodes'].clear()
+        connections['receivers'].clear()
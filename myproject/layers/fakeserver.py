@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import fnmatch
+import threading
+import time
+from collections import deque
+from .resp import RespError, encode_reply, read_reply
+
+
+class FakeRedisServer:
+    """
+    Pure Python server speaking the subset of the Redis protocol used by
+    ShardedChannelLayer (lists, sorted sets, expiry, KEYS/SCAN/DEL). Meant for
+    tests, benchmarks and local development without Redis.
+
+        server = FakeRedisServer().start_in_thread()
+        ... ShardedChannelLayer(hosts=[server.address]) ...
+        server.stop()
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.lists = {}
+        self.zsets = {}
+        self.expires = {}
+        self.waiters = {}
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+    @property
+    def address(self):
+        return f'{self.host}:{self.port}'
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def start_in_thread(self):
+        """ Serve from a background thread with its own event loop """
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.close())
+            # drop the connections still open
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name='fake-redis', daemon=True)
+        self.thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+                name, args = command[0].decode().lower(), command[1:]
+                method = getattr(self, f'cmd_{name}', None)
+                if method is None:
+                    result = RespError(f"ERR unknown command '{name}'")
+                else:
+                    try:
+                        result = method(*args)
+                        if asyncio.iscoroutine(result):
+                            result = await result
+                    except (TypeError, ValueError) as e:
+                        result = RespError(f'ERR {e}')
+                writer.write(encode_reply(result))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # client went away, or the server is shutting down
+            pass
+        finally:
+            writer.close()
+
+    # Keys
+
+    def expire_stale(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self.delete(key)
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        return int(self.lists.pop(key, None) is not None) + int(self.zsets.pop(key, None) is not None)
+
+    def cmd_ping(self, *args):
+        return args[0] if args else 'PONG'
+
+    def cmd_expire(self, key, seconds):
+        self.expire_stale(key)
+        if key not in self.lists and key not in self.zsets:
+            return 0
+        self.expires[key] = time.time() + int(seconds)
+        return 1
+
+    def cmd_del(self, *keys):
+        return sum(self.delete(key) for key in keys)
+
+    def matching(self, pattern):
+        pattern = pattern.decode()
+        for key in list(self.lists) + list(self.zsets):
+            self.expire_stale(key)
+        return [key for key in list(self.lists) + list(self.zsets) if fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def cmd_keys(self, pattern):
+        return self.matching(pattern)
+
+    def cmd_scan(self, cursor, *options):
+        """ The cursor is a position in the sorted key names; MATCH and COUNT are honoured """
+        options = dict(zip((name.decode().lower() for name in options[::2]), options[1::2]))
+        count = int(options.get('count', 10))
+        keys = sorted(self.matching(options.get('match', b'*')))
+        start = int(cursor)
+        end = start + count
+        return [str(end if end < len(keys) else 0).encode(), keys[start:end]]
+
+    def cmd_flushdb(self):
+        self.lists.clear()
+        self.zsets.clear()
+        self.expires.clear()
+        return 'OK'
+
+    cmd_flushall = cmd_flushdb
+
+    # Lists
+
+    def cmd_rpush(self, key, *values):
+        self.expire_stale(key)
+        items = self.lists.setdefault(key, deque())
+        items.extend(values)
+        return self.wake(key, items)
+
+    def cmd_lpush(self, key, *values):
+        self.expire_stale(key)
+        items = self.lists.setdefault(key, deque())
+        items.extendleft(values)
+        return self.wake(key, items)
+
+    def wake(self, key, items):
+        length = len(items)
+        # hand values straight to blocked BLPOP callers
+        waiters = self.waiters.get(key)
+        while waiters and items:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result([key, items.popleft()])
+        if not items:
+            self.delete(key)
+        return length
+
+    def cmd_lpop(self, key):
+        self.expire_stale(key)
+        items = self.lists.get(key)
+        if not items:
+            return None
+        value = items.popleft()
+        if not items:
+            self.delete(key)
+        return value
+
+    def cmd_llen(self, key):
+        self.expire_stale(key)
+        return len(self.lists.get(key, ()))
+
+    async def cmd_blpop(self, *args):
+        keys, timeout = args[:-1], float(args[-1])
+        for key in keys:
+            value = self.cmd_lpop(key)
+            if value is not None:
+                return [key, value]
+        waiter = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self.waiters.setdefault(key, deque()).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout or None)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            for key in keys:
+                if waiter in self.waiters.get(key, ()):
+                    self.waiters[key].remove(waiter)
+
+    # Sorted sets
+
+    def cmd_zadd(self, key, *pairs):
+        self.expire_stale(key)
+        members = self.zsets.setdefault(key, {})
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in members
+            members[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        self.expire_stale(key)
+        zset = self.zsets.get(key, {})
+        removed = sum(zset.pop(member, None) is not None for member in members)
+        if key in self.zsets and not zset:
+            self.delete(key)
+        return removed
+
+    def sorted_members(self, key):
+        self.expire_stale(key)
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def cmd_zrange(self, key, start, stop):
+        members = [member for member, _ in self.sorted_members(key)]
+        start, stop = int(start), int(stop)
+        stop = len(members) + stop if stop < 0 else stop
+        return members[start:stop + 1]
+
+    def cmd_zremrangebyscore(self, key, low, high):
+        low, high = float(low), float(high)
+        stale = [member for member, score in self.sorted_members(key) if low <= score <= high]
+        return self.cmd_zrem(key, *stale) if stale else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a FakeRedisServer for local development')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    async def serve():
+        server = await FakeRedisServer(args.host, args.port).start()
+        print(f'Fake Redis listening on {server.address}')
+        await server.server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import bisect
+import hashlib
+
+
+class HashRing:
+    """
+    Consistent hash ring. Every node owns ``replicas`` points on the ring and
+    a key belongs to the first point after its hash, so adding or removing a
+    node only moves the keys of that node.
+    """
+    def __init__(self, nodes, replicas=128):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError('HashRing needs at least one node')
+        points = sorted(
+            (self.hash(f'{node}#{replica}'), index)
+            for index, node in enumerate(self.nodes)
+            for replica in range(replicas)
+        )
+        self.points = [point for point, _ in points]
+        self.owners = [index for _, index in points]
+
+    @staticmethod
+    def hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def index(self, key):
+        """ Index in ``nodes`` of the node owning ``key`` """
+        position = bisect.bisect(self.points, self.hash(key)) % len(self.points)
+        return self.owners[position]
+
+    def node(self, key):
+        return self.nodes[self.index(key)]
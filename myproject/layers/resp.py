@@ -0,0 +1,98 @@
+import asyncio
+
+
+""" Minimal asyncio client for the Redis serialization protocol (RESP2)
+
+Only what the channel layer needs: commands, pipelines and the five reply
+types. Used against Redis itself or the in-process FakeRedisServer.
+"""
+
+class RespError(Exception):
+    pass
+
+
+def encode_command(args):
+    out = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(out)
+
+
+def encode_reply(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, RespError):
+        return b'-%s\r\n' % str(value).encode()
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    return b'*%d\r\n' % len(value) + b''.join(encode_reply(item) for item in value)
+
+
+async def read_reply(reader):
+    """ Read one reply (or one command, which is an array of bulk strings). Errors are returned, not raised """
+    line = await reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('connection closed')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        return RespError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b'*':
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RespError(f'protocol error: {line!r}')
+
+
+class Connection:
+    """ One lazily opened connection; commands are serialized by a lock """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def execute(self, *args):
+        return (await self.pipeline([args]))[0]
+
+    async def pipeline(self, commands):
+        """ Send ``commands`` in one write and return their replies, raising the first error """
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.writer.write(b''.join(encode_command(args) for args in commands))
+                await self.writer.drain()
+                replies = [await read_reply(self.reader) for _ in commands]
+            except BaseException:
+                # a half read reply would desynchronize the stream, start over
+                self.close()
+                raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
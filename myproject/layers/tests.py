@@ -0,0 +1,115 @@
+import asyncio
+from channels.exceptions import ChannelFull
+from django.test import SimpleTestCase
+from myproject.layers import FakeRedisServer, HashRing, ShardedChannelLayer
+
+
+class HashRingTest(SimpleTestCase):
+    def test_adding_a_node_only_moves_its_share_of_keys(self):
+        keys = [f'chat_{i}' for i in range(2000)]
+        before = HashRing(['a:1', 'b:1', 'c:1'])
+        after = HashRing(['a:1', 'b:1', 'c:1', 'd:1'])
+        moved = [key for key in keys if before.node(key) != after.node(key)]
+        self.assertTrue(all(after.node(key) == 'd:1' for key in moved))
+        self.assertLess(len(moved), len(keys) * 0.4)
+        self.assertEqual({before.node(key) for key in keys}, {'a:1', 'b:1', 'c:1'})
+
+
+class ShardedChannelLayerTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servers = [FakeRedisServer().start_in_thread() for _ in range(3)]
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers:
+            server.stop()
+        super().tearDownClass()
+
+    def layer(self, **kwargs):
+        return ShardedChannelLayer(hosts=[server.address for server in self.servers], **kwargs)
+
+    async def test_send_receive(self):
+        layer = self.layer()
+        channel = await layer.new_channel()
+        await layer.send(channel, {'type': 'test', 'text': 'hello'})
+        self.assertEqual(await layer.receive(channel), {'type': 'test', 'text': 'hello'})
+        await layer.flush()
+        await layer.close()
+
+    async def test_group_send_reaches_members_on_every_shard(self):
+        layer = self.layer()
+        # channel names are random, add some until every shard has members
+        channels = []
+        while len(channels) < 12 or len({layer.ring.index(channel) for channel in channels}) < 3:
+            channels.append(await layer.new_channel())
+        for channel in channels:
+            await layer.group_add('chat_1', channel)
+        await layer.group_discard('chat_1', channels[0])
+
+        await layer.group_send('chat_1', {'type': 'chatroom.message', 'message': 'hi'})
+        received = await asyncio.gather(*(layer.receive(channel) for channel in channels[1:]))
+        self.assertEqual([message['message'] for message in received], ['hi'] * (len(channels) - 1))
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channels[0]), 0.2)
+        await layer.flush()
+        await layer.close()
+
+    async def test_capacity(self):
+        layer = self.layer(capacity=2)
+        channel = await layer.new_channel()
+        await layer.send(channel, {'type': 'test'})
+        await layer.send(channel, {'type': 'test'})
+        with self.assertRaises(ChannelFull):
+            await layer.send(channel, {'type': 'test'})
+        await layer.flush()
+        await layer.close()
+
+    async def test_receives_share_one_connection_per_node(self):
+        layer = self.layer()
+        channels = [await layer.new_channel() for _ in range(30)]
+        receives = [asyncio.ensure_future(layer.receive(channel)) for channel in channels]
+        await asyncio.sleep(0.05)
+        for i, channel in enumerate(channels):
+            await layer.send(channel, {'type': 'test', 'n': i})
+        received = await asyncio.wait_for(asyncio.gather(*receives), 5)
+        self.assertEqual([message['n'] for message in received], list(range(30)))
+        # every channel of the process lives in one list, read by one connection
+        self.assertEqual(len(layer._connections()['receivers']), 1)
+        await layer.flush()
+        await layer.close()
+
+    async def test_named_channel_is_shared_between_layers(self):
+        sender, worker = self.layer(), self.layer()
+        await sender.send('thumbnails', {'type': 'test', 'id': 1})
+        self.assertEqual(await worker.receive('thumbnails'), {'type': 'test', 'id': 1})
+        await sender.flush()
+        await sender.close()
+        await worker.close()
+
+    async def test_message_read_for_a_cancelled_receive_goes_back(self):
+        layer, other = self.layer(), self.layer()
+        await other.send('jobs', {'type': 'test'})
+        # read on behalf of a receive that is no longer waiting
+        await layer._read(layer.node_index('jobs'), [layer.channel_key('jobs')])
+        self.assertNotIn('jobs', layer._connections()['buffers'])
+        self.assertEqual(await asyncio.wait_for(other.receive('jobs'), 2), {'type': 'test'})
+        await other.flush()
+        await layer.close()
+        await other.close()
+
+    async def test_flush_scans_instead_of_keys(self):
+        layer = self.layer()
+        for server in self.servers:
+            server.cmd_keys = None
+        try:
+            for i in range(2500):
+                await layer.send(f'flushed{i}', {'type': 'test'})
+            await layer.flush()
+        finally:
+            for server in self.servers:
+                del server.cmd_keys
+        for server in self.servers:
+            self.assertFalse(server.matching(b'asgi:*'))
+        await layer.close()
@@ -67,7 +67,7 @@ INSTALLED_APPS = [
     'notification',
     'chat',
     'channels',
-    'friend',
+    'friend.apps.FriendConfig',
     'videocall',
     'search',
     'api',
@@ -140,6 +140,35 @@ ELASTICSEARCH_DSL = {
 
 # Disable Elasticsearch autosync in development when ES may not be running
 ELASTICSEARCH_DSL_AUTOSYNC = False
+# Index updates are queued and bulk written by search.indexing instead
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = 'django_elasticsearch_dsl.signals.BaseSignalProcessor'
+
+# Search backend behind search.views.perform_search: 'local' (embedded on-disk
+# index, see search.backends.local), 'elasticsearch' or a dotted class path
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'local')
+SEARCH_LOCAL_INDEX_DIR = BASE_DIR / 'search_index'
+# Journal size after which the local index is compacted into a new snapshot
+SEARCH_LOCAL_COMPACT_BYTES = 4 * 1024 * 1024
+# Push post / user changes to the backend once committed
+SEARCH_AUTOSYNC = True
+# Queued index updates are written every SEARCH_INDEX_INTERVAL seconds, or per SEARCH_INDEX_BATCH
+SEARCH_INDEX_INTERVAL = 1.0
+SEARCH_INDEX_BATCH = 500
+# Progress of an Elasticsearch rebuild, for build_search_index --resume
+SEARCH_REINDEX_CHECKPOINT = BASE_DIR / 'search_index' / 'elasticsearch-reindex.json'
+# Age in seconds after which a worker rebuilds its typeahead table, and how long
+# a suggestions response is cached
+SEARCH_TYPEAHEAD_TTL = 300
+SEARCH_SUGGESTIONS_CACHE_TIMEOUT = 60
+# Queued search analytics are written every SEARCH_ANALYTICS_INTERVAL seconds
+SEARCH_ANALYTICS_INTERVAL = 2.0
+
+# A user stays online PRESENCE_TTL seconds after their last WebSocket heartbeat
+# (the pages send one every 30 seconds). Kept in the default cache, see CACHE_REDIS_URL
+PRESENCE_TTL = 90
+
+# Render search results from the index source ('source') or from the database rows ('db')
+SEARCH_HYDRATION = 'source'
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -212,15 +241,76 @@ MESSAGE_TAGS = {
 
 ASGI_APPLICATION = "myproject.routing.application"
 
-# Use in-memory channel layer for local development (no Redis required)
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
-}
+# Comma separated "host:port" list of Redis nodes. Groups and channels are
+# sharded over them, which lets several ASGI workers share the layer.
+CHANNEL_REDIS_HOSTS = [host for host in os.getenv("CHANNEL_REDIS_HOSTS", "").split(",") if host]
+
+if CHANNEL_REDIS_HOSTS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "myproject.layers.ShardedChannelLayer",
+            "CONFIG": {
+                "hosts": CHANNEL_REDIS_HOSTS,
+            },
+        },
+    }
+else:
+    # Use in-memory channel layer for local development (no Redis required)
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# Chat messages are inserted in batches every CHAT_WRITE_BEHIND_MS milliseconds
+# (or once CHAT_WRITE_BEHIND_MAX are waiting); 0 saves every message right away
+CHAT_WRITE_BEHIND_MS = int(os.getenv("CHAT_WRITE_BEHIND_MS", "0"))
+CHAT_WRITE_BEHIND_MAX = 100
+# A batch whose insert fails is retried with the next one this many times before it is dropped
+CHAT_WRITE_BEHIND_RETRIES = 3
+
+# New notifications are pushed over the channel layer in batches: the ones
+# created within this many milliseconds are coalesced into one frame per user
+NOTIFICATION_COALESCE_MS = 2000
+
+# Run the background batch writers (myproject.batching) inline, e.g. in tests
+BATCH_WORKERS_SYNC = False
+
+# Seen notifications older than this are removed by compact_notifications
+NOTIFICATION_RETENTION_DAYS = 30
 
 SITE_ID = 1
 
+# Cache used for the dashboard statistics and other derived data. The unread
+# notification counts, the friend graph version and who is online are kept in it too,
+# so as soon as more than one process serves the site it must be shared: set CACHE_REDIS_URL,
+# e.g. redis://127.0.0.1:6379/1.
+# Without it every process keeps its own LocMem copy, fine for a single dev server.
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            },
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# Seconds after which the cached dashboard statistics are recounted
+STATS_RECONCILE_INTERVAL = 300
+
+# Seconds a user's "who to follow" candidate pool is cached
+SUGGESTIONS_CACHE_TIMEOUT = 600
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
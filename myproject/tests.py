@@ -0,0 +1,97 @@
+import threading
+import time
+from django.test import SimpleTestCase, override_settings
+from myproject.batching import BatchWorker
+from myproject.checks import check_cache_shared_by_workers, check_cache_shared_in_production
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS = {'default': {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}}
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    @override_settings(CACHES=LOCMEM, CHANNEL_REDIS_HOSTS=['127.0.0.1:6379', '127.0.0.1:6380'])
+    def test_workers_sharing_the_layer_need_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_cache_shared_by_workers(None)], ['myproject.E001'])
+
+    @override_settings(CACHES=REDIS, CHANNEL_REDIS_HOSTS=['127.0.0.1:6379'])
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_cache_shared_by_workers(None), [])
+        self.assertEqual(check_cache_shared_in_production(None), [])
+
+    @override_settings(CACHES=LOCMEM, CHANNEL_REDIS_HOSTS=[])
+    def test_single_process_only_warns_on_deploy(self):
+        self.assertEqual(check_cache_shared_by_workers(None), [])
+        self.assertEqual([warning.id for warning in check_cache_shared_in_production(None)], ['myproject.W001'])
+
+
+@override_settings(BATCH_WORKERS_SYNC=False)
+class BatchWorkerTest(SimpleTestCase):
+    """ The background thread hands over full batches at once, partial ones after the interval """
+
+    def worker(self, fail=False, **kwargs):
+        self.batches = []
+        self.handled = threading.Semaphore(0)
+
+        def handler(items):
+            self.batches.append(items)
+            self.handled.release()
+            if fail and len(self.batches) == 1:
+                raise ValueError('bad batch')
+        worker = BatchWorker(handler, name='test', **kwargs)
+        self.addCleanup(worker.stop)
+        return worker
+
+    def wait(self):
+        self.assertTrue(self.handled.acquire(timeout=5), 'no batch was handled')
+
+    def test_full_batch_is_handled_at_once(self):
+        worker = self.worker(interval=60, max_batch=3)
+        started = time.monotonic()
+        worker.put_many(range(5))
+        self.wait()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.batches, [[0, 1, 2]])
+        self.assertTrue(worker.thread.is_alive())
+
+    def test_partial_batch_waits_for_the_interval(self):
+        worker = self.worker(interval=0.2, max_batch=100)
+        started = time.monotonic()
+        worker.put('a')
+        worker.put('b')
+        self.wait()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(self.batches, [['a', 'b']])
+        worker.put('c')
+        self.wait()
+        self.assertEqual(self.batches[-1], ['c'])
+
+    def test_stop_drains_the_queue(self):
+        worker = self.worker(interval=60, max_batch=2)
+        worker.put_many(range(5))
+        thread = worker.thread
+        worker.stop()
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([item for batch in self.batches for item in batch], list(range(5)))
+        self.assertTrue(all(len(batch) <= 2 for batch in self.batches))
+        # a later item starts a new thread
+        worker.put('late')
+        worker.stop()
+        self.assertEqual(self.batches[-1], ['late'])
+
+    def test_failed_batch_is_dropped_and_the_thread_goes_on(self):
+        worker = self.worker(fail=True, interval=0.01)
+        with self.assertLogs('myproject.batching', 'ERROR') as logs:
+            worker.put('bad')
+            self.wait()
+            # handled by the same thread, after the failure was logged
+            worker.put('good')
+            self.wait()
+        self.assertIn('test worker dropped a batch of 1 item(s)', logs.output[0])
+        self.assertEqual(self.batches, [['bad'], ['good']])
+
+    @override_settings(BATCH_WORKERS_SYNC=True)
+    def test_sync_mode_runs_inline(self):
+        worker = self.worker()
+        worker.put_many(['a', 'b'])
+        self.assertEqual(self.batches, [['a', 'b']])
+        self.assertIsNone(worker.thread)
@@ -1,8 +1,13 @@
+import asyncio
 import json
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from .dispatch import dispatcher
 from .models import Notification
+from .unread import mark_all_seen, mark_seen, unread_count
+from users import presence
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
@@ -23,6 +28,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        # new notifications are pushed from this loop
+        dispatcher.bind(asyncio.get_running_loop())
+        # every open page keeps this socket, so it doubles as the presence connection
+        await sync_to_async(presence.connected)(self.user.id)
         
         # Send unread count on connect
         unread_count = await self.get_unread_count()
@@ -32,6 +41,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         }))
     
     async def disconnect(self, close_code):
+        if not hasattr(self, 'room_group_name'):
+            return
+        await sync_to_async(presence.disconnected)(self.user.id)
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -44,7 +56,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             data = json.loads(text_data)
             message_type = data.get('type')
             
-            if message_type == 'mark_read':
+            if message_type == 'heartbeat':
+                await sync_to_async(presence.heartbeat)(self.user.id)
+
+            elif message_type == 'mark_read':
                 notification_id = data.get('notification_id')
                 await self.mark_notification_read(notification_id)
                 
@@ -61,6 +76,14 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'notification': event['notification']
         }))
     
+    async def notification_batch(self, event):
+        """Send the notifications coalesced by notification.dispatch, with the unread count"""
+        await self.send(text_data=json.dumps({
+            'type': 'notifications',
+            'notifications': event['notifications'],
+            'unread_count': event['unread_count'],
+        }))
+
     async def notification_update(self, event):
         """Send notification update to WebSocket"""
         await self.send(text_data=json.dumps({
@@ -71,15 +94,14 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_unread_count(self):
         """Get unread notification count"""
-        return Notification.objects.filter(user=self.user, is_seen=False).count()
+        return unread_count(self.user.id)
     
     @database_sync_to_async
     def mark_notification_read(self, notification_id):
         """Mark specific notification as read"""
         try:
             notification = Notification.objects.get(id=notification_id, user=self.user)
-            notification.is_seen = True
-            notification.save()
+            mark_seen(notification)
             return True
         except Notification.DoesNotExist:
             return False
@@ -87,7 +109,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def mark_all_notifications_read(self):
         """Mark all notifications as read"""
-        Notification.objects.filter(user=self.user, is_seen=False).update(is_seen=True)
+        mark_all_seen(self.user.id)
         return True
 
 
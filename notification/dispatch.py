@@ -0,0 +1,187 @@
+import logging
+import threading
+from collections import OrderedDict
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from .models import Notification
+from .unread import unread_counts
+
+
+""" Pushing new notifications to the users' WebSockets
+
+Notifications are queued when the transaction creating them commits and
+sent every NOTIFICATION_COALESCE_MS milliseconds, from the event loop of
+the process' notification consumers (see Dispatcher): the notifications of one
+window are grouped per (recipient, post, type), so fifty likes on a post
+become one "alice and 49 others liked your post" entry, and every recipient
+gets one frame per window carrying the groups and the unread count.
+"""
+
+logger = logging.getLogger(__name__)
+
+VERBS = {
+    1: 'liked your post',
+    2: 'started following you',
+    3: 'commented on your post',
+    4: 'replied on your post',
+    5: 'liked your comment',
+    6: 'liked your reply',
+}
+ACTORS_SHOWN = 3
+
+
+def coalesce_window():
+    return getattr(settings, 'NOTIFICATION_COALESCE_MS', 2000) / 1000
+
+
+def group_name(user_id):
+    return f'notifications_{user_id}'
+
+
+def describe(actors, actor_count, notification_type):
+    """ "alice", "alice and bob" or "alice and 49 others", followed by the verb """
+    if not actors:
+        who = 'Someone'
+    elif actor_count == 1:
+        who = actors[0]
+    elif actor_count == 2 and len(actors) == 2:
+        who = f'{actors[0]} and {actors[1]}'
+    else:
+        who = f'{actors[0]} and {actor_count - 1} others'
+    return f'{who} {VERBS.get(notification_type, "notified you")}'
+
+
+def coalesce(notifications, usernames):
+    """
+    Group ``notifications`` (oldest first) per recipient, post and type.
+    ``usernames`` maps the actor ids to names. Returns ``{user_id: [entry, ...]}``
+    """
+    groups = OrderedDict()
+    for notification in notifications:
+        key = (notification.user_id, notification.post_id, notification.notification_type)
+        groups.setdefault(key, []).append(notification)
+
+    entries = {}
+    for (user_id, post_id, notification_type), group in groups.items():
+        latest = group[-1]
+        actor_ids = list(OrderedDict.fromkeys(pk for n in reversed(group) for pk in n.actor_ids()))
+        actors = [usernames[pk] for pk in actor_ids if pk in usernames]
+        # aggregated rows count actors beyond the recent ones they list
+        actor_count = max(sum(n.actor_count for n in group), len(actors))
+        entries.setdefault(user_id, []).append({
+            'id': latest.id,
+            'ids': [n.id for n in group],
+            'notification_type': notification_type,
+            'post_id': post_id,
+            'post_title': latest.post.title if latest.post_id else None,
+            'actors': actors[:ACTORS_SHOWN],
+            'actor_count': actor_count,
+            'text': describe(actors, actor_count, notification_type),
+            'text_preview': latest.text_preview,
+            'date': latest.date.isoformat(),
+        })
+    return entries
+
+
+class Dispatcher:
+    """
+    Process wide queue of committed notification ids, flushed once per
+    coalescing window on the event loop serving this process' WebSockets:
+    the channel layer's connections and queues belong to that loop, so the
+    frames must be sent from it rather than from the committing thread.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.scheduled = False
+        self.loop = None
+        # flushes in progress, kept so that they are not garbage collected
+        self.tasks = set()
+
+    def bind(self, loop):
+        """ Flush on ``loop``, the loop the notification consumers run on """
+        self.loop = loop
+
+    def bound_loop(self):
+        loop = self.loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return None
+        return loop
+
+    def enqueue(self, notification_id):
+        """ Queue a committed notification, from any thread """
+        loop = self.bound_loop()
+        if loop is None:
+            # no WebSocket served by this process (a management command, a test): send right away
+            self.send_now([notification_id])
+            return
+        with self.lock:
+            self.pending.append(notification_id)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        loop.call_soon_threadsafe(loop.call_later, coalesce_window(), self.start_flush, loop)
+
+    def start_flush(self, loop):
+        task = loop.create_task(self.flush())
+        self.tasks.add(task)
+        task.add_done_callback(self.flushed)
+
+    def flushed(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # delivery is best effort, clients still see the rows on their next page load
+            logger.error('Could not dispatch notifications', exc_info=task.exception())
+
+    def take(self):
+        with self.lock:
+            ids, self.pending = self.pending, []
+            self.scheduled = False
+        return ids
+
+    async def flush(self):
+        ids = self.take()
+        if ids:
+            await self.send(ids)
+
+    def frames(self, notification_ids):
+        """ ``{group: message}``, one frame per recipient with the coalesced notifications and the unread count """
+        # notifications deleted in the meantime (e.g. an unlike) simply drop out
+        notifications = list(Notification.objects.filter(id__in=notification_ids)
+                             .select_related('post').order_by('date', 'id'))
+        actor_ids = {pk for notification in notifications for pk in notification.actor_ids()}
+        usernames = dict(User.objects.filter(pk__in=actor_ids).values_list('pk', 'username'))
+        entries = coalesce(notifications, usernames)
+        counts = unread_counts(list(entries)) if entries else {}
+        return {
+            group_name(user_id): {
+                'type': 'notification_batch',
+                'notifications': user_entries,
+                'unread_count': counts[user_id],
+            }
+            for user_id, user_entries in entries.items()
+        }
+
+    async def send(self, notification_ids):
+        frames = await database_sync_to_async(self.frames)(notification_ids)
+        channel_layer = get_channel_layer()
+        for group, message in frames.items():
+            await channel_layer.group_send(group, message)
+
+    def send_now(self, notification_ids):
+        try:
+            async_to_sync(self.send)(notification_ids)
+        except Exception:
+            logger.exception('Could not dispatch notifications %s', notification_ids)
+
+
+dispatcher = Dispatcher()
+
+
+def dispatch_on_commit(notification):
+    """ Queue ``notification`` for delivery once the current transaction commits """
+    transaction.on_commit(lambda: dispatcher.enqueue(notification.pk))
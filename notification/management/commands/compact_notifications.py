@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from notification.services import purge_seen
+
+
+class Command(BaseCommand):
+    help = 'Delete old seen notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 30),
+                            help='keep seen notifications younger than this many days')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        deleted = purge_seen(before, options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} seen notification(s) older than {options["days"]} days')
+        self.stdout.write(self.style.SUCCESS('Notifications compacted'))
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.23 on 2026-10-17 17:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+AGGREGATED_TYPES = (1, 2, 5, 6)
+RECENT_ACTORS = 3
+
+
+def aggregate_existing(apps, schema_editor):
+    """ Collapse the one-row-per-actor like/follow notifications into aggregates """
+    Notification = apps.get_model('notification', 'Notification')
+    groups = Notification.objects.filter(notification_type__in=AGGREGATED_TYPES) \
+        .values('user_id', 'post_id', 'notification_type').annotate(n=Count('id'))
+    for group in groups.iterator():
+        rows = list(Notification.objects.filter(
+            user_id=group['user_id'], post_id=group['post_id'], notification_type=group['notification_type']
+        ).order_by('-date', '-id'))
+        actors = []
+        for row in rows:
+            if row.sender_id not in actors:
+                actors.append(row.sender_id)
+        keep = rows[0]
+        keep.actor_count = len(actors)
+        keep.recent_actors = actors[:RECENT_ACTORS]
+        keep.is_seen = all(row.is_seen for row in rows)
+        keep.save(update_fields=['actor_count', 'recent_actors', 'is_seen'])
+        Notification.objects.filter(pk__in=[row.pk for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_auto_20210201_1854'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(aggregate_existing, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(notification_type__in=AGGREGATED_TYPES, post__isnull=False),
+                fields=('user', 'post', 'notification_type'), name='notif_aggregate_unique',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(notification_type__in=AGGREGATED_TYPES, post__isnull=True),
+                fields=('user', 'notification_type'), name='notif_aggregate_no_post_unique',
+            ),
+        ),
+    ]
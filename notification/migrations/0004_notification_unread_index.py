@@ -0,0 +1,17 @@
+# Generated by Django 3.2.23 on 2026-10-17 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0003_aggregated_notifications'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_seen', '-date'], name='notif_user_seen_date_idx'),
+        ),
+    ]
@@ -3,6 +3,10 @@ from django.contrib.auth.models import User
 
 # Create your models here.
 
+# Likes and follows collapse into one row per (user, post, type); comments and
+# replies carry their own text and stay one row each
+AGGREGATED_TYPES = (1, 2, 5, 6)
+
 """ Notification model """
 class Notification(models.Model):
     NOTIFICATION_TYPES = ((1,'Like'),(2,'Follow'),(3,'Comment'),(4,'Reply'),(5,'Like-Comment'),(6,'Like-Reply'))
@@ -14,6 +18,32 @@ class Notification(models.Model):
     text_preview = models.CharField(max_length=120, blank=True)
     date = models.DateTimeField(auto_now_add=True)
     is_seen = models.BooleanField(default=False)
+    # Likes and follows are aggregated: one row per (user, post, type), ``sender``
+    # is the latest actor and ``recent_actors`` the latest actor ids, newest first
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_seen', '-date'], name='notif_user_seen_date_idx'),
+        ]
+        # a NULL post never collides in a unique index, follows get their own constraint
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post', 'notification_type'], name='notif_aggregate_unique',
+                condition=models.Q(notification_type__in=AGGREGATED_TYPES, post__isnull=False),
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'notification_type'], name='notif_aggregate_no_post_unique',
+                condition=models.Q(notification_type__in=AGGREGATED_TYPES, post__isnull=True),
+            ),
+        ]
+
+    def actor_ids(self):
+        return self.recent_actors or [self.sender_id]
+
+    def others_count(self):
+        return self.actor_count - 1
 
     def __str__(self):
         return '%s - %s - %s - %s - %s' %(self.id, self.post, self.sender, self.user, self.notification_type)
\ No newline at end of file
@@ -0,0 +1,193 @@
+from collections import namedtuple
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .dispatch import dispatch_on_commit
+from .models import AGGREGATED_TYPES, Notification
+from .unread import adjust_on_commit
+from myproject.batching import BatchWorker
+
+
+RECENT_ACTORS = 3
+# a concurrent writer may insert the same new aggregate first, see write_events()
+WRITE_ATTEMPTS = 3
+
+
+class Event(namedtuple('Event', ['sender_id', 'recipient_id', 'notification_type', 'post_id', 'text_preview', 'retract'])):
+    """ One notification to record (or, with ``retract``, to take back) """
+    __slots__ = ()
+
+
+def event(sender, recipient, notification_type, post=None, text_preview='', retract=False):
+    """ Build an Event from users/posts or their ids """
+    return Event(
+        getattr(sender, 'pk', sender), getattr(recipient, 'pk', recipient), notification_type,
+        getattr(post, 'pk', post), text_preview or '', retract,
+    )
+
+
+def notification_created(notification):
+    """ Side effects of a new notification: count it as unread and push it """
+    # counted first: the pushed frame carries the unread count
+    if not notification.is_seen:
+        adjust_on_commit(notification.user_id, 1)
+    dispatch_on_commit(notification)
+
+
+def _save_new(notifications):
+    if connections[Notification.objects.db].features.can_return_rows_from_bulk_insert:
+        Notification.objects.bulk_create(notifications)
+        for notification in notifications:
+            notification_created(notification)
+    else:
+        # the primary keys are needed for delivery; save() gets them (and runs the post_save hooks)
+        for notification in notifications:
+            notification.save()
+
+
+def _add_actor(notification, actor_id):
+    actors = notification.actor_ids()
+    if actor_id not in actors:
+        notification.actor_count += 1
+    notification.recent_actors = ([actor_id] + [pk for pk in actors if pk != actor_id])[:RECENT_ACTORS]
+    notification.sender_id = actor_id
+    notification.is_seen = False
+    notification.date = timezone.now()
+
+
+def _remove_actor(notification, actor_id):
+    actors = [pk for pk in notification.actor_ids() if pk != actor_id]
+    notification.actor_count -= 1
+    notification.recent_actors = actors
+    if notification.sender_id == actor_id and actors:
+        notification.sender_id = actors[0]
+
+
+def write_events(events):
+    """
+    Apply ``events`` in order with a fixed number of queries: plain
+    notifications are bulk inserted, like/follow aggregates are locked and
+    read in one query, then bulk inserted / updated / deleted.
+    Returns the notifications created or updated.
+
+    Aggregates are fetched or created, and the unique constraints on them
+    turn a row a concurrent writer inserted first into an IntegrityError:
+    the batch is rolled back and applied again, finding that row this time.
+    """
+    events = list(events)
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            return _write_events(events)
+        except IntegrityError:
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+
+
+def lock_aggregates(keys):
+    """ ``{(user_id, post_id, notification_type): notification}`` of the existing aggregates, locked """
+    if not keys:
+        return {}
+    condition = Q()
+    for recipient_id, post_id, notification_type in keys:
+        condition |= Q(user_id=recipient_id, post_id=post_id, notification_type=notification_type)
+    return {
+        (notification.user_id, notification.post_id, notification.notification_type): notification
+        for notification in Notification.objects.select_for_update().filter(condition)
+    }
+
+
+def _write_events(events):
+    with transaction.atomic():
+        aggregates = lock_aggregates({(e.recipient_id, e.post_id, e.notification_type) for e in events
+                                      if e.notification_type in AGGREGATED_TYPES})
+        was_seen = {key: notification.is_seen for key, notification in aggregates.items()}
+
+        new, changed, notified, deleted = [], {}, set(), []
+        for e in events:
+            key = (e.recipient_id, e.post_id, e.notification_type)
+            if e.notification_type not in AGGREGATED_TYPES:
+                if not e.retract:
+                    new.append(Notification(
+                        sender_id=e.sender_id, user_id=e.recipient_id, post_id=e.post_id,
+                        notification_type=e.notification_type, text_preview=e.text_preview,
+                    ))
+                continue
+
+            notification = aggregates.get(key)
+            if e.retract:
+                if notification is None:
+                    continue
+                if notification.actor_count <= 1:
+                    del aggregates[key]
+                    changed.pop(key, None)
+                    if notification.pk is None:
+                        new.remove(notification)
+                    else:
+                        deleted.append(notification.pk)
+                    continue
+                _remove_actor(notification, e.sender_id)
+            elif notification is None:
+                notification = aggregates[key] = Notification(
+                    sender_id=e.sender_id, user_id=e.recipient_id, post_id=e.post_id,
+                    notification_type=e.notification_type, recent_actors=[e.sender_id],
+                )
+                new.append(notification)
+                continue
+            else:
+                _add_actor(notification, e.sender_id)
+                notified.add(key)
+            if notification.pk is not None:
+                changed[key] = notification
+
+        _save_new(new)
+        if changed:
+            Notification.objects.bulk_update(
+                changed.values(), ['actor_count', 'recent_actors', 'sender', 'is_seen', 'date']
+            )
+            for key, notification in changed.items():
+                if was_seen[key] and not notification.is_seen:
+                    adjust_on_commit(notification.user_id, 1)
+                if key in notified:
+                    dispatch_on_commit(notification)
+        if deleted:
+            Notification.objects.filter(pk__in=deleted).delete()
+    return new + list(changed.values())
+
+
+# Background writer: requests enqueue, the worker applies the events in batches
+worker = BatchWorker(write_events, name='notifications')
+
+
+def enqueue(events):
+    """
+    Write ``events`` (Event tuples, see event()) in the background once the
+    current transaction commits, so the request does not wait for them.
+    """
+    events = list(events)
+    if not events:
+        return
+    if worker.sync():
+        worker.put_many(events)
+    else:
+        transaction.on_commit(lambda: worker.put_many(events))
+
+
+def notify(recipient, actor, notification_type, post=None, text_preview=''):
+    """ Record that ``actor`` did ``notification_type`` to ``recipient`` (on ``post``), in the background """
+    enqueue([event(actor, recipient, notification_type, post, text_preview)])
+
+
+def retract(recipient, actor, notification_type, post=None):
+    """ Undo notify(): drop ``actor`` from the aggregate, deleting it with its last actor """
+    enqueue([event(actor, recipient, notification_type, post, retract=True)])
+
+
+def purge_seen(before, batch_size=1000):
+    """ Delete seen notifications older than ``before`` in batches. Returns the number deleted """
+    deleted = 0
+    while True:
+        ids = list(Notification.objects.filter(is_seen=True, date__lt=before)
+                   .order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Notification.objects.filter(id__in=ids).delete()[0]
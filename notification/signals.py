@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Notification
+from .services import notification_created
+from .unread import adjust_on_commit
+
+
+""" Push every new notification to its recipient and count it as unread, once committed """
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created:
+        notification_created(instance)
+
+
+""" Keep the cached unread counters in step with deleted notifications """
+@receiver(post_delete, sender=Notification)
+def notification_deleted_unread(sender, instance, **kwargs):
+    if not instance.is_seen:
+        adjust_on_commit(instance.user_id, -1)
@@ -1,3 +1,266 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from blog.models import Post
+from .dispatch import Dispatcher, coalesce, describe, group_name
+from .models import Notification
+from .services import event, lock_aggregates, notify, retract, write_events
+from .unread import _adjust, cache_key, mark_all_seen, mark_seen, unread_count
 
-# Create your tests here.
+LIKE, FOLLOW, COMMENT = 1, 2, 3
+
+
+@override_settings(BATCH_WORKERS_SYNC=True, NOTIFICATION_COALESCE_MS=0)
+class AggregationTest(TestCase):
+    """ Likes and follows fold into one row per (recipient, post, type); retracting takes an actor back out """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.fans = [User.objects.create_user(f'fan{i}') for i in range(4)]
+        self.post = Post.objects.create(title='post', content='body', author=self.author)
+
+    def likes(self):
+        return Notification.objects.filter(user=self.author, post=self.post, notification_type=LIKE)
+
+    def test_likes_on_a_post_share_one_row(self):
+        for fan in self.fans:
+            notify(self.author, fan, LIKE, post=self.post)
+        notification = self.likes().get()
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(notification.sender_id, self.fans[-1].pk)
+        # newest first, only the most recent ones
+        self.assertEqual(notification.recent_actors, [fan.pk for fan in reversed(self.fans)][:3])
+
+    def test_the_same_actor_is_counted_once(self):
+        notify(self.author, self.fans[0], LIKE, post=self.post)
+        notify(self.author, self.fans[0], LIKE, post=self.post)
+        self.assertEqual(self.likes().get().actor_count, 1)
+
+    def test_comments_are_not_aggregated(self):
+        notify(self.author, self.fans[0], COMMENT, post=self.post, text_preview='first')
+        notify(self.author, self.fans[0], COMMENT, post=self.post, text_preview='second')
+        self.assertEqual(Notification.objects.filter(notification_type=COMMENT).count(), 2)
+
+    def test_follows_aggregate_without_a_post(self):
+        for fan in self.fans[:2]:
+            notify(self.author, fan, FOLLOW)
+        notification = Notification.objects.get(user=self.author, notification_type=FOLLOW)
+        self.assertIsNone(notification.post_id)
+        self.assertEqual(notification.actor_count, 2)
+
+    def test_retract_removes_the_actor(self):
+        for fan in self.fans[:2]:
+            notify(self.author, fan, LIKE, post=self.post)
+        retract(self.author, self.fans[1], LIKE, post=self.post)
+        notification = self.likes().get()
+        self.assertEqual(notification.actor_count, 1)
+        self.assertEqual(notification.recent_actors, [self.fans[0].pk])
+        self.assertEqual(notification.sender_id, self.fans[0].pk)
+
+    def test_retracting_the_last_actor_deletes_the_row(self):
+        notify(self.author, self.fans[0], LIKE, post=self.post)
+        retract(self.author, self.fans[0], LIKE, post=self.post)
+        self.assertFalse(self.likes().exists())
+
+    def test_like_and_unlike_in_one_batch_write_nothing(self):
+        write_events([
+            event(self.fans[0], self.author, LIKE, self.post),
+            event(self.fans[0], self.author, LIKE, self.post, retract=True),
+        ])
+        self.assertFalse(self.likes().exists())
+
+    def test_retract_without_a_notification_is_a_no_op(self):
+        retract(self.author, self.fans[0], LIKE, post=self.post)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_an_aggregate_is_stored_once(self):
+        notify(self.author, self.fans[0], LIKE, post=self.post)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(sender=self.fans[1], user=self.author, post=self.post, notification_type=LIKE)
+        notify(self.author, self.fans[0], FOLLOW)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(sender=self.fans[1], user=self.author, notification_type=FOLLOW)
+
+    def test_aggregate_created_concurrently_is_updated_on_retry(self):
+        notify(self.author, self.fans[0], LIKE, post=self.post)
+        calls = []
+
+        def lock_after_insert(keys):
+            # the first attempt misses the row, as if another writer had inserted it meanwhile
+            calls.append(keys)
+            return {} if len(calls) == 1 else lock_aggregates(keys)
+        with mock.patch('notification.services.lock_aggregates', lock_after_insert):
+            notify(self.author, self.fans[1], LIKE, post=self.post)
+        self.assertEqual(len(calls), 2)
+        notification = self.likes().get()
+        self.assertEqual(notification.actor_count, 2)
+
+
+@override_settings(BATCH_WORKERS_SYNC=True, NOTIFICATION_COALESCE_MS=0)
+class UnreadCountTest(TestCase):
+    """ The cached unread counters follow every change once it commits """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author')
+        self.fans = [User.objects.create_user(f'fan{i}') for i in range(3)]
+        self.post = Post.objects.create(title='post', content='body', author=self.author)
+
+    def notify(self, fan, notification_type=LIKE, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.author, fan, notification_type, post=self.post, **kwargs)
+
+    def test_missing_counter_is_counted_from_the_database(self):
+        Notification.objects.create(sender=self.fans[0], user=self.author, notification_type=COMMENT)
+        self.assertEqual(unread_count(self.author.pk), 1)
+        self.assertEqual(cache.get(cache_key(self.author.pk)), 1)
+
+    def test_new_notifications_are_counted(self):
+        self.assertEqual(unread_count(self.author.pk), 0)
+        self.notify(self.fans[0], COMMENT, text_preview='hi')
+        self.notify(self.fans[1])
+        self.assertEqual(unread_count(self.author.pk), 2)
+
+    def test_mark_seen(self):
+        self.notify(self.fans[0], COMMENT, text_preview='hi')
+        self.notify(self.fans[1], COMMENT, text_preview='ho')
+        self.assertEqual(unread_count(self.author.pk), 2)
+        notification = Notification.objects.filter(user=self.author).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(mark_seen(notification))
+        self.assertEqual(unread_count(self.author.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(mark_seen(notification))
+        self.assertEqual(unread_count(self.author.pk), 1)
+
+    def test_mark_all_seen(self):
+        for fan in self.fans:
+            self.notify(fan, COMMENT, text_preview='hi')
+        self.assertEqual(unread_count(self.author.pk), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_all_seen(self.author.pk)
+        self.assertEqual(unread_count(self.author.pk), 0)
+        self.assertFalse(Notification.objects.filter(user=self.author, is_seen=False).exists())
+
+    def test_mark_all_seen_keeps_a_notification_arriving_meanwhile(self):
+        self.notify(self.fans[0], COMMENT, text_preview='hi')
+        with self.captureOnCommitCallbacks() as callbacks:
+            mark_all_seen(self.author.pk)
+        # another request commits a notification before the counter is touched
+        Notification.objects.create(sender=self.fans[1], user=self.author, notification_type=COMMENT)
+        _adjust(self.author.pk, 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(unread_count(self.author.pk), 1)
+
+    def test_seen_aggregate_becomes_unread_again(self):
+        self.notify(self.fans[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_all_seen(self.author.pk)
+        self.assertEqual(unread_count(self.author.pk), 0)
+
+        self.notify(self.fans[1])
+        notification = Notification.objects.get(user=self.author, notification_type=LIKE)
+        self.assertFalse(notification.is_seen)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(unread_count(self.author.pk), 1)
+
+        # another like on an aggregate that is already unread does not count twice
+        self.notify(self.fans[2])
+        self.assertEqual(unread_count(self.author.pk), 1)
+
+    def test_deleting_the_last_actor_uncounts_it(self):
+        self.notify(self.fans[0])
+        self.assertEqual(unread_count(self.author.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            retract(self.author, self.fans[0], LIKE, post=self.post)
+        self.assertEqual(unread_count(self.author.pk), 0)
+
+
+class DescribeTest(SimpleTestCase):
+    def test_actor_phrases(self):
+        self.assertEqual(describe([], 0, LIKE), 'Someone liked your post')
+        self.assertEqual(describe(['alice'], 1, FOLLOW), 'alice started following you')
+        self.assertEqual(describe(['alice', 'bob'], 2, LIKE), 'alice and bob liked your post')
+        self.assertEqual(describe(['alice', 'bob', 'carol'], 50, LIKE), 'alice and 49 others liked your post')
+        self.assertEqual(describe(['alice'], 1, 99), 'alice notified you')
+
+
+class CoalesceTest(SimpleTestCase):
+    """ The notifications of one window, grouped per recipient, post and type """
+
+    def notification(self, pk, user_id, sender_id, notification_type, post_id=None, **kwargs):
+        return Notification(id=pk, user_id=user_id, sender_id=sender_id, notification_type=notification_type,
+                            post_id=post_id, date=timezone.now(), **kwargs)
+
+    def test_groups_per_recipient_post_and_type(self):
+        notifications = [
+            self.notification(1, 10, 1, FOLLOW),
+            self.notification(2, 10, 2, FOLLOW),
+            self.notification(3, 10, 3, COMMENT, text_preview='hi'),
+            self.notification(4, 20, 1, FOLLOW),
+        ]
+        entries = coalesce(notifications, {1: 'alice', 2: 'bob', 3: 'carol'})
+        self.assertEqual(sorted(entries), [10, 20])
+        follows, comment = entries[10]
+        self.assertEqual(follows['ids'], [1, 2])
+        self.assertEqual(follows['id'], 2)
+        self.assertEqual(follows['actors'], ['bob', 'alice'])
+        self.assertEqual(follows['text'], 'bob and alice started following you')
+        self.assertEqual(comment['text_preview'], 'hi')
+        self.assertEqual(entries[20][0]['text'], 'alice started following you')
+
+    def test_aggregate_counts_actors_beyond_the_recent_ones(self):
+        aggregate = self.notification(1, 10, 4, FOLLOW, actor_count=40, recent_actors=[4, 3, 2])
+        entry, = coalesce([aggregate], {2: 'bob', 3: 'carol', 4: 'dave'})[10]
+        self.assertEqual(entry['actors'], ['dave', 'carol', 'bob'])
+        self.assertEqual(entry['actor_count'], 40)
+        self.assertEqual(entry['text'], 'dave and 39 others started following you')
+
+
+@override_settings(NOTIFICATION_COALESCE_MS=50)
+class DispatcherTest(TestCase):
+    """ Committed notifications are pushed from the consumers' event loop, one frame per window """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author')
+        self.fans = [User.objects.create_user(f'fan{i}') for i in range(2)]
+        self.notifications = [
+            Notification.objects.create(sender=fan, user=self.author, notification_type=COMMENT, text_preview='hi')
+            for fan in self.fans
+        ]
+
+    async def test_window_is_flushed_on_the_bound_loop(self):
+        dispatcher = Dispatcher()
+        dispatcher.bind(asyncio.get_running_loop())
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(group_name(self.author.pk), channel)
+
+        for notification in self.notifications:
+            dispatcher.enqueue(notification.pk)
+        frame = await asyncio.wait_for(channel_layer.receive(channel), 1)
+        self.assertEqual(frame['type'], 'notification_batch')
+        self.assertEqual(frame['unread_count'], 2)
+        entry, = frame['notifications']
+        self.assertEqual(entry['ids'], [n.pk for n in self.notifications])
+        self.assertEqual(entry['text'], 'fan1 and fan0 commented on your post')
+        # both went out in that one frame
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(channel_layer.receive(channel), 0.2)
+        self.assertFalse(dispatcher.pending)
+        self.assertFalse(dispatcher.tasks)
+        await channel_layer.flush()
+
+    def test_without_a_loop_notifications_are_sent_right_away(self):
+        dispatcher = Dispatcher()
+        with mock.patch.object(dispatcher, 'send_now') as send_now:
+            dispatcher.enqueue(self.notifications[0].pk)
+        send_now.assert_called_once_with([self.notifications[0].pk])
+        self.assertFalse(dispatcher.pending)
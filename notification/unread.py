@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from .models import Notification
+
+
+""" Unread notification counters
+
+Kept in the cache per user and adjusted (after commit) whenever a
+notification is created, deleted or changes its seen flag. A missing
+counter is recounted from the database using the (user, is_seen, date)
+index, so the cache may be flushed at any time.
+"""
+
+def cache_timeout():
+    return getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def count_unread(user_ids):
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(
+        Notification.objects.filter(user_id__in=user_ids, is_seen=False)
+        .values('user_id').annotate(n=Count('*')).values_list('user_id', 'n')
+    )
+    return counts
+
+
+def unread_counts(user_ids):
+    """ ``{user_id: unread count}``, counting only the users missing from the cache """
+    user_ids = list(user_ids)
+    cached = cache.get_many([cache_key(user_id) for user_id in user_ids])
+    counts = {user_id: cached[cache_key(user_id)] for user_id in user_ids if cache_key(user_id) in cached}
+    missing = [user_id for user_id in user_ids if user_id not in counts]
+    if missing:
+        fresh = count_unread(missing)
+        cache.set_many({cache_key(user_id): count for user_id, count in fresh.items()}, cache_timeout())
+        counts.update(fresh)
+    return counts
+
+
+def unread_count(user_id):
+    return unread_counts([user_id])[user_id]
+
+
+def _adjust(user_id, delta):
+    try:
+        if cache.incr(cache_key(user_id), delta) < 0:
+            cache.delete(cache_key(user_id))
+    except ValueError:
+        # not cached: the next read counts from the database
+        pass
+
+
+def adjust_on_commit(user_id, delta):
+    transaction.on_commit(lambda: _adjust(user_id, delta))
+
+
+def forget_on_commit(user_id):
+    transaction.on_commit(lambda: cache.delete(cache_key(user_id)))
+
+
+def mark_seen(notification):
+    """ Mark one notification seen. Returns False when it already was """
+    if not Notification.objects.filter(pk=notification.pk, is_seen=False).update(is_seen=True):
+        return False
+    notification.is_seen = True
+    adjust_on_commit(notification.user_id, -1)
+    return True
+
+
+def mark_all_seen(user_id):
+    Notification.objects.filter(user_id=user_id, is_seen=False).update(is_seen=True)
+    # not set to 0: a notification committed since the UPDATE has already been counted
+    # in, dropping the counter makes the next read recount it from the database
+    forget_on_commit(user_id)
@@ -3,22 +3,27 @@ from django.shortcuts import render
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from notification.models import Notification
+from notification.unread import mark_all_seen, mark_seen, unread_count
+from blog.pagination import CursorPaginator
 import json
 
+
+NOTIFICATIONS_PER_PAGE = 20
+NOTIFICATION_ORDERING = ('-date', '-id')
+
 # Create your views here.
 
 """ All notifications """
 @login_required
 def ShowNotifications(request):
     user = request.user
-    notifications = Notification.objects.filter(user=user).order_by('-date')
+    notifications = Notification.objects.filter(user=user).select_related('sender__profile', 'post')
+    page = CursorPaginator(notifications, NOTIFICATIONS_PER_PAGE, NOTIFICATION_ORDERING).page(request.GET.get('cursor'))
     
     # Get unread count
-    unread_count = notifications.filter(is_seen=False).count()
-    
     context = {
-        'notifications': notifications,
-        'unread_count': unread_count,
+        'notifications': page,
+        'unread_count': unread_count(user.id),
     }
     return render(request, 'blog/notifications.html', context)
 
@@ -33,8 +38,7 @@ def mark_notification_read(request):
             
             if notification_id:
                 notification = Notification.objects.get(id=notification_id, user=request.user)
-                notification.is_seen = True
-                notification.save()
+                mark_seen(notification)
                 
                 return JsonResponse({
                     'success': True,
@@ -67,7 +71,7 @@ def mark_notification_read(request):
 def mark_all_notifications_read(request):
     """Mark all notifications as read via AJAX"""
     if request.method == 'POST':
-        Notification.objects.filter(user=request.user, is_seen=False).update(is_seen=True)
+        mark_all_seen(request.user.id)
         
         return JsonResponse({
             'success': True,
@@ -84,11 +88,9 @@ def mark_all_notifications_read(request):
 def get_unread_count(request):
     """Get unread notification count via AJAX"""
     if request.method == 'GET':
-        count = Notification.objects.filter(user=request.user, is_seen=False).count()
-        
         return JsonResponse({
             'success': True,
-            'unread_count': count
+            'unread_count': unread_count(request.user.id)
         })
     
     return JsonResponse({
@@ -0,0 +1,129 @@
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from myproject.batching import BatchWorker
+from .models import SearchIndex, SearchQueryDaily, SearchQueryHourly
+
+
+""" Search analytics, written off the request path
+
+search_view only queues a SearchEvent. A background worker writes the
+queued events every SEARCH_ANALYTICS_INTERVAL seconds: the raw SearchIndex
+rows in one bulk insert, and the per hour and per day counts of every
+normalized query into SearchQueryHourly / SearchQueryDaily, which is what
+suggestions and the dashboard read.
+"""
+
+SearchEvent = namedtuple('SearchEvent', ['user_id', 'query', 'results_count', 'timestamp'])
+
+TRENDING_DAYS = 7
+TRENDING_COUNT = 10
+TRENDING_CACHE_KEY = 'search:trending'
+TRENDING_CACHE_TIMEOUT = 300
+
+
+def normalize_query(query):
+    return ' '.join(query.split()).lower()[:255]
+
+
+def roll_up(model, period_field, totals):
+    """ Add ``totals`` (``{(period, query): (searches, results)}``) to ``model``'s counters """
+    if not totals:
+        return
+    periods = {period for period, _ in totals}
+    queries = {query for _, query in totals}
+    with transaction.atomic():
+        # make sure every row exists, then add to the locked rows
+        model.objects.bulk_create([
+            model(**{period_field: period, 'query': query}) for period, query in totals
+        ], ignore_conflicts=True)
+        rows = model.objects.select_for_update().filter(**{
+            f'{period_field}__in': periods, 'query__in': queries,
+        })
+        changed = []
+        for row in rows:
+            key = (getattr(row, period_field), row.query)
+            if key in totals:
+                searches, results = totals[key]
+                row.searches += searches
+                row.results_total += results
+                changed.append(row)
+        model.objects.bulk_update(changed, ['searches', 'results_total'])
+
+
+def write_events(events):
+    SearchIndex.objects.bulk_create([
+        SearchIndex(user_id=event.user_id, query=event.query,
+                    results_count=event.results_count, timestamp=event.timestamp)
+        for event in events
+    ])
+    roll_up_events(events)
+
+
+def roll_up_events(events):
+    hourly, daily = {}, {}
+    for event in events:
+        query = normalize_query(event.query)
+        if not query:
+            continue
+        local = timezone.localtime(event.timestamp)
+        for totals, period in [(hourly, local.replace(minute=0, second=0, microsecond=0)),
+                               (daily, local.date())]:
+            searches, results = totals.get((period, query), (0, 0))
+            totals[period, query] = (searches + 1, results + event.results_count)
+    roll_up(SearchQueryHourly, 'hour', hourly)
+    roll_up(SearchQueryDaily, 'day', daily)
+
+
+def roll_up_history(chunk_size=5000):
+    """ Recount both roll-ups from the SearchIndex rows, returns how many searches were read """
+    with transaction.atomic():
+        SearchQueryHourly.objects.all().delete()
+        SearchQueryDaily.objects.all().delete()
+        rows = SearchIndex.objects.order_by('pk').values_list('user_id', 'query', 'results_count', 'timestamp')
+        events = []
+        searches = 0
+        for row in rows.iterator(chunk_size=chunk_size):
+            events.append(SearchEvent(*row))
+            if len(events) >= chunk_size:
+                roll_up_events(events)
+                searches += len(events)
+                events = []
+        roll_up_events(events)
+        searches += len(events)
+    cache.delete(TRENDING_CACHE_KEY)
+    return searches
+
+
+worker = BatchWorker(
+    write_events,
+    name='search-analytics',
+    interval=getattr(settings, 'SEARCH_ANALYTICS_INTERVAL', 2.0),
+)
+
+
+def record_search(user, query, results_count):
+    """ Queue one search for the analytics tables """
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    worker.put(SearchEvent(user_id, query[:255], results_count, timezone.now()))
+
+
+def popular_queries(days, limit):
+    """ ``[(query, searches), ...]`` of the last ``days`` days, most searched first """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return list(SearchQueryDaily.objects.filter(day__gte=since).values('query')
+                .annotate(total=Sum('searches')).order_by('-total', 'query')
+                .values_list('query', 'total')[:limit])
+
+
+def trending_searches():
+    """ Most searched queries of the week, cached """
+    trending = cache.get(TRENDING_CACHE_KEY)
+    if trending is None:
+        trending = popular_queries(TRENDING_DAYS, TRENDING_COUNT)
+        cache.set(TRENDING_CACHE_KEY, trending, TRENDING_CACHE_TIMEOUT)
+    return trending
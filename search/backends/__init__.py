@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .base import SearchBackend, SearchUnavailable, hydrate
+
+
+BACKENDS = {
+    'elasticsearch': 'search.backends.elasticsearch.ElasticsearchBackend',
+    'local': 'search.backends.local.LocalBackend',
+}
+
+_backends = {}
+
+
+def get_backend(name=None):
+    """ The backend named by ``name`` or settings.SEARCH_BACKEND (an alias above or a dotted path), one per process """
+    name = name or getattr(settings, 'SEARCH_BACKEND', 'elasticsearch')
+    if name not in _backends:
+        _backends[name] = import_string(BACKENDS.get(name, name))()
+    return _backends[name]
@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from blog.models import Post
+
+
+class SearchUnavailable(Exception):
+    """ The backend cannot answer right now (index not built, cluster down, ...) """
+
+
+class SearchBackend:
+    """
+    What ``perform_search`` and the search signals need from a backend.
+
+    Searches return PostHit / UserHit lists, best match first. The update
+    methods take primary keys and are called once the writes are committed;
+    backends that keep themselves in sync may leave them as no-ops.
+    """
+    name = None
+
+    def search_posts(self, query, limit=20, highlight=False):
+        raise NotImplementedError
+
+    def search_users(self, query, limit=20, highlight=False):
+        raise NotImplementedError
+
+    def rebuild(self, stdout=None, resume=False, chunk_size=1000):
+        """ Index every post and user from scratch, or finish an interrupted rebuild with ``resume`` """
+        raise NotImplementedError
+
+    def update_posts(self, ids):
+        pass
+
+    def delete_posts(self, ids):
+        pass
+
+    def update_authors(self, ids):
+        """ The posts of these users, whose stored author fields may have changed """
+        pass
+
+    def update_users(self, ids):
+        pass
+
+    def delete_users(self, ids):
+        pass
+
+    def search(self, query, search_type='all', highlight=False, limit=20):
+        results = {}
+        if search_type in ['all', 'posts']:
+            results['posts'] = self.search_posts(query, limit, highlight)
+        if search_type in ['all', 'users']:
+            results['users'] = self.search_users(query, limit, highlight)
+        return results
+
+
+def posts_for_index():
+    return Post.objects.select_related('author')
+
+
+def users_for_index():
+    return User.objects.select_related('profile')
+
+
+def hydrate(results):
+    """ Replace the hits' stored fields with their current database rows, one query per type """
+    hydrated = {}
+    for result_type, hits in results.items():
+        queryset = posts_for_index() if result_type == 'posts' else users_for_index()
+        rows = queryset.in_bulk([hit.id for hit in hits])
+        hydrated[result_type] = [hit.with_row(rows[hit.id]) for hit in hits if hit.id in rows]
+    return hydrated
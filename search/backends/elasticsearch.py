@@ -0,0 +1,207 @@
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
+from elasticsearch.exceptions import ConnectionError, NotFoundError
+from elasticsearch.helpers import bulk
+from search.hits import PostHit, UserHit
+from search.models import PostDocument, UserDocument
+from .base import SearchBackend, SearchUnavailable, posts_for_index, users_for_index
+
+
+""" Elasticsearch backend
+
+Documents are written with the bulk helper, a batch of ids at a time with
+one database query per batch (the like and comment counts are columns of
+Post). ``posts`` and ``users`` are aliases: a rebuild fills fresh
+``<alias>-<timestamp>`` indices and then moves the aliases over in one
+atomic update, so searches keep working while it runs. Its progress (last
+indexed primary key per index) is saved to SEARCH_REINDEX_CHECKPOINT after
+every chunk, ``rebuild(resume=True)`` continues an interrupted one, and the
+incremental updates made meanwhile go to both the live and the new index.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+POST_FIELDS = ['title', 'content', 'author.username', 'author.first_name', 'author.last_name']
+USER_FIELDS = ['username', 'first_name', 'last_name', 'email']
+
+
+def with_highlight(search, fields):
+    """ Ask the index for one HTML escaped fragment per field, matches wrapped in <mark> """
+    return search.highlight_options(
+        encoder='html', pre_tags=['<mark>'], post_tags=['</mark>'],
+        fragment_size=150, number_of_fragments=1,
+    ).highlight(*fields)
+
+
+def execute(search):
+    try:
+        return search.execute()
+    except (ConnectionError, NotFoundError) as e:
+        raise SearchUnavailable(str(e)) from e
+
+
+def checkpoint_path():
+    return Path(getattr(settings, 'SEARCH_REINDEX_CHECKPOINT',
+                        Path(settings.BASE_DIR) / 'search_index' / 'elasticsearch-reindex.json'))
+
+
+def load_checkpoint():
+    try:
+        with open(checkpoint_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(checkpoint):
+    path = checkpoint_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    tmp_path.replace(path)
+
+
+class ElasticsearchBackend(SearchBackend):
+    """ See the module docstring """
+    name = 'elasticsearch'
+    # (alias, document class, rows to index)
+    indices = [
+        ('posts', PostDocument, posts_for_index),
+        ('users', UserDocument, users_for_index),
+    ]
+
+    def search_posts(self, query, limit=20, highlight=False):
+        search = PostDocument.search().query('multi_match', query=query, fields=POST_FIELDS, fuzziness='AUTO')
+        if highlight:
+            search = with_highlight(search, ['title', 'content'])
+        # the full content is only needed for searching, the snippet is stored
+        search = search.source(excludes=['content'])[:limit]
+        return [PostHit.from_hit(hit) for hit in execute(search)]
+
+    def search_users(self, query, limit=20, highlight=False):
+        search = UserDocument.search().query('multi_match', query=query, fields=USER_FIELDS, fuzziness='AUTO')
+        if highlight:
+            search = with_highlight(search, ['username', 'first_name', 'last_name'])
+        return [UserHit.from_hit(hit) for hit in execute(search[:limit])]
+
+    # Incremental updates
+
+    def update_posts(self, ids):
+        self._update('posts', ids)
+
+    def delete_posts(self, ids):
+        self._delete('posts', ids)
+
+    def update_authors(self, ids):
+        self.update_posts(posts_for_index().filter(author_id__in=ids).values_list('pk', flat=True))
+
+    def update_users(self, ids):
+        self._update('users', ids)
+
+    def delete_users(self, ids):
+        self._delete('users', ids)
+
+    def _entry(self, alias):
+        return next(entry for entry in self.indices if entry[0] == alias)
+
+    def _targets(self, alias):
+        """ The live alias, plus the index a rebuild in progress is filling """
+        targets = [alias]
+        checkpoint = load_checkpoint()
+        if checkpoint and alias in checkpoint:
+            targets.append(checkpoint[alias]['index'])
+        return targets
+
+    def _update(self, alias, ids):
+        _, document_class, rows = self._entry(alias)
+        ids = set(ids)
+        if not ids:
+            return
+        objects = list(rows().filter(pk__in=ids))
+        document = document_class()
+        self._bulk(alias, [(obj.pk, document.prepare(obj)) for obj in objects], 'index')
+        # rows deleted in the meantime
+        self._delete(alias, ids - {obj.pk for obj in objects})
+
+    def _delete(self, alias, ids):
+        self._bulk(alias, [(pk, None) for pk in ids], 'delete')
+
+    def _bulk(self, alias, documents, op_type, targets=None):
+        """ ``op_type`` every ``(id, source)`` of ``documents`` in every target index, in one request """
+        if not documents:
+            return
+        actions = []
+        for index in targets or self._targets(alias):
+            for pk, source in documents:
+                action = {'_op_type': op_type, '_index': index, '_id': pk}
+                if source is not None:
+                    action['_source'] = source
+                actions.append(action)
+        try:
+            _, errors = bulk(self._entry(alias)[1]._get_connection(), actions, raise_on_error=False)
+        except ConnectionError as e:
+            raise SearchUnavailable(str(e)) from e
+        # deleting a document that is not there is fine
+        errors = [error for error in errors if error.get('delete', {}).get('status') != 404]
+        if errors:
+            logger.error('%d %s bulk error(s) on %s, first: %s', len(errors), op_type, alias, errors[0])
+
+    # Rebuild
+
+    def rebuild(self, stdout=None, resume=False, chunk_size=1000):
+        checkpoint = load_checkpoint() if resume else None
+        if checkpoint is None:
+            suffix = datetime.now().strftime('%Y%m%d%H%M%S')
+            checkpoint = {alias: {'index': f'{alias}-{suffix}', 'last_id': 0} for alias, _, _ in self.indices}
+        elif stdout is not None:
+            for alias, state in checkpoint.items():
+                stdout.write(f'Resuming {alias} after #{state["last_id"]}\n')
+
+        try:
+            # every new index exists before updates are sent to it
+            for alias, document_class, _ in self.indices:
+                index = document_class._index.clone(name=checkpoint[alias]['index'])
+                if not index.exists():
+                    index.create()
+            save_checkpoint(checkpoint)
+            for alias, document_class, rows in self.indices:
+                self._fill(alias, document_class, rows(), checkpoint, chunk_size, stdout)
+            for alias, document_class, _ in self.indices:
+                self._swap_alias(alias, checkpoint[alias]['index'], document_class._get_connection())
+        except ConnectionError as e:
+            raise SearchUnavailable(f'{e}, resume with --resume') from e
+        checkpoint_path().unlink()
+
+    def _fill(self, alias, document_class, queryset, checkpoint, chunk_size, stdout):
+        state = checkpoint[alias]
+        document = document_class()
+        while True:
+            chunk = list(queryset.filter(pk__gt=state['last_id']).order_by('pk')[:chunk_size])
+            if not chunk:
+                break
+            self._bulk(alias, [(obj.pk, document.prepare(obj)) for obj in chunk], 'index',
+                       targets=[state['index']])
+            state['last_id'] = chunk[-1].pk
+            save_checkpoint(checkpoint)
+            if stdout is not None:
+                stdout.write(f'{alias}: indexed up to #{state["last_id"]}\n')
+
+    def _swap_alias(self, alias, new_index, connection):
+        """ Point ``alias`` at ``new_index`` only, then drop the indices it pointed at """
+        old_indices = []
+        if connection.indices.exists_alias(name=alias):
+            old_indices = list(connection.indices.get_alias(name=alias))
+        if not old_indices and connection.indices.exists(index=alias):
+            # a concrete index from before aliases were used, it has to go first
+            connection.indices.delete(index=alias)
+        actions = [{'remove': {'index': index, 'alias': alias}} for index in old_indices]
+        actions.append({'add': {'index': new_index, 'alias': alias}})
+        connection.indices.update_aliases(body={'actions': actions})
+        for index in old_indices:
+            if index != new_index:
+                connection.indices.delete(index=index, ignore=404)
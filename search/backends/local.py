@@ -0,0 +1,273 @@
+import contextlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+from django.conf import settings
+from search.hits import PostHit, UserHit
+from search.inverted import InvertedIndex, highlight
+from .base import SearchBackend, SearchUnavailable, posts_for_index, users_for_index
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+""" Embedded search backend
+
+Each index is an InvertedIndex pickled to ``<name>.snapshot`` in
+SEARCH_LOCAL_INDEX_DIR plus an append-only ``<name>.journal`` of the
+updates made since, one JSON line per put or delete. Every process keeps the
+index in memory and, before answering, replays the journal lines it has not
+seen yet (or reloads the snapshot if another process compacted it). Once the
+journal outgrows SEARCH_LOCAL_COMPACT_BYTES the writer folds it into a new
+snapshot. Writers hold an exclusive ``flock`` on ``<name>.lock``, readers a
+shared one.
+
+A rebuild fills a new index a chunk of rows at a time, pickling it with the
+last indexed primary key to ``<name>.building`` after every chunk so
+``rebuild(resume=True)`` continues an interrupted one. Searches keep using
+the old snapshot meanwhile, and the journal is not compacted while a rebuild
+runs: under the exclusive lock the new index replays the journal (every
+update since, and possibly some from before, in order) and then replaces the
+snapshot in one rename.
+"""
+
+POST_FIELDS = {'title': 2.0, 'content': 1.0, 'author': 1.0}
+USER_FIELDS = {'username': 3.0, 'name': 2.0, 'email': 1.0}
+REBUILD_CHUNK = 1000
+
+
+def post_document(post):
+    author = post.author
+    texts = {
+        'title': post.title,
+        'content': post.content,
+        'author': f'{author.username} {author.first_name} {author.last_name}',
+    }
+    return post.id, texts, PostHit.from_post(post).as_dict()
+
+
+def user_document(user):
+    texts = {
+        'username': user.username,
+        'name': f'{user.first_name} {user.last_name}',
+        'email': user.email,
+    }
+    return user.id, texts, UserHit.from_user(user).as_dict()
+
+
+def fragments_for(source, fields, terms):
+    """ ``{field: [fragment]}`` for the stored fields containing a matched term """
+    fragments = {}
+    for field in fields:
+        html = highlight(source.get(field), terms)
+        if '<mark>' in html:
+            fragments[field] = [html]
+    return fragments
+
+
+def apply(index, entry):
+    """ Apply one journal entry to ``index`` """
+    if entry[0] == 'put':
+        _, doc_id, texts, source = entry
+        index.add(doc_id, texts, source)
+    else:
+        index.remove(entry[1])
+
+
+class DiskIndex:
+    def __init__(self, path, name, fields):
+        self.fields = fields
+        self.snapshot_path = Path(path) / f'{name}.snapshot'
+        self.journal_path = Path(path) / f'{name}.journal'
+        self.lock_path = Path(path) / f'{name}.lock'
+        self.building_path = Path(path) / f'{name}.building'
+        self.index = None
+        self.snapshot_id = None
+        self.offset = 0
+        self.lock = threading.Lock()
+
+    def exists(self):
+        return self.snapshot_path.exists()
+
+    @contextlib.contextmanager
+    def file_lock(self, exclusive):
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock, open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _snapshot_id(self):
+        stat = self.snapshot_path.stat()
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _catch_up(self):
+        """ Load a new snapshot if there is one, then replay the unseen journal lines """
+        snapshot_id = self._snapshot_id()
+        if snapshot_id != self.snapshot_id:
+            with open(self.snapshot_path, 'rb') as f:
+                self.index = pickle.load(f)
+            self.snapshot_id = snapshot_id
+            self.offset = 0
+        if not self.journal_path.exists():
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                apply(self.index, json.loads(line))
+            self.offset = f.tell()
+
+    def _write_snapshot(self, index):
+        tmp_path = self.snapshot_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.snapshot_path)
+        # the journal's entries are part of the new snapshot
+        with open(self.journal_path, 'wb'):
+            pass
+        self.index = index
+        self.snapshot_id = self._snapshot_id()
+        self.offset = 0
+
+    @contextlib.contextmanager
+    def reading(self):
+        """ The up to date InvertedIndex, not modified until the block exits """
+        if not self.exists():
+            raise SearchUnavailable(f'{self.snapshot_path} is missing, run "manage.py build_search_index"')
+        with self.file_lock(exclusive=False):
+            self._catch_up()
+            yield self.index
+
+    def write(self, entries):
+        """ Append ``[('put', id, texts, source) | ('delete', id), ...]``; no-op until the index is built """
+        if not entries or not self.exists():
+            return
+        with self.file_lock(exclusive=True):
+            self._catch_up()
+            with open(self.journal_path, 'ab') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry).encode() + b'\n')
+                    apply(self.index, entry)
+                self.offset = f.tell()
+            # a rebuild in progress replays the whole journal when it finishes
+            if (self.offset > getattr(settings, 'SEARCH_LOCAL_COMPACT_BYTES', 4 * 1024 * 1024)
+                    and not self.building_path.exists()):
+                self._write_snapshot(self.index)
+
+    def start_rebuild(self, resume=False):
+        """ ``{'index': InvertedIndex, 'last_id': pk}`` of the interrupted rebuild with ``resume``, else a new one """
+        if resume and self.building_path.exists():
+            with open(self.building_path, 'rb') as f:
+                return pickle.load(f)
+        state = {'index': InvertedIndex(self.fields), 'last_id': 0}
+        self.save_progress(state)
+        return state
+
+    def save_progress(self, state):
+        self.building_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.building_path.with_suffix('.building-tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.building_path)
+
+    def finish_rebuild(self, state):
+        """ Replay the journal into the rebuilt index and make it the snapshot """
+        index = state['index']
+        with self.file_lock(exclusive=True):
+            if self.journal_path.exists():
+                with open(self.journal_path, 'rb') as f:
+                    for line in f:
+                        apply(index, json.loads(line))
+            self._write_snapshot(index)
+            self.building_path.unlink()
+        return len(index)
+
+    def rebuild(self, documents):
+        state = self.start_rebuild()
+        for doc_id, texts, source in documents:
+            state['index'].add(doc_id, texts, source)
+        return self.finish_rebuild(state)
+
+
+class LocalBackend(SearchBackend):
+    """ Pure Python full-text search over posts and users, see the module docstring """
+    name = 'local'
+
+    def __init__(self, path=None):
+        path = path or getattr(settings, 'SEARCH_LOCAL_INDEX_DIR', Path(settings.BASE_DIR) / 'search_index')
+        self.posts = DiskIndex(path, 'posts', POST_FIELDS)
+        self.users = DiskIndex(path, 'users', USER_FIELDS)
+
+    def search_posts(self, query, limit=20, highlight=False):
+        return self._search(self.posts, PostHit, query, limit, ['title', 'content'] if highlight else None)
+
+    def search_users(self, query, limit=20, highlight=False):
+        return self._search(self.users, UserHit, query, limit,
+                            ['username', 'first_name', 'last_name'] if highlight else None)
+
+    def _search(self, disk_index, hit_class, query, limit, highlight_fields):
+        hits = []
+        with disk_index.reading() as index:
+            for doc_id, _, terms in index.search(query, limit):
+                source = index.sources[doc_id]
+                fragments = fragments_for(source, highlight_fields, terms) if highlight_fields else None
+                hits.append(hit_class.from_dict(source, fragments))
+        return hits
+
+    def rebuild(self, stdout=None, resume=False, chunk_size=REBUILD_CHUNK):
+        indices = [
+            ('posts', self.posts, posts_for_index(), post_document),
+            ('users', self.users, users_for_index(), user_document),
+        ]
+        # both rebuilds are under way before either is filled, so neither journal is compacted meanwhile
+        states = {name: disk_index.start_rebuild(resume) for name, disk_index, _, _ in indices}
+        for name, disk_index, queryset, document in indices:
+            state = states[name]
+            if state['last_id'] and stdout is not None:
+                stdout.write(f'Resuming {name} after #{state["last_id"]}\n')
+            while True:
+                chunk = list(queryset.filter(pk__gt=state['last_id']).order_by('pk')[:chunk_size])
+                if not chunk:
+                    break
+                for row in chunk:
+                    state['index'].add(*document(row))
+                state['last_id'] = chunk[-1].pk
+                disk_index.save_progress(state)
+        for name, disk_index, _, _ in indices:
+            count = disk_index.finish_rebuild(states[name])
+            if stdout is not None:
+                stdout.write(f'Indexed {count} {name}\n')
+
+    def update_posts(self, ids):
+        self._update(self.posts, posts_for_index(), post_document, ids)
+
+    def delete_posts(self, ids):
+        self.posts.write([('delete', pk) for pk in ids])
+
+    def update_authors(self, ids):
+        if self.posts.exists():
+            self.update_posts(posts_for_index().filter(author_id__in=ids).values_list('pk', flat=True))
+
+    def update_users(self, ids):
+        self._update(self.users, users_for_index(), user_document, ids)
+
+    def delete_users(self, ids):
+        self.users.write([('delete', pk) for pk in ids])
+
+    def _update(self, disk_index, queryset, document, ids):
+        if not disk_index.exists():
+            return
+        ids = set(ids)
+        rows = list(queryset.filter(pk__in=ids))
+        entries = [('put', *document(row)) for row in rows]
+        # rows gone by now are dropped from the index
+        entries += [('delete', pk) for pk in ids - {row.pk for row in rows}]
+        disk_index.write(entries)
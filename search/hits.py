@@ -0,0 +1,216 @@
+from datetime import date, datetime
+from django.utils.dateparse import parse_datetime
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+
+""" Search results served from the index
+
+Post and user documents store everything the results page and the search API
+display, so a search is answered from the hits' ``_source`` without touching
+the database. PostHit and UserHit are the shapes both of them render; they
+can also be built from model instances when results are hydrated from the
+database instead (SEARCH_HYDRATION = 'db'). The local backend stores their
+``as_dict()`` as its document source.
+"""
+
+SNIPPET_WORDS = 40
+
+
+def make_snippet(text):
+    return Truncator(text or '').words(SNIPPET_WORDS)
+
+
+def as_datetime(value):
+    if isinstance(value, str):
+        return parse_datetime(value)
+    return value
+
+
+def highlighted(fragments, fallback):
+    """ First highlighted fragment (already HTML escaped by the index) or the escaped fallback """
+    if fragments:
+        return mark_safe(fragments[0])
+    return escape(fallback)
+
+
+class AuthorHit:
+    def __init__(self, id, username, first_name='', last_name=''):
+        self.id = id
+        self.username = username
+        self.first_name = first_name or ''
+        self.last_name = last_name or ''
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+        }
+
+
+class PostHit:
+    def __init__(self, id, title, snippet, author, date_posted, likes_count=0, comments_count=0, highlight=None):
+        self.id = id
+        self.title = title
+        self.snippet = snippet
+        self.author = author
+        self.date_posted = as_datetime(date_posted)
+        self.likes_count = likes_count or 0
+        self.comments_count = comments_count or 0
+        self.highlight = highlight or {}
+
+    @classmethod
+    def from_hit(cls, hit):
+        source = hit.to_dict()
+        author = source.get('author', {})
+        return cls(
+            id=int(hit.meta.id),
+            title=source.get('title', ''),
+            snippet=source.get('snippet') or make_snippet(source.get('content')),
+            author=AuthorHit(author.get('id'), author.get('username', ''),
+                             author.get('first_name'), author.get('last_name')),
+            date_posted=source.get('date_posted'),
+            likes_count=source.get('likes_count'),
+            comments_count=source.get('comments_count'),
+            highlight=hit_highlight(hit),
+        )
+
+    @classmethod
+    def from_dict(cls, data, highlight=None):
+        """ The reverse of ``as_dict`` """
+        author = data.get('author', {})
+        return cls(
+            id=data['id'],
+            title=data.get('title', ''),
+            snippet=data.get('content', ''),
+            author=AuthorHit(author.get('id'), author.get('username', ''),
+                             author.get('first_name'), author.get('last_name')),
+            date_posted=data.get('date_posted'),
+            likes_count=data.get('likes_count'),
+            comments_count=data.get('comments_count'),
+            highlight=highlight,
+        )
+
+    @classmethod
+    def from_post(cls, post):
+        author = post.author
+        return cls(
+            id=post.id,
+            title=post.title,
+            snippet=make_snippet(post.content),
+            author=AuthorHit(author.id, author.username, author.first_name, author.last_name),
+            date_posted=post.date_posted,
+            likes_count=post.likes_count,
+            comments_count=post.comments_count,
+        )
+
+    def with_row(self, post):
+        """ This hit refreshed from its database row, keeping the highlighting """
+        hit = self.from_post(post)
+        hit.highlight = self.highlight
+        return hit
+
+    def title_html(self):
+        return highlighted(self.highlight.get('title'), self.title)
+
+    def snippet_html(self):
+        return highlighted(self.highlight.get('content'), self.snippet)
+
+    def as_dict(self):
+        data = {
+            'id': self.id,
+            'title': self.title,
+            'content': self.snippet,
+            'author': self.author.as_dict(),
+            'date_posted': self.date_posted.isoformat() if isinstance(self.date_posted, (date, datetime)) else None,
+            'likes_count': self.likes_count,
+            'comments_count': self.comments_count,
+        }
+        if self.highlight:
+            data['highlight'] = self.highlight
+        return data
+
+
+class UserHit:
+    def __init__(self, id, username, first_name='', last_name='', email='', date_joined=None,
+                 image_url='', bio='', highlight=None):
+        self.id = id
+        self.username = username
+        self.first_name = first_name or ''
+        self.last_name = last_name or ''
+        self.email = email or ''
+        self.date_joined = as_datetime(date_joined)
+        self.image_url = image_url or ''
+        self.bio = bio or ''
+        self.highlight = highlight or {}
+
+    @classmethod
+    def from_hit(cls, hit):
+        source = hit.to_dict()
+        profile = source.get('profile', {})
+        return cls(
+            id=int(hit.meta.id),
+            username=source.get('username', ''),
+            first_name=source.get('first_name'),
+            last_name=source.get('last_name'),
+            email=source.get('email'),
+            date_joined=source.get('date_joined'),
+            image_url=profile.get('image_url'),
+            bio=profile.get('bio'),
+            highlight=hit_highlight(hit),
+        )
+
+    @classmethod
+    def from_dict(cls, data, highlight=None):
+        """ The reverse of ``as_dict`` """
+        return cls(highlight=highlight, **{key: value for key, value in data.items() if key != 'highlight'})
+
+    @classmethod
+    def from_user(cls, user):
+        profile = getattr(user, 'profile', None)
+        return cls(
+            id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            email=user.email,
+            date_joined=user.date_joined,
+            image_url=profile.image.url if profile and profile.image else '',
+            bio=profile.bio if profile else '',
+        )
+
+    def with_row(self, user):
+        hit = self.from_user(user)
+        hit.highlight = self.highlight
+        return hit
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+    def as_dict(self):
+        data = {
+            'id': self.id,
+            'username': self.username,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'email': self.email,
+            'date_joined': self.date_joined.isoformat() if isinstance(self.date_joined, (date, datetime)) else None,
+            'image_url': self.image_url,
+            'bio': self.bio,
+        }
+        if self.highlight:
+            data['highlight'] = self.highlight
+        return data
+
+
+def hit_highlight(hit):
+    highlight = getattr(hit.meta, 'highlight', None)
+    if not highlight:
+        return {}
+    return {field: list(fragments) for field, fragments in highlight.to_dict().items()}
@@ -0,0 +1,66 @@
+import logging
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.db import transaction
+from myproject.batching import BatchWorker
+from .backends import get_backend
+
+
+""" Batched search index updates
+
+Saves, likes and comments queue ``(method, pk)`` updates once their
+transaction commits; a background worker collects them for
+SEARCH_INDEX_INTERVAL seconds (or SEARCH_INDEX_BATCH updates) and hands
+every backend method its ids in one call, so a burst of fifty likes on a
+post becomes one read of that post and one bulk request to the index.
+"""
+
+logger = logging.getLogger(__name__)
+
+Update = namedtuple('Update', ['method', 'pk'])
+
+# updates of the same document replace each other, the last one wins
+DOCUMENT_KINDS = {
+    'update_posts': 'post',
+    'delete_posts': 'post',
+    'update_users': 'user',
+    'delete_users': 'user',
+    'update_authors': 'author',
+}
+
+
+def apply_updates(updates):
+    latest = OrderedDict()
+    for update in updates:
+        key = (DOCUMENT_KINDS[update.method], update.pk)
+        latest.pop(key, None)
+        latest[key] = update.method
+
+    batches = OrderedDict()
+    for (_, pk), method in latest.items():
+        batches.setdefault(method, []).append(pk)
+
+    backend = get_backend()
+    for method, ids in batches.items():
+        try:
+            getattr(backend, method)(ids)
+        except Exception:
+            # the next rebuild catches up
+            logger.exception('Search backend %s of %d document(s) failed', method, len(ids))
+
+
+indexer = BatchWorker(
+    apply_updates,
+    name='search-index',
+    interval=getattr(settings, 'SEARCH_INDEX_INTERVAL', 1.0),
+    max_batch=getattr(settings, 'SEARCH_INDEX_BATCH', 500),
+)
+
+
+def queue_on_commit(method, ids):
+    """ Queue ``method`` for the documents ``ids`` once the current transaction commits """
+    if not getattr(settings, 'SEARCH_AUTOSYNC', True):
+        return
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: indexer.put_many(Update(method, pk) for pk in ids))
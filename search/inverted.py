@@ -0,0 +1,218 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+""" In-memory inverted index with BM25 scoring
+
+Every document is a set of named text fields. Each field has its own
+postings (term -> {doc_id: term frequency}) and lengths, and a query scores
+documents with BM25 per field, weighted by the field's boost (a simplified
+BM25F). The last query term also matches as a prefix, and terms of three
+characters or more that a field does not contain match its terms with up to
+one (two from six characters) typo, like Elasticsearch's ``fuzziness: AUTO``.
+Prefix and fuzzy matches score lower than exact ones.
+"""
+
+TOKEN_RE = re.compile(r'\w+')
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.5
+FUZZY_WEIGHT = 0.5
+MAX_EXPANSIONS = 50
+
+
+def normalize(text):
+    """ Lower case with the accents stripped, so "Café" matches "cafe" """
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text or ''))
+
+
+def max_edits(term):
+    if len(term) < 3:
+        return 0
+    return 1 if len(term) < 6 else 2
+
+
+def within_distance(a, b, limit):
+    """ Whether the Levenshtein distance between ``a`` and ``b`` is at most ``limit`` """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    # only the cells within ``limit`` of the diagonal can stay within ``limit``
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [i if i <= limit else over] + [over] * len(b)
+        best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cell = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+            current[j] = cell
+            best = min(best, cell)
+        if best > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def highlight(text, terms):
+    """ ``text`` HTML escaped, with the words matching ``terms`` wrapped in <mark> """
+    parts = []
+    last = 0
+    for match in TOKEN_RE.finditer(text or ''):
+        if normalize(match.group()) in terms:
+            parts.append(escape(text[last:match.start()]))
+            parts.append(f'<mark>{escape(match.group())}</mark>')
+            last = match.end()
+    parts.append(escape((text or '')[last:]))
+    return mark_safe(''.join(parts))
+
+
+class FieldIndex:
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        self.total_length = 0
+        # terms per (first character, length), the candidates of a fuzzy match
+        self.buckets = defaultdict(set)
+        self.sorted_terms = None
+
+    def add(self, doc_id, tokens):
+        counts = defaultdict(int)
+        for token in tokens:
+            counts[token] += 1
+        for term, count in counts.items():
+            if term not in self.postings:
+                self.buckets[term[0], len(term)].add(term)
+                self.sorted_terms = None
+            self.postings[term][doc_id] = count
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        return list(counts)
+
+    def remove(self, doc_id, terms):
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+                self.buckets[term[0], len(term)].discard(term)
+                self.sorted_terms = None
+        self.total_length -= self.lengths.pop(doc_id, 0)
+
+    def length_norm(self):
+        """
+        BM25's ``k1 * (1 - b + b * length / average length)`` as a function of
+        a document id. The average comes from the running totals, so writes
+        never make the next search revisit every document.
+        """
+        average = self.total_length / len(self.lengths) if self.lengths else 0
+        if not average:
+            return lambda doc_id: K1
+        lengths = self.lengths
+        return lambda doc_id: K1 * (1 - B + B * lengths[doc_id] / average)
+
+    def with_prefix(self, prefix):
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.postings)
+        start = bisect.bisect_left(self.sorted_terms, prefix)
+        terms = []
+        for term in self.sorted_terms[start:]:
+            if not term.startswith(prefix) or len(terms) >= MAX_EXPANSIONS:
+                break
+            terms.append(term)
+        return terms
+
+    def similar(self, term):
+        """ Indexed terms within ``max_edits`` of ``term``, sharing its first character """
+        limit = max_edits(term)
+        if not limit:
+            return []
+        matches = []
+        for length in range(len(term) - limit, len(term) + limit + 1):
+            for candidate in self.buckets.get((term[0], length), ()):
+                if candidate != term and within_distance(term, candidate, limit):
+                    matches.append(candidate)
+        return matches[:MAX_EXPANSIONS]
+
+
+class InvertedIndex:
+    """
+    Documents are added with ``add(doc_id, {field: text}, source)``;
+    ``fields`` maps the searchable field names to their boost. The source
+    is stored as is and handed back with the search results.
+    """
+    def __init__(self, fields):
+        self.fields = dict(fields)
+        self.field_indexes = {name: FieldIndex() for name in self.fields}
+        self.sources = {}
+        self.doc_terms = {}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def add(self, doc_id, texts, source):
+        self.remove(doc_id)
+        self.doc_terms[doc_id] = {
+            name: index.add(doc_id, tokenize(texts.get(name, '')))
+            for name, index in self.field_indexes.items()
+        }
+        self.sources[doc_id] = source
+
+    def remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for name, index in self.field_indexes.items():
+            index.remove(doc_id, terms.get(name, ()))
+        self.sources.pop(doc_id, None)
+
+    def expand(self, query, fields, prefix=True, fuzzy=True):
+        """ ``{field: {term: weight}}`` of the indexed terms ``query`` matches """
+        tokens = tokenize(query)
+        expanded = {}
+        for name in fields:
+            index = self.field_indexes[name]
+            weights = {}
+            for position, token in enumerate(tokens):
+                if token in index.postings:
+                    weights[token] = 1.0
+                if prefix and position == len(tokens) - 1:
+                    for term in index.with_prefix(token):
+                        weights.setdefault(term, PREFIX_WEIGHT)
+                # typo tolerance for the words the field does not know
+                if fuzzy and token not in index.postings:
+                    for term in index.similar(token):
+                        weights.setdefault(term, FUZZY_WEIGHT)
+            expanded[name] = weights
+        return expanded
+
+    def search(self, query, limit=20, fields=None, prefix=True, fuzzy=True):
+        """ ``[(doc_id, score, matched_terms), ...]`` best first """
+        fields = fields or list(self.fields)
+        expanded = self.expand(query, fields, prefix, fuzzy)
+        documents = len(self.sources)
+        scores = defaultdict(float)
+        for name, weights in expanded.items():
+            index = self.field_indexes[name]
+            norm = index.length_norm()
+            for term, weight in weights.items():
+                docs = index.postings[term]
+                idf = math.log(1 + (documents - len(docs) + 0.5) / (len(docs) + 0.5))
+                factor = self.fields[name] * weight * idf * (K1 + 1)
+                for doc_id, frequency in docs.items():
+                    scores[doc_id] += factor * frequency / (frequency + norm(doc_id))
+
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        matched = {term for weights in expanded.values() for term in weights}
+        return [(doc_id, score, matched) for doc_id, score in ranked]
@@ -1,23 +1,30 @@
 from django.core.management.base import BaseCommand
-from django_elasticsearch_dsl.management.commands import search_index_command
+from search.backends import SearchUnavailable, get_backend
 
 
 class Command(BaseCommand):
-    help = 'Build Elasticsearch search indices'
-    
+    help = 'Build the search indices of a search backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', help='backend to build (default: settings.SEARCH_BACKEND)')
+        parser.add_argument('--resume', action='store_true',
+                            help='continue an interrupted rebuild from its checkpoint')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='rows indexed per bulk request')
+
     def handle(self, *args, **options):
-        self.stdout.write('Building Elasticsearch indices...')
+        backend = get_backend(options['backend'])
+        self.stdout.write(f'Building {backend.name} search indices...')
         
         try:
-            # Use the built-in search_index command
-            search_index_command.Command().handle(action='rebuild', force=True)
+            backend.rebuild(stdout=self.stdout, resume=options['resume'], chunk_size=options['chunk_size'])
             self.stdout.write(
-                self.style.SUCCESS('Successfully built Elasticsearch indices')
+                self.style.SUCCESS(f'Successfully built {backend.name} search indices')
             )
-        except Exception as e:
+        except SearchUnavailable as e:
             self.stdout.write(
                 self.style.ERROR(f'Error building indices: {str(e)}')
             )
-            self.stdout.write(
-                'Make sure Elasticsearch is running on localhost:9200'
-            )
+            if backend.name == 'elasticsearch':
+                self.stdout.write(
+                    'Make sure Elasticsearch is running on localhost:9200'
+                )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from search.analytics import roll_up_history
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily search query roll-ups from the recorded searches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='searches read per batch')
+
+    def handle(self, *args, **options):
+        searches = roll_up_history(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {searches} searches'))
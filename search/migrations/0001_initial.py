@@ -0,0 +1,73 @@
+# Generated by Django 3.2.23 on 2026-10-17 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('results_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchQueryDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('query', models.CharField(max_length=255)),
+                ('searches', models.PositiveIntegerField(default=0)),
+                ('results_total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', '-searches'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchQueryHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('query', models.CharField(max_length=255)),
+                ('searches', models.PositiveIntegerField(default=0)),
+                ('results_total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-hour', '-searches'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchqueryhourly',
+            constraint=models.UniqueConstraint(fields=('hour', 'query'), name='search_hourly_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchquerydaily',
+            constraint=models.UniqueConstraint(fields=('day', 'query'), name='search_daily_unique'),
+        ),
+        migrations.AddField(
+            model_name='searchindex',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='searchindex',
+            index=models.Index(fields=['user', '-timestamp'], name='search_user_time_idx'),
+        ),
+    ]
@@ -1,24 +1,65 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 from blog.models import Post
+from users.models import Profile
+from .hits import make_snippet
 
 
 class SearchIndex(models.Model):
     """Model for tracking search analytics"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     query = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     results_count = models.IntegerField(default=0)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # the user's recent searches
+            models.Index(fields=['user', '-timestamp'], name='search_user_time_idx'),
+        ]
     
     def __str__(self):
         return f"{self.query} - {self.timestamp}"
 
 
+class SearchQueryHourly(models.Model):
+    """Searches per normalized query and hour, rolled up by search.analytics"""
+    hour = models.DateTimeField()
+    query = models.CharField(max_length=255)
+    searches = models.PositiveIntegerField(default=0)
+    results_total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour', '-searches']
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'query'], name='search_hourly_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.query} @ {self.hour}: {self.searches}"
+
+
+class SearchQueryDaily(models.Model):
+    """Searches per normalized query and day, rolled up by search.analytics"""
+    day = models.DateField()
+    query = models.CharField(max_length=255)
+    searches = models.PositiveIntegerField(default=0)
+    results_total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day', '-searches']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'query'], name='search_daily_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.query} @ {self.day}: {self.searches}"
+
+
 # Elasticsearch Document for Posts
 @registry.register_document
 class PostDocument(Document):
@@ -31,9 +72,11 @@ class PostDocument(Document):
     
     title = fields.TextField()
     content = fields.TextField()
+    # stored for display only, results are rendered from the index source
+    snippet = fields.TextField(index=False)
     date_posted = fields.DateField()
-    likes_count = fields.IntegerField(attr='total_likes')
-    comments_count = fields.IntegerField(attr='comments.count')
+    likes_count = fields.IntegerField(attr='likes_count')
+    comments_count = fields.IntegerField(attr='comments_count')
     
     class Index:
         name = 'posts'
@@ -47,6 +90,17 @@ class PostDocument(Document):
         fields = [
             'id',
         ]
+        related_models = [User]
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('author')
+
+    def get_instances_from_related(self, related_instance):
+        """ Renaming a user re-indexes their posts """
+        return related_instance.post_set.all()
+
+    def prepare_snippet(self, instance):
+        return make_snippet(instance.content)
 
 
 # Elasticsearch Document for Users
@@ -57,6 +111,10 @@ class UserDocument(Document):
     last_name = fields.TextField()
     email = fields.TextField()
     date_joined = fields.DateField()
+    profile = fields.ObjectField(properties={
+        'bio': fields.TextField(index=False),
+        'image_url': fields.KeywordField(index=False),
+    })
     
     class Index:
         name = 'users'
@@ -70,3 +128,19 @@ class UserDocument(Document):
         fields = [
             'id',
         ]
+        related_models = [Profile]
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('profile')
+
+    def get_instances_from_related(self, related_instance):
+        return related_instance.user
+
+    def prepare_profile(self, instance):
+        profile = getattr(instance, 'profile', None)
+        if profile is None:
+            return {'bio': '', 'image_url': ''}
+        return {
+            'bio': profile.bio or '',
+            'image_url': profile.image.url if profile.image else '',
+        }
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from blog.models import Comment, Post
+from users.models import Profile
+from .indexing import queue_on_commit
+
+
+""" Keep the search backend in step with posts and users, see search.indexing """
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    queue_on_commit('update_posts', [instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    queue_on_commit('delete_posts', [instance.pk])
+
+
+""" Likes and comments change the stored counts """
+@receiver(m2m_changed, sender=Post.likes.through)
+def post_likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        queue_on_commit('update_posts', list(pk_set) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        queue_on_commit('update_posts', [instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    queue_on_commit('update_posts', [instance.post_id])
+
+
+""" Users, and the author fields stored with their posts """
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    queue_on_commit('update_users', [instance.pk])
+    if not created:
+        queue_on_commit('update_authors', [instance.pk])
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, **kwargs):
+    queue_on_commit('update_users', [instance.user_id])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    queue_on_commit('delete_users', [instance.pk])
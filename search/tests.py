@@ -0,0 +1,453 @@
+import shutil
+import tempfile
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from blog.models import Post
+from search.backends.base import SearchUnavailable, hydrate
+from search import analytics
+from search.backends import local
+from search.backends.local import DiskIndex, LocalBackend
+from search.hits import SNIPPET_WORDS, AuthorHit, PostHit, UserHit
+from search.inverted import InvertedIndex
+from search.models import SearchIndex, SearchQueryDaily, SearchQueryHourly
+from search.typeahead import QUERY_WEIGHT, PrefixTable, Typeahead, suggestion_entries
+from search.views import SUGGESTIONS_LIMIT
+
+FIELDS = {'title': 2.0, 'content': 1.0}
+
+
+def ids(results):
+    return [doc_id for doc_id, _, _ in results]
+
+
+class InvertedIndexTest(SimpleTestCase):
+    """ BM25 per field, weighted by the field boosts """
+
+    def index(self, documents):
+        index = InvertedIndex(FIELDS)
+        for doc_id, (title, content) in documents.items():
+            index.add(doc_id, {'title': title, 'content': content}, {'id': doc_id})
+        return index
+
+    def test_boosted_field_ranks_first(self):
+        index = self.index({1: ('notes', 'about django'), 2: ('django', 'notes')})
+        self.assertEqual(ids(index.search('django')), [2, 1])
+
+    def test_term_frequency_and_length(self):
+        index = self.index({
+            1: ('', 'django django tips'),
+            2: ('', 'django tips'),
+            3: ('', 'django tips and many other words about the web'),
+        })
+        self.assertEqual(ids(index.search('django')), [1, 2, 3])
+
+    def test_rare_terms_weigh_more(self):
+        index = self.index({1: ('', 'python rust'), 2: ('', 'python'), 3: ('', 'python'), 4: ('', 'python go')})
+        self.assertEqual(ids(index.search('python rust'))[0], 1)
+
+    def test_accents_prefix_and_typos(self):
+        index = self.index({1: ('Café society', ''), 2: ('cafeteria', ''), 3: ('wonderland', '')})
+        self.assertEqual(ids(index.search('cafe', prefix=False)), [1])
+        # the exact match ranks above the prefix match
+        self.assertEqual(ids(index.search('cafe')), [1, 2])
+        self.assertEqual(ids(index.search('wondreland')), [3])
+
+    def test_updates_score_like_a_fresh_index(self):
+        index = self.index({1: ('one', 'a b c'), 2: ('two', 'c d'), 3: ('three', 'e')})
+        index.add(2, {'title': 'two', 'content': 'c d e f g'}, {'id': 2})
+        index.remove(3)
+        index.add(4, {'title': 'four', 'content': 'c'}, {'id': 4})
+
+        fresh = self.index({1: ('one', 'a b c'), 2: ('two', 'c d e f g'), 4: ('four', 'c')})
+        self.assertEqual(index.search('c'), fresh.search('c'))
+        content = index.field_indexes['content']
+        self.assertEqual(content.total_length, 3 + 5 + 1)
+
+    def test_removed_documents_are_not_found(self):
+        index = self.index({1: ('gone', ''), 2: ('kept', '')})
+        index.remove(1)
+        self.assertEqual(index.search('gone'), [])
+        self.assertEqual(len(index), 1)
+
+
+class DiskIndexTest(SimpleTestCase):
+    """ A snapshot plus a journal of the writes since, replayed by every other reader """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def disk_index(self):
+        return DiskIndex(self.path, 'posts', FIELDS)
+
+    def search(self, disk_index, query):
+        with disk_index.reading() as index:
+            return ids(index.search(query))
+
+    def test_missing_snapshot(self):
+        disk_index = self.disk_index()
+        disk_index.write([('put', 1, {'title': 'lost'}, {})])
+        with self.assertRaises(SearchUnavailable):
+            self.search(disk_index, 'lost')
+
+    def test_other_readers_replay_the_journal(self):
+        writer, reader = self.disk_index(), self.disk_index()
+        writer.rebuild([(1, {'title': 'first post'}, {'id': 1})])
+        self.assertEqual(self.search(reader, 'post'), [1])
+
+        writer.write([('put', 2, {'title': 'second post'}, {'id': 2}), ('delete', 1)])
+        self.assertEqual(self.search(reader, 'post'), [2])
+        writer.write([('put', 2, {'title': 'renamed'}, {'id': 2})])
+        self.assertEqual(self.search(reader, 'post'), [])
+        self.assertEqual(self.search(reader, 'renamed'), [2])
+
+    def test_snapshot_survives_a_restart(self):
+        writer = self.disk_index()
+        writer.rebuild([(1, {'title': 'kept'}, {'id': 1})])
+        writer.write([('put', 2, {'title': 'journaled'}, {'id': 2})])
+        restarted = self.disk_index()
+        self.assertEqual(self.search(restarted, 'kept'), [1])
+        self.assertEqual(self.search(restarted, 'journaled'), [2])
+
+    @override_settings(SEARCH_LOCAL_COMPACT_BYTES=100)
+    def test_compaction_folds_the_journal_into_the_snapshot(self):
+        writer, reader = self.disk_index(), self.disk_index()
+        writer.rebuild([])
+        self.assertEqual(self.search(reader, 'post'), [])
+        writer.write([('put', doc_id, {'title': f'post {doc_id}'}, {'id': doc_id}) for doc_id in range(1, 6)])
+
+        self.assertEqual(writer.journal_path.stat().st_size, 0)
+        self.assertEqual(sorted(self.search(reader, 'post')), [1, 2, 3, 4, 5])
+        writer.write([('delete', 5)])
+        self.assertEqual(sorted(self.search(reader, 'post')), [1, 2, 3, 4])
+
+
+def post_hit(id, title='title', content='body', highlight=None):
+    return PostHit(id, title, content, AuthorHit(1, 'author'), '2021-05-01T10:00:00+00:00', highlight=highlight)
+
+
+class HitsTest(SimpleTestCase):
+    """ Hits render the same from an index document, a stored dict or a model row """
+
+    def test_fallbacks_are_escaped(self):
+        hit = post_hit(1, title='<b>bold</b> & co', content='<script>alert(1)</script>')
+        self.assertEqual(hit.title_html(), '&lt;b&gt;bold&lt;/b&gt; &amp; co')
+        self.assertEqual(hit.snippet_html(), '&lt;script&gt;alert(1)&lt;/script&gt;')
+
+    def test_highlights_are_used_as_given(self):
+        hit = post_hit(1, title='<b>bold</b>', highlight={'title': ['&lt;b&gt;<mark>bold</mark>', 'later']})
+        self.assertEqual(hit.title_html(), '&lt;b&gt;<mark>bold</mark>')
+        self.assertEqual(hit.snippet_html(), 'body')
+
+    def test_dict_round_trip(self):
+        hit = post_hit(7, highlight={'content': ['<mark>body</mark>']})
+        copy = PostHit.from_dict(hit.as_dict(), highlight=hit.highlight)
+        self.assertEqual(copy.as_dict(), hit.as_dict())
+        self.assertEqual(copy.date_posted.year, 2021)
+
+        user = UserHit(3, 'alice', 'Alice', '', date_joined='2020-01-01T00:00:00+00:00', bio='hi')
+        self.assertEqual(UserHit.from_dict(user.as_dict()).as_dict(), user.as_dict())
+        self.assertEqual(user.get_full_name(), 'Alice')
+
+    def test_index_document_without_a_snippet(self):
+        words = ' '.join(f'word{i}' for i in range(SNIPPET_WORDS + 10))
+        source = {'title': 'long', 'content': words, 'author': {'id': 2, 'username': 'bob'}}
+        highlight = SimpleNamespace(to_dict=lambda: {'content': ('<mark>word1</mark>',)})
+        hit = PostHit.from_hit(SimpleNamespace(to_dict=lambda: source, meta=SimpleNamespace(id='5', highlight=highlight)))
+        self.assertEqual(hit.id, 5)
+        self.assertEqual(len(hit.snippet.split()), SNIPPET_WORDS)
+        self.assertTrue(hit.snippet.endswith('…'))
+        self.assertEqual(hit.highlight, {'content': ['<mark>word1</mark>']})
+        self.assertEqual((hit.likes_count, hit.comments_count, hit.author.username), (0, 0, 'bob'))
+
+
+class HydrateTest(TestCase):
+    """ Hydrated results keep the search order, skip deleted rows and take the current fields """
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', first_name='Ann')
+        self.posts = [Post.objects.create(title=f'post {i}', content='body', author=self.author) for i in range(3)]
+
+    def test_order_and_deleted_rows(self):
+        first, second, third = self.posts
+        hits = [post_hit(post.pk, title='stale', highlight={'title': [f'<mark>{post.pk}</mark>']})
+                for post in (third, first, second)]
+        Post.objects.filter(pk=second.pk).update(title='renamed', likes_count=4)
+        first.delete()
+
+        with CaptureQueriesContext(connection) as ctx:
+            results = hydrate({'posts': hits, 'users': [UserHit(self.author.pk, 'stale'), UserHit(0, 'gone')]})
+        self.assertEqual(len(ctx), 2)
+
+        self.assertEqual([hit.id for hit in results['posts']], [third.pk, second.pk])
+        self.assertEqual([hit.title for hit in results['posts']], ['post 2', 'renamed'])
+        self.assertEqual(results['posts'][1].likes_count, 4)
+        self.assertEqual(results['posts'][1].author.get_full_name(), 'Ann')
+        self.assertEqual(results['posts'][0].title_html(), f'<mark>{third.pk}</mark>')
+        self.assertEqual([hit.username for hit in results['users']], ['author'])
+
+    def test_nothing_to_hydrate(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(hydrate({'posts': []}), {'posts': []})
+        self.assertEqual(len(ctx), 0)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class LocalRebuildTest(TestCase):
+    """ A local rebuild checkpoints every chunk, keeps the old snapshot until it swaps, and replays the journal """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.author = User.objects.create_user('author')
+        self.posts = [Post.objects.create(title=f'post {i}', content='body', author=self.author) for i in range(4)]
+
+    def backend(self):
+        return LocalBackend(self.path)
+
+    def titles(self, backend, query='post'):
+        return sorted(hit.title for hit in backend.search_posts(query, limit=50))
+
+    def post_documents(self, hook):
+        """ Patch the post documents to call ``hook(post)`` before each """
+        document = local.post_document
+
+        def post_document(post):
+            hook(post)
+            return document(post)
+        return mock.patch('search.backends.local.post_document', side_effect=post_document)
+
+    def interrupt_at(self, stop):
+        def hook(post):
+            if post.pk == stop.pk:
+                raise Interrupted
+        return self.post_documents(hook)
+
+    def test_build_command(self):
+        out = StringIO()
+        with override_settings(SEARCH_LOCAL_INDEX_DIR=self.path), mock.patch.dict('search.backends._backends', clear=True):
+            call_command('build_search_index', '--backend', 'local', '--chunk-size', '3', stdout=out)
+        self.assertIn('Indexed 4 posts', out.getvalue())
+        self.assertIn('Indexed 1 users', out.getvalue())
+        self.assertEqual(self.titles(self.backend()), [f'post {i}' for i in range(4)])
+        self.assertFalse(self.backend().posts.building_path.exists())
+
+    def test_resume_continues_after_the_checkpoint(self):
+        backend = self.backend()
+        with self.interrupt_at(self.posts[2]), self.assertRaises(Interrupted):
+            backend.rebuild(chunk_size=1)
+        # nothing to search yet, the progress is kept
+        with self.assertRaises(SearchUnavailable):
+            backend.search_posts('post')
+        self.assertTrue(backend.posts.building_path.exists())
+
+        seen = []
+        out = StringIO()
+        with self.post_documents(seen.append):
+            backend.rebuild(stdout=out, resume=True, chunk_size=1)
+        self.assertEqual(seen, self.posts[2:])
+        self.assertIn(f'Resuming posts after #{self.posts[1].pk}', out.getvalue())
+        self.assertEqual(self.titles(backend), [f'post {i}' for i in range(4)])
+
+    def test_without_resume_it_starts_over(self):
+        backend = self.backend()
+        with self.interrupt_at(self.posts[2]), self.assertRaises(Interrupted):
+            backend.rebuild(chunk_size=1)
+        seen = []
+        with self.post_documents(seen.append):
+            backend.rebuild(chunk_size=1)
+        self.assertEqual(seen, self.posts)
+
+    def test_old_snapshot_is_served_until_the_swap(self):
+        backend, reader = self.backend(), self.backend()
+        backend.rebuild()
+        Post.objects.filter(pk=self.posts[0].pk).update(title='renamed')
+        with self.interrupt_at(self.posts[2]), self.assertRaises(Interrupted):
+            backend.rebuild(chunk_size=1)
+        self.assertEqual(self.titles(reader), [f'post {i}' for i in range(4)])
+
+        backend.rebuild(resume=True)
+        self.assertEqual(self.titles(reader), [f'post {i}' for i in range(1, 4)])
+        self.assertEqual(self.titles(reader, 'renamed'), ['renamed'])
+
+    @override_settings(SEARCH_LOCAL_COMPACT_BYTES=1)
+    def test_updates_made_during_the_rebuild_are_replayed(self):
+        backend, writer = self.backend(), self.backend()
+        backend.rebuild()
+        first, second, _, last = self.posts
+
+        def hook(post):
+            # another process updates rows the rebuild has already read
+            if post.pk == last.pk:
+                Post.objects.filter(pk=first.pk).update(title='renamed')
+                writer.update_posts([first.pk])
+                Post.objects.filter(pk=second.pk).delete()
+                writer.delete_posts([second.pk])
+        with self.post_documents(hook):
+            backend.rebuild(chunk_size=2)
+
+        # not compacted while the rebuild ran, folded into the new snapshot when it swapped
+        self.assertEqual(writer.posts.journal_path.stat().st_size, 0)
+        self.assertEqual(self.titles(self.backend()), ['post 2', 'post 3'])
+        self.assertEqual(self.titles(writer, 'renamed'), ['renamed'])
+        self.assertEqual(self.titles(writer, 'post'), ['post 2', 'post 3'])
+
+
+class PrefixTableTest(SimpleTestCase):
+    """ Completions match the start of a text or of one of its first words, heaviest first """
+
+    def table(self, entries):
+        return PrefixTable(entries)
+
+    def test_prefix_matching(self):
+        table = self.table([('Django tips', 3), ('Café society', 2), ('djangonaut', 1), ('flask', 9)])
+        self.assertEqual(table.complete('dj'), ['Django tips', 'djangonaut'])
+        self.assertEqual(table.complete('DJANGO  T'), ['Django tips'])
+        self.assertEqual(table.complete('cafe'), ['Café society'])
+        # later words complete too
+        self.assertEqual(table.complete('soc'), ['Café society'])
+        self.assertEqual(table.complete('tips'), ['Django tips'])
+        self.assertEqual(table.complete('ps'), [])
+
+    def test_same_text_adds_up(self):
+        table = self.table([('django', 1), ('Django', 1), ('djangonaut', 1.5)])
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.complete('dj'), ['django', 'djangonaut'])
+
+    def test_limit(self):
+        table = self.table([(f'post {i}', i) for i in range(30)])
+        self.assertEqual(table.complete('post', limit=3), ['post 29', 'post 28', 'post 27'])
+        self.assertEqual(len(table.complete('post')), 10)
+        # memoized per limit
+        self.assertEqual(len(table.complete('post', limit=20)), 20)
+
+    def test_empty_prefix(self):
+        table = self.table([('django', 1), ('', 5), ('   ', 5)])
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.complete(''), [])
+        self.assertEqual(table.complete('   '), [])
+
+    def test_stale_table_is_rebuilt(self):
+        tables = [self.table([('old', 1)]), self.table([('older', 1)])]
+        typeahead = Typeahead(build=tables.pop)
+        self.assertEqual(typeahead.suggest('ol'), ['older'])
+        with override_settings(SEARCH_TYPEAHEAD_TTL=0):
+            self.assertEqual(typeahead.suggest('ol'), ['old'])
+
+
+class SuggestionsViewTest(TestCase):
+    """ The suggestions endpoint completes past queries, post titles and usernames """
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('djangofan')
+        for i in range(12):
+            Post.objects.create(title=f'django post {i}', content='body', author=author, likes_count=i)
+        SearchQueryDaily.objects.create(query='django channels', day=timezone.localdate(), searches=3)
+        self.typeahead = Typeahead()
+        patcher = mock.patch('search.views.typeahead', self.typeahead)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def suggestions(self, q):
+        response = self.client.get(reverse('search:search_suggestions'), {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['suggestions']
+
+    def test_weighted_entries(self):
+        entries = dict(suggestion_entries())
+        self.assertEqual(entries['django channels'], 3 * QUERY_WEIGHT)
+        self.assertEqual(entries['django post 11'], 12)
+        self.assertEqual(entries['djangofan'], 1)
+
+    def test_completions_are_limited(self):
+        suggestions = self.suggestions('Djan')
+        self.assertEqual(len(suggestions), SUGGESTIONS_LIMIT)
+        self.assertEqual(suggestions[:3], ['django channels', 'django post 11', 'django post 10'])
+        self.assertEqual(self.suggestions('djangof'), ['djangofan'])
+
+    def test_empty_and_short_queries(self):
+        with mock.patch.object(self.typeahead, 'build') as build:
+            for q in ('', 'd', ' ', '      ', ' d '):
+                self.assertEqual(self.suggestions(q), [])
+            build.assert_not_called()
+
+    def test_responses_are_cached_per_prefix(self):
+        self.assertEqual(len(self.suggestions('django p')), SUGGESTIONS_LIMIT)
+        with mock.patch.object(self.typeahead, 'suggest') as suggest:
+            self.assertEqual(len(self.suggestions('  Django   P')), SUGGESTIONS_LIMIT)
+            suggest.assert_not_called()
+
+
+@override_settings(BATCH_WORKERS_SYNC=True)
+class AnalyticsTest(TestCase):
+    """ Searches are stored in batches with their hourly and daily roll-ups, which a rerun recounts to the same rows """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('searcher')
+        self.morning = timezone.make_aware(timezone.datetime(2021, 5, 1, 9, 15))
+
+    def event(self, query, results=1, hours=0, user=None):
+        timestamp = self.morning + timezone.timedelta(hours=hours)
+        return analytics.SearchEvent(user and user.pk, query, results, timestamp)
+
+    def rollups(self):
+        return (sorted(SearchQueryHourly.objects.values_list('hour', 'query', 'searches', 'results_total')),
+                sorted(SearchQueryDaily.objects.values_list('day', 'query', 'searches', 'results_total')))
+
+    def test_recorded_search_is_persisted(self):
+        analytics.record_search(self.user, 'Django  Tips', 4)
+        analytics.record_search(AnonymousUser(), 'django tips', 2)
+        self.assertCountEqual(SearchIndex.objects.values_list('user_id', 'query', 'results_count'),
+                              [(self.user.pk, 'Django  Tips', 4), (None, 'django tips', 2)])
+        self.assertEqual(SearchQueryDaily.objects.get().searches, 2)
+        self.assertEqual(SearchQueryDaily.objects.get().results_total, 6)
+
+    def test_batch_is_rolled_up_per_hour_and_day(self):
+        analytics.write_events([
+            self.event('Django', 3, user=self.user),
+            self.event(' django ', 1),
+            self.event('django', 2, hours=1),
+            self.event('flask', 0),
+            self.event('   ', 0),
+        ])
+        hourly, daily = self.rollups()
+        nine, ten = (timezone.localtime(self.morning + timezone.timedelta(hours=h)).replace(minute=0)
+                     for h in (0, 1))
+        self.assertEqual(hourly, [(nine, 'django', 2, 4), (nine, 'flask', 1, 0), (ten, 'django', 1, 2)])
+        self.assertEqual(daily, [(self.morning.date(), 'django', 3, 6), (self.morning.date(), 'flask', 1, 0)])
+        self.assertEqual(SearchIndex.objects.count(), 5)
+
+    def test_batches_add_up(self):
+        analytics.write_events([self.event('django', 1)])
+        analytics.write_events([self.event('django', 2), self.event('django', 3, hours=24)])
+        _, daily = self.rollups()
+        next_day = self.morning.date() + timezone.timedelta(days=1)
+        self.assertEqual(daily, [(self.morning.date(), 'django', 2, 3), (next_day, 'django', 1, 3)])
+
+    def test_rollup_command_recounts_to_the_same_rows(self):
+        analytics.write_events([self.event(query, i, hours=i) for i, query in enumerate(['a b', 'A  b', 'c', 'a b', 'c'])])
+        written = self.rollups()
+        SearchQueryDaily.objects.update(searches=99)
+        SearchQueryHourly.objects.filter(query='c').delete()
+        cache.set(analytics.TRENDING_CACHE_KEY, [('stale', 1)])
+
+        for _ in range(2):
+            out = StringIO()
+            call_command('rollup_search_analytics', '--chunk-size', '2', stdout=out)
+            self.assertIn('Rolled up 5 searches', out.getvalue())
+            self.assertEqual(self.rollups(), written)
+        self.assertIsNone(cache.get(analytics.TRENDING_CACHE_KEY))
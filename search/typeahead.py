@@ -0,0 +1,125 @@
+import bisect
+import heapq
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from blog.models import Post
+from .analytics import popular_queries
+from .inverted import normalize
+
+
+""" Typeahead suggestions from an in-memory prefix table
+
+Every worker holds a PrefixTable of popular past queries, post titles and
+usernames, weighted by how often the query was searched, how liked the post
+is, and so on. Completing a prefix is two binary searches over the sorted
+keys plus a top-k of the range, memoized per table. A table older than
+SEARCH_TYPEAHEAD_TTL seconds is rebuilt by the first request that notices,
+while the others keep answering from the old one.
+"""
+
+MAX_QUERIES = 5000
+# past queries are taken from the daily roll-ups of this many days
+QUERY_DAYS = 30
+MAX_TITLES = 5000
+MAX_USERNAMES = 10000
+# a past query is worth this many likes
+QUERY_WEIGHT = 5
+# titles also complete from their first words after the first one
+WORD_STARTS = 8
+MEMO_SIZE = 10000
+
+
+def clean(text):
+    return ' '.join((text or '').split())
+
+
+class PrefixTable:
+    """ ``entries`` are ``(text, weight)``; the same text (up to case and accents) adds up its weights """
+    def __init__(self, entries):
+        merged = {}
+        for text, weight in entries:
+            text = clean(text)
+            key = normalize(text)
+            if not key:
+                continue
+            if key in merged:
+                merged[key][1] += weight
+            else:
+                merged[key] = [text, weight]
+        self.texts = [text for text, _ in merged.values()]
+        self.weights = [weight for _, weight in merged.values()]
+
+        keys = []
+        for position, key in enumerate(merged):
+            words = key.split()
+            for start in range(min(len(words), WORD_STARTS)):
+                keys.append((' '.join(words[start:]), position))
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.positions = [position for _, position in keys]
+        self.memo = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def complete(self, prefix, limit=10):
+        prefix = normalize(clean(prefix))
+        if not prefix:
+            return []
+        if (prefix, limit) in self.memo:
+            return self.memo[prefix, limit]
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + '\U0010ffff')
+        positions = set(self.positions[low:high])
+        best = heapq.nlargest(limit, positions, key=lambda position: (self.weights[position], -position))
+        result = [self.texts[position] for position in best]
+        if len(self.memo) < MEMO_SIZE:
+            self.memo[prefix, limit] = result
+        return result
+
+
+def suggestion_entries():
+    """ ``(text, weight)`` of everything worth suggesting """
+    for query, searches in popular_queries(QUERY_DAYS, MAX_QUERIES):
+        yield query, QUERY_WEIGHT * searches
+    titles = Post.objects.order_by('-likes_count', '-id').values_list('title', 'likes_count')[:MAX_TITLES]
+    for title, likes_count in titles:
+        yield title, 1 + likes_count
+    for username in User.objects.order_by('-last_login').values_list('username', flat=True)[:MAX_USERNAMES]:
+        yield username, 1
+
+
+class Typeahead:
+    def __init__(self, build=None):
+        self.build = build or (lambda: PrefixTable(suggestion_entries()))
+        self.table = None
+        self.built_at = 0
+        self.lock = threading.Lock()
+
+    def ttl(self):
+        return getattr(settings, 'SEARCH_TYPEAHEAD_TTL', 300)
+
+    def get_table(self):
+        if self.table is None:
+            with self.lock:
+                if self.table is None:
+                    self.refresh()
+        elif time.monotonic() - self.built_at > self.ttl() and self.lock.acquire(blocking=False):
+            # one request rebuilds, the others keep using the old table
+            try:
+                self.refresh()
+            finally:
+                self.lock.release()
+        return self.table
+
+    def refresh(self):
+        self.table = self.build()
+        self.built_at = time.monotonic()
+
+    def suggest(self, prefix, limit=10):
+        return self.get_table().complete(prefix, limit)
+
+
+typeahead = Typeahead()
@@ -1,10 +1,15 @@
+from hashlib import md5
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth.models import User
-from django_elasticsearch_dsl.search import Search
-from .models import SearchIndex, PostDocument, UserDocument
+from .analytics import record_search
+from .backends import SearchUnavailable, get_backend, hydrate as hydrate_results
+from .inverted import normalize
+from .models import SearchIndex
+from .typeahead import typeahead
 import json
 
 
@@ -20,20 +25,18 @@ def search_view(request):
     ).order_by('-timestamp')[:10]
     
     if query:
-        # Track search analytics
-        SearchIndex.objects.create(
-            user=request.user,
-            query=query,
-            results_count=0
-        )
-        
-        results = perform_search(query, search_type)
+        try:
+            results = perform_search(query, search_type, highlight=True)
+        except SearchUnavailable:
+            return render(request, 'search/search_results.html', {
+                'query': query,
+                'results': {},
+                'search_type': search_type,
+                'search_unavailable': True,
+            })
         
-        # Update results count
-        SearchIndex.objects.filter(
-            user=request.user,
-            query=query
-        ).update(results_count=len(results))
+        # Track search analytics, written in the background
+        record_search(request.user, query, sum(len(hits) for hits in results.values()))
         
         return render(request, 'search/search_results.html', {
             'query': query,
@@ -46,30 +49,21 @@ def search_view(request):
     })
 
 
-def perform_search(query, search_type='all'):
-    """Perform Elasticsearch search"""
-    results = {}
-    
-    if search_type in ['all', 'posts']:
-        # Search posts
-        post_search = PostDocument.search().query(
-            'multi_match',
-            query=query,
-            fields=['title', 'content', 'author.username', 'author.first_name', 'author.last_name'],
-            fuzziness='AUTO'
-        )
-        results['posts'] = post_search[:20].to_queryset()
-    
-    if search_type in ['all', 'users']:
-        # Search users
-        user_search = UserDocument.search().query(
-            'multi_match',
-            query=query,
-            fields=['username', 'first_name', 'last_name', 'email'],
-            fuzziness='AUTO'
-        )
-        results['users'] = user_search[:20].to_queryset()
-    
+RESULTS_PER_TYPE = 20
+
+
+def perform_search(query, search_type='all', highlight=False, hydrate=None):
+    """
+    Search through settings.SEARCH_BACKEND.
+
+    Results are PostHit / UserHit objects built from what the index stores
+    (no database query), or refreshed from the rows the hits point at when
+    ``hydrate`` (default: settings.SEARCH_HYDRATION) is 'db'.
+    """
+    hydrate = hydrate or getattr(settings, 'SEARCH_HYDRATION', 'source')
+    results = get_backend().search(query, search_type, highlight=highlight, limit=RESULTS_PER_TYPE)
+    if hydrate == 'db':
+        results = hydrate_results(results)
     return results
 
 
@@ -83,42 +77,13 @@ def search_api(request):
             search_type = data.get('type', 'all')
             
             if query:
-                results = perform_search(query, search_type)
+                results = perform_search(query, search_type, highlight=bool(data.get('highlight')))
                 
                 # Convert to serializable format
-                serialized_results = {}
-                
-                if 'posts' in results:
-                    serialized_results['posts'] = [
-                        {
-                            'id': post.id,
-                            'title': post.title,
-                            'content': post.content[:200] + '...' if len(post.content) > 200 else post.content,
-                            'author': {
-                                'id': post.author.id,
-                                'username': post.author.username,
-                                'first_name': post.author.first_name,
-                                'last_name': post.author.last_name,
-                            },
-                            'date_posted': post.date_posted.isoformat(),
-                            'likes_count': getattr(post, 'likes_count', 0),
-                            'comments_count': getattr(post, 'comments_count', 0),
-                        }
-                        for post in results['posts']
-                    ]
-                
-                if 'users' in results:
-                    serialized_results['users'] = [
-                        {
-                            'id': user.id,
-                            'username': user.username,
-                            'first_name': user.first_name,
-                            'last_name': user.last_name,
-                            'email': user.email,
-                            'date_joined': user.date_joined.isoformat(),
-                        }
-                        for user in results['users']
-                    ]
+                serialized_results = {
+                    result_type: [hit.as_dict() for hit in hits]
+                    for result_type, hits in results.items()
+                }
                 
                 return JsonResponse({
                     'success': True,
@@ -137,35 +102,23 @@ def search_api(request):
     return JsonResponse({'success': False, 'error': 'Method not allowed'})
 
 
+SUGGESTIONS_LIMIT = 10
+
+
 def search_suggestions(request):
     """Get search suggestions based on partial query"""
-    query = request.GET.get('q', '')
+    # spaces alone don't make a prefix
+    query = ' '.join(request.GET.get('q', '').split())
     
     if len(query) < 2:
         return JsonResponse({'suggestions': []})
     
-    # Get suggestions from recent searches
-    recent_searches = SearchIndex.objects.filter(
-        query__icontains=query
-    ).values_list('query', flat=True).distinct()[:5]
-    
-    # Get suggestions from post titles
-    post_suggestions = PostDocument.search().query(
-        'prefix',
-        title=query
-    )[:5].to_queryset()
-    
-    # Get suggestions from usernames
-    user_suggestions = UserDocument.search().query(
-        'prefix',
-        username=query
-    )[:5].to_queryset()
-    
-    suggestions = list(recent_searches)
-    suggestions.extend([post.title for post in post_suggestions])
-    suggestions.extend([user.username for user in user_suggestions])
-    
-    # Remove duplicates and limit
-    suggestions = list(set(suggestions))[:10]
+    # Past queries, post titles and usernames from the per-worker prefix table,
+    # whole responses cached per prefix across workers
+    cache_key = 'typeahead:' + md5(normalize(query).encode()).hexdigest()
+    suggestions = cache.get(cache_key)
+    if suggestions is None:
+        suggestions = typeahead.suggest(query, SUGGESTIONS_LIMIT)
+        cache.set(cache_key, suggestions, getattr(settings, 'SEARCH_SUGGESTIONS_CACHE_TIMEOUT', 60))
     
     return JsonResponse({'suggestions': suggestions})
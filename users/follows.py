@@ -0,0 +1,85 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from .models import Profile, follow_changed
+
+
+""" Follow graph
+
+A follow is one row of Profile.following's table, unique per (follower
+profile, followed user). follow() is a single INSERT that a duplicate
+turns into a no-op, unfollow() a single DELETE, and both adjust the stored
+followers_count / following_count of the two profiles in the same
+transaction, so a profile with millions of followers is as cheap to follow
+and to count as any other. Lists page through the follow rows by id, newest
+first, with a cursor instead of an offset.
+"""
+
+Follow = Profile.following.through
+
+# newest follows first
+FOLLOW_ORDERING = ('-id',)
+
+
+def is_following(follower_id, followee_id):
+    return Follow.objects.filter(profile__user_id=follower_id, user_id=followee_id).exists()
+
+
+def _adjust_counts(follower_id, followee_id, delta):
+    """ Both counters in one UPDATE """
+    Profile.objects.filter(user_id__in=[follower_id, followee_id]).update(
+        following_count=Case(When(user_id=follower_id, then=Greatest(F('following_count') + delta, 0)),
+                             default=F('following_count')),
+        followers_count=Case(When(user_id=followee_id, then=Greatest(F('followers_count') + delta, 0)),
+                             default=F('followers_count')),
+    )
+
+
+def follow(follower_profile, followee_id):
+    """ Make ``follower_profile`` follow the user ``followee_id``. False when it already did """
+    if follower_profile.user_id == followee_id:
+        return False
+    try:
+        with transaction.atomic():
+            Follow.objects.create(profile_id=follower_profile.pk, user_id=followee_id)
+            _adjust_counts(follower_profile.user_id, followee_id, 1)
+    except IntegrityError:
+        return False
+    follow_changed.send(sender=Profile, follower_id=follower_profile.user_id,
+                        followee_id=followee_id, following=True)
+    return True
+
+
+def unfollow(follower_profile, followee_id):
+    """ Stop ``follower_profile`` following the user ``followee_id``. False when it did not """
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(profile_id=follower_profile.pk, user_id=followee_id).delete()
+        if deleted:
+            _adjust_counts(follower_profile.user_id, followee_id, -1)
+    if not deleted:
+        return False
+    follow_changed.send(sender=Profile, follower_id=follower_profile.user_id,
+                        followee_id=followee_id, following=False)
+    return True
+
+
+def recount_follows(user_ids):
+    """ Recount the stored follow counters of the profiles of ``user_ids`` from the follow table """
+    def count(**filters):
+        counts = Follow.objects.filter(**filters).order_by().values(*filters).annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(counts), Value(0))
+
+    Profile.objects.filter(user_id__in=user_ids).update(
+        followers_count=count(user_id=OuterRef('user_id')),
+        following_count=count(profile_id=OuterRef('pk')),
+    )
+
+
+def followers(user_id):
+    """ Follow rows of the users following ``user_id``, each with its follower loaded as ``.profile.user`` """
+    return Follow.objects.filter(user_id=user_id).select_related('profile__user')
+
+
+def following(user_id):
+    """ Follow rows of the users ``user_id`` follows, each with the followed user loaded as ``.user.profile`` """
+    return Follow.objects.filter(profile__user_id=user_id).select_related('user__profile')
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.23 on 2026-10-17 17:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_auto_20210403_2153'),
+        # the friendships are copied out of Profile.friends first
+        ('friend', '0002_friendship'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='profile',
+            name='friends',
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_follows(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    Follow = Profile.following.through
+
+    def count(**filters):
+        counts = Follow.objects.filter(**filters).order_by().values(*filters).annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(counts), Value(0))
+
+    Profile.objects.update(
+        followers_count=count(user_id=OuterRef('user_id')),
+        following_count=count(profile_id=OuterRef('pk')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_remove_profile_friends'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_follows, migrations.RunPython.noop),
+    ]
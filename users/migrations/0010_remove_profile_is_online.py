@@ -0,0 +1,17 @@
+# Generated by Django 3.2.23 on 2026-10-17 18:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_profile_follow_counts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='profile',
+            name='is_online',
+        ),
+    ]
@@ -1,13 +1,17 @@
 from django.db import models
+from django.dispatch import Signal
 from django.contrib.auth.models import User
+from friend.graph import friend_graph
+from friend.models import friends_of
 
 """ Model for User Profile """
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    is_online = models.BooleanField(default=False)
     following = models.ManyToManyField(User, related_name="following", blank=True)
-    friends = models.ManyToManyField(User, related_name='my_friends', blank=True)
+    # stored by users.follows, so counting never scans the follow table
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
     bio = models.CharField(default="",blank=True,null=True,max_length=350)
     date_of_birth = models.CharField(blank=True,max_length=150)
     updated = models.DateTimeField(auto_now=True)
@@ -18,17 +22,25 @@ class Profile(models.Model):
     def profile_posts(self):
         return self.user.post_set.all()
 
+    @property
+    def friends(self):
+        return friends_of(self.user_id)
+
     def get_friends(self):
-        return self.friends.all()
+        return self.friends
 
     def get_friends_no(self):
-        return self.friends.all().count()
+        return friend_graph.friend_count(self.user_id)
 
     def __str__(self):
         return f'{self.user.username} Profile'
 
 
 
+# Sent with follower_id, followee_id and following (True on follow) after a follow starts or ends
+follow_changed = Signal()
+
+
 STATUS_CHOICES = (
     ('send','send'),
     ('accepted','accepted')
@@ -0,0 +1,72 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+""" Who is online, kept in the cache
+
+A user is online while their presence key exists. WebSocket connections
+set it on connect and on every heartbeat ping, with a PRESENCE_TTL expiry,
+so a user whose browser or server vanished without closing the socket
+drops offline on their own once the pings stop. A per user connection
+counter lets the last closing socket (or a logout) clear the key at once.
+Nothing here touches the database. The keys live in the default cache,
+which every worker must share (CACHE_REDIS_URL, see myproject.checks):
+a socket's connect, heartbeats and disconnect may each land on a different
+process, and the pages asking who is online on yet another.
+"""
+
+KEY_PREFIX = 'presence:'
+
+
+def ttl():
+    return getattr(settings, 'PRESENCE_TTL', 90)
+
+
+def online_key(user_id):
+    return f'{KEY_PREFIX}online:{user_id}'
+
+
+def connections_key(user_id):
+    return f'{KEY_PREFIX}connections:{user_id}'
+
+
+def heartbeat(user_id):
+    """ Mark ``user_id`` online for the next PRESENCE_TTL seconds """
+    cache.set(online_key(user_id), time.time(), ttl())
+    cache.touch(connections_key(user_id), ttl())
+
+
+def connected(user_id):
+    cache.add(connections_key(user_id), 0, ttl())
+    try:
+        cache.incr(connections_key(user_id))
+    except ValueError:
+        # expired in between
+        cache.set(connections_key(user_id), 1, ttl())
+    heartbeat(user_id)
+
+
+def disconnected(user_id):
+    """ Close one connection; the last one takes the user offline """
+    try:
+        remaining = cache.decr(connections_key(user_id))
+    except ValueError:
+        remaining = 0
+    if remaining <= 0:
+        went_offline(user_id)
+
+
+def went_offline(user_id):
+    cache.delete_many([online_key(user_id), connections_key(user_id)])
+
+
+def online_user_ids(user_ids):
+    """ The subset of ``user_ids`` that is online, in one cache read """
+    user_ids = list(user_ids)
+    found = cache.get_many([online_key(user_id) for user_id in user_ids])
+    return {user_id for user_id in user_ids if online_key(user_id) in found}
+
+
+def is_online(user_id):
+    return cache.get(online_key(user_id)) is not None
@@ -0,0 +1,67 @@
+from collections import namedtuple
+from django.db.models import Q
+from friend.friend_request_status import FriendRequestStatus
+from friend.graph import friend_graph
+from friend.models import FriendRequest
+from .models import Profile
+
+
+""" What the viewer is to a list of users
+
+resolve_relationships answers, for every user id at once, whether the
+viewer follows them, is their friend, or has a friend request pending
+either way: one query for the follows, one for the pending requests, and
+friendship from the in-memory friend graph, however many users are asked
+about.
+"""
+
+RelationshipState = namedtuple('RelationshipState', [
+    'user_id', 'is_self', 'following', 'is_friend', 'request_sent', 'pending_friend_request_id',
+])
+
+
+def stranger(user_id, is_self=False):
+    return RelationshipState(user_id, is_self, False, False, FriendRequestStatus.NO_REQUEST_SENT.value, None)
+
+
+def resolve_relationships(viewer, user_ids):
+    """ ``{user_id: RelationshipState}`` of ``viewer`` to each of ``user_ids`` """
+    user_ids = set(user_ids)
+    if not viewer.is_authenticated:
+        return {user_id: stranger(user_id) for user_id in user_ids}
+    others = user_ids - {viewer.pk}
+
+    following = set()
+    sent, received = {}, {}
+    if others:
+        following = set(
+            Profile.following.through.objects
+            .filter(profile__user_id=viewer.pk, user_id__in=others)
+            .values_list('user_id', flat=True)
+        )
+        requests = FriendRequest.objects.filter(is_active=True).filter(
+            Q(sender_id=viewer.pk, receiver_id__in=others) | Q(receiver_id=viewer.pk, sender_id__in=others)
+        ).values_list('pk', 'sender_id', 'receiver_id')
+        for pk, sender_id, receiver_id in requests:
+            if sender_id == viewer.pk:
+                sent[receiver_id] = pk
+            else:
+                received[sender_id] = pk
+
+    states = {}
+    for user_id in user_ids:
+        if user_id == viewer.pk:
+            states[user_id] = stranger(user_id, is_self=True)
+            continue
+        is_friend = friend_graph.are_friends(viewer.pk, user_id)
+        request_sent, pending = FriendRequestStatus.NO_REQUEST_SENT.value, None
+        if not is_friend:
+            # a request from them comes first, as it is the one the viewer can act on
+            if user_id in received:
+                request_sent, pending = FriendRequestStatus.THEM_SENT_TO_YOU.value, received[user_id]
+            elif user_id in sent:
+                request_sent = FriendRequestStatus.YOU_SENT_TO_THEM.value
+        states[user_id] = RelationshipState(
+            user_id, False, user_id in following, is_friend, request_sent, pending,
+        )
+    return states
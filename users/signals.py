@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, m2m_changed
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile, Relationship
-from friend.models import FriendList
+from .follows import recount_follows
+from .models import Profile, Relationship, follow_changed
+from friend.models import FriendList, FriendRequest, befriend, friendship_changed
+from .suggestions import forget_suggestions
 
 """ Creating profile when an user creates an account """
 @receiver(post_save, sender=User)
@@ -11,25 +13,52 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
-""" Saving profile when an user updates his/her account """
-@receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
-
-
 @receiver(post_save, sender=Relationship)
 def post_save_add_to_friends(sender, created, instance, **kwargs):
     sender_ = instance.sender
     receiver_ = instance.receiver
     if instance.status == 'accepted':
-        sender_.friends.add(receiver_.user)
-        receiver_.friends.add(sender_.user)
-        sender_.save()
-        receiver_.save()
+        befriend(sender_.user_id, receiver_.user_id)
 
 
 """ Creating friendlist when an user creates an account """
 @receiver(post_save, sender=User)
 def create_friendlist(sender, instance, created, **kwargs):
     if created:
-        FriendList.objects.create(user=instance)
\ No newline at end of file
+        FriendList.objects.create(user=instance)
+
+
+""" Follows written through Profile.following directly (admin, shell): recount and announce them """
+@receiver(m2m_changed, sender=Profile.following.through)
+def following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        # user.following.add(profile): instance is the followed user
+        edges = [(follower_id, instance.pk) for follower_id in
+                 Profile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True)]
+    else:
+        edges = [(instance.user_id, followee_id) for followee_id in pk_set]
+
+    recount_follows({user_id for edge in edges for user_id in edge})
+    for follower_id, followee_id in edges:
+        follow_changed.send(sender=Profile, follower_id=follower_id, followee_id=followee_id,
+                            following=action == 'post_add')
+
+
+""" Drop cached follow suggestions when a user follows someone, gains a friend or a request changes """
+@receiver(follow_changed)
+def follow_changed_suggestions(sender, follower_id, **kwargs):
+    forget_suggestions(follower_id)
+
+
+@receiver(friendship_changed)
+def friendship_changed_suggestions(sender, user_ids, **kwargs):
+    for user_id in user_ids:
+        forget_suggestions(user_id)
+
+
+@receiver(post_save, sender=FriendRequest)
+def friend_request_suggestions(sender, instance, **kwargs):
+    forget_suggestions(instance.sender_id)
+    forget_suggestions(instance.receiver_id)
@@ -0,0 +1,95 @@
+import random
+from itertools import islice
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Max, Min
+from friend.graph import friend_graph
+from friend.models import FriendRequest, friends_q
+from .models import Profile
+
+
+SUGGESTION_COUNT = 3
+POOL_SIZE = 50
+
+
+def cache_timeout():
+    return getattr(settings, 'SUGGESTIONS_CACHE_TIMEOUT', 600)
+
+
+def cache_key(user_id):
+    return f'suggestions:{user_id}'
+
+
+def followed_ids(user_id):
+    """ Subquery of the ids of the users ``user_id`` follows """
+    return Profile.following.through.objects.filter(profile__user_id=user_id).values('user_id')
+
+
+def pending_ids(user_id):
+    """ Subqueries of the ids of the users ``user_id`` has an open friend request with, either way """
+    requests = FriendRequest.objects.filter(is_active=True)
+    return (requests.filter(sender_id=user_id).values('receiver_id'),
+            requests.filter(receiver_id=user_id).values('sender_id'))
+
+
+def friends_of_friends(user_id, limit=POOL_SIZE):
+    """ Ids of friends of friends not yet known to ``user_id``, most mutual friends first """
+    known = set(followed_ids(user_id).values_list('user_id', flat=True))
+    sent, received = pending_ids(user_id)
+    known.update(sent.values_list('receiver_id', flat=True), received.values_list('sender_id', flat=True))
+    ranked = (pk for pk, _ in friend_graph.friends_of_friends(user_id) if pk not in known)
+    return list(islice(ranked, limit))
+
+
+def random_user_ids(count, exclude_user_id=None, exclude_ids=()):
+    """
+    Up to ``count`` user ids from a random point of the id range. Reads an
+    index range instead of the whole table, so it costs the same for any
+    number of users.
+    """
+    users = User.objects.filter(is_active=True)
+    if exclude_user_id is not None:
+        sent, received = pending_ids(exclude_user_id)
+        users = users.exclude(pk=exclude_user_id).exclude(friends_q(exclude_user_id)) \
+                     .exclude(pk__in=followed_ids(exclude_user_id)) \
+                     .exclude(pk__in=sent).exclude(pk__in=received)
+    if exclude_ids:
+        users = users.exclude(pk__in=exclude_ids)
+
+    bounds = User.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    start = random.randint(bounds['low'], bounds['high'])
+    ids = list(users.filter(pk__gte=start).order_by('pk').values_list('pk', flat=True)[:count])
+    if len(ids) < count:
+        # wrap around to the beginning of the range
+        ids += users.filter(pk__lt=start).order_by('pk').values_list('pk', flat=True)[:count - len(ids)]
+    return ids
+
+
+def candidate_pool(user_id):
+    """ Friends of friends ranked by mutual friends, topped up with random users """
+    pool = friends_of_friends(user_id)
+    if len(pool) < POOL_SIZE:
+        pool += random_user_ids(POOL_SIZE - len(pool), exclude_user_id=user_id, exclude_ids=pool)
+    return pool
+
+
+def suggested_users(user, count=SUGGESTION_COUNT):
+    """ ``count`` users ``user`` may want to follow, drawn from a per user cached pool """
+    if not user.is_authenticated:
+        ids = random_user_ids(count)
+    else:
+        key = cache_key(user.pk)
+        pool = cache.get(key)
+        if pool is None:
+            pool = candidate_pool(user.pk)
+            cache.set(key, pool, cache_timeout())
+        ids = random.sample(pool, min(count, len(pool)))
+    users = User.objects.in_bulk(ids)
+    return [users[pk] for pk in ids if pk in users]
+
+
+def forget_suggestions(user_id):
+    cache.delete(cache_key(user_id))
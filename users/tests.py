@@ -1,3 +1,283 @@
-from django.test import TestCase
+import time
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from friend.friend_request_status import FriendRequestStatus
+from friend.models import FriendRequest, befriend
+from . import presence, suggestions
+from .follows import FOLLOW_ORDERING, Follow, follow, followers, following, is_following, recount_follows, unfollow
+from .models import Profile, follow_changed
+from .relationships import resolve_relationships
 
-# Create your tests here.
+
+class FollowTest(TestCase):
+    """ follow() and unfollow() are idempotent and keep the stored counters exact """
+
+    def setUp(self):
+        self.alice, self.bob, self.carol = [User.objects.create_user(name) for name in ('alice', 'bob', 'carol')]
+
+    def counts(self, user):
+        profile = Profile.objects.get(user=user)
+        return profile.followers_count, profile.following_count
+
+    def test_follow_counts_once(self):
+        self.assertTrue(follow(self.alice.profile, self.bob.pk))
+        self.assertFalse(follow(self.alice.profile, self.bob.pk))
+        self.assertTrue(is_following(self.alice.pk, self.bob.pk))
+        self.assertFalse(is_following(self.bob.pk, self.alice.pk))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.counts(self.alice), (0, 1))
+        self.assertEqual(self.counts(self.bob), (1, 0))
+
+    def test_unfollow_counts_once(self):
+        follow(self.alice.profile, self.bob.pk)
+        self.assertTrue(unfollow(self.alice.profile, self.bob.pk))
+        self.assertFalse(unfollow(self.alice.profile, self.bob.pk))
+        self.assertFalse(is_following(self.alice.pk, self.bob.pk))
+        self.assertEqual(self.counts(self.alice), (0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0))
+
+    def test_following_oneself_is_refused(self):
+        self.assertFalse(follow(self.alice.profile, self.alice.pk))
+        self.assertEqual(self.counts(self.alice), (0, 0))
+
+    def test_only_real_changes_are_signalled(self):
+        received = []
+
+        def receiver(sender, follower_id, followee_id, following, **kwargs):
+            received.append((follower_id, followee_id, following))
+        follow_changed.connect(receiver)
+        self.addCleanup(follow_changed.disconnect, receiver)
+
+        follow(self.alice.profile, self.bob.pk)
+        follow(self.alice.profile, self.bob.pk)
+        unfollow(self.alice.profile, self.bob.pk)
+        unfollow(self.alice.profile, self.bob.pk)
+        self.assertEqual(received, [(self.alice.pk, self.bob.pk, True), (self.alice.pk, self.bob.pk, False)])
+
+    def test_lists_are_newest_first(self):
+        follow(self.alice.profile, self.carol.pk)
+        follow(self.bob.profile, self.carol.pk)
+        follow(self.alice.profile, self.bob.pk)
+        self.assertEqual([row.profile.user for row in followers(self.carol.pk).order_by(*FOLLOW_ORDERING)], [self.bob, self.alice])
+        self.assertEqual([row.user for row in following(self.alice.pk).order_by(*FOLLOW_ORDERING)], [self.bob, self.carol])
+
+    def test_direct_writes_are_recounted(self):
+        self.alice.profile.following.add(self.bob, self.carol)
+        self.assertEqual(self.counts(self.alice), (0, 2))
+        self.assertEqual(self.counts(self.carol), (1, 0))
+        self.carol.following.remove(self.alice.profile)
+        self.assertEqual(self.counts(self.alice), (0, 1))
+        self.assertEqual(self.counts(self.carol), (0, 0))
+
+    def test_recount_repairs_drifted_counters(self):
+        follow(self.alice.profile, self.bob.pk)
+        Profile.objects.filter(user=self.bob).update(followers_count=7)
+        Profile.objects.filter(user=self.carol).update(following_count=3)
+        recount_follows([self.alice.pk, self.bob.pk, self.carol.pk])
+        self.assertEqual(self.counts(self.alice), (0, 1))
+        self.assertEqual(self.counts(self.bob), (1, 0))
+        self.assertEqual(self.counts(self.carol), (0, 0))
+
+
+@override_settings(PRESENCE_TTL=60)
+class PresenceTest(TestCase):
+    """ Online while a socket keeps sending heartbeats, offline once the last one closes or the pings stop """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='secret')
+
+    def test_online_until_the_last_connection_closes(self):
+        presence.connected(self.user.pk)
+        presence.connected(self.user.pk)
+        presence.disconnected(self.user.pk)
+        self.assertTrue(presence.is_online(self.user.pk))
+        presence.disconnected(self.user.pk)
+        self.assertFalse(presence.is_online(self.user.pk))
+        self.assertIsNone(cache.get(presence.connections_key(self.user.pk)))
+
+    def test_extra_disconnect_is_harmless(self):
+        presence.disconnected(self.user.pk)
+        self.assertFalse(presence.is_online(self.user.pk))
+        presence.connected(self.user.pk)
+        self.assertTrue(presence.is_online(self.user.pk))
+
+    def test_offline_once_the_heartbeats_stop(self):
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            presence.connected(self.user.pk)
+        with mock.patch('time.time', return_value=now + 50):
+            presence.heartbeat(self.user.pk)
+        with mock.patch('time.time', return_value=now + 100):
+            self.assertTrue(presence.is_online(self.user.pk))
+        with mock.patch('time.time', return_value=now + 111):
+            self.assertFalse(presence.is_online(self.user.pk))
+            # the counter expired with it, a new socket starts over
+            presence.connected(self.user.pk)
+            self.assertEqual(cache.get(presence.connections_key(self.user.pk)), 1)
+
+    def test_online_user_ids(self):
+        others = [User.objects.create_user(name) for name in ('bob', 'carol')]
+        presence.connected(self.user.pk)
+        presence.heartbeat(others[1].pk)
+        self.assertEqual(presence.online_user_ids([self.user.pk] + [user.pk for user in others]),
+                         {self.user.pk, others[1].pk})
+        self.assertEqual(presence.online_user_ids([]), set())
+
+    def test_login_and_logout(self):
+        self.assertTrue(self.client.login(username='alice', password='secret'))
+        self.assertTrue(presence.is_online(self.user.pk))
+        self.client.logout()
+        self.assertFalse(presence.is_online(self.user.pk))
+
+
+class SuggestionsTest(TestCase):
+    """ Suggestions leave out oneself, friends, followed users and open requests, and refresh when those change """
+
+    def setUp(self):
+        cache.clear()
+        names = ('me', 'friend', 'fof', 'followed', 'requested', 'requester', 'stranger')
+        users = {name: User.objects.create_user(name) for name in names}
+        for name, user in users.items():
+            setattr(self, name, user)
+        User.objects.create_user('inactive', is_active=False)
+        befriend(self.me.pk, self.friend.pk)
+        for name in ('fof', 'followed', 'requested', 'requester'):
+            befriend(self.friend.pk, users[name].pk)
+        follow(self.me.profile, self.followed.pk)
+        FriendRequest.objects.create(sender=self.me, receiver=self.requested)
+        FriendRequest.objects.create(sender=self.requester, receiver=self.me)
+        # answered requests no longer count
+        FriendRequest.objects.create(sender=self.stranger, receiver=self.me, is_active=False)
+
+    def test_friends_of_friends_leave_out_known_users(self):
+        self.assertEqual(suggestions.friends_of_friends(self.me.pk), [self.fof.pk])
+
+    def test_random_users_leave_out_known_users(self):
+        ids = suggestions.random_user_ids(50, exclude_user_id=self.me.pk)
+        self.assertEqual(set(ids), {self.fof.pk, self.stranger.pk})
+        self.assertEqual(suggestions.random_user_ids(50, exclude_user_id=self.me.pk, exclude_ids=[self.fof.pk]),
+                         [self.stranger.pk])
+
+    def test_pool_ranks_friends_of_friends_first(self):
+        self.assertEqual(suggestions.candidate_pool(self.me.pk), [self.fof.pk, self.stranger.pk])
+        for _ in range(5):
+            self.assertCountEqual(suggestions.suggested_users(self.me), [self.fof, self.stranger])
+
+    def test_pool_is_cached(self):
+        suggestions.suggested_users(self.me)
+        self.assertEqual(cache.get(suggestions.cache_key(self.me.pk)), [self.fof.pk, self.stranger.pk])
+        # a direct write is not seen until the pool expires or is forgotten
+        User.objects.filter(pk=self.stranger.pk).update(is_active=False)
+        self.assertCountEqual(suggestions.suggested_users(self.me), [self.fof, self.stranger])
+        suggestions.forget_suggestions(self.me.pk)
+        self.assertEqual(suggestions.suggested_users(self.me), [self.fof])
+
+    def test_pool_is_refreshed_when_relations_change(self):
+        key = suggestions.cache_key(self.me.pk)
+        changes = [
+            lambda: follow(self.me.profile, self.stranger.pk),
+            lambda: FriendRequest.objects.create(sender=self.fof, receiver=self.me),
+            lambda: FriendRequest.objects.filter(sender=self.me).get().cancel(),
+            lambda: befriend(self.me.pk, self.requester.pk),
+        ]
+        for change in changes:
+            suggestions.suggested_users(self.me)
+            self.assertIsNotNone(cache.get(key))
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertIsNone(cache.get(key))
+        self.assertEqual(suggestions.candidate_pool(self.me.pk), [self.requested.pk])
+
+    def test_anonymous_users_get_random_users(self):
+        users = suggestions.suggested_users(AnonymousUser())
+        self.assertEqual(len(users), suggestions.SUGGESTION_COUNT)
+        self.assertTrue(all(user.is_active for user in users))
+
+
+class RelationshipsTest(TestCase):
+    """ One page of users is resolved in the same few queries however long it is """
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user('viewer', password='secret')
+        names = ('followed', 'friend', 'requested', 'requester', 'stale', 'stranger')
+        for name in names:
+            setattr(self, name, User.objects.create_user(name))
+        follow(self.viewer.profile, self.followed.pk)
+        follow(self.viewer.profile, self.friend.pk)
+        befriend(self.viewer.pk, self.friend.pk)
+        befriend(self.viewer.pk, self.stale.pk)
+        FriendRequest.objects.create(sender=self.viewer, receiver=self.requested)
+        self.request = FriendRequest.objects.create(sender=self.requester, receiver=self.viewer)
+        # left over from before they were friends
+        FriendRequest.objects.create(sender=self.stale, receiver=self.viewer)
+        FriendRequest.objects.create(sender=self.stranger, receiver=self.viewer, is_active=False)
+
+    def add_users(self, count):
+        for i in range(count):
+            user = User.objects.create_user(f'user{i}')
+            follow(self.viewer.profile, user.pk)
+            FriendRequest.objects.create(sender=user, receiver=self.viewer)
+
+    def test_flags(self):
+        users = [self.viewer, self.followed, self.friend, self.requested, self.requester, self.stale, self.stranger]
+        states = resolve_relationships(self.viewer, [user.pk for user in users])
+        flags = {user.username: (states[user.pk].is_self, states[user.pk].following, states[user.pk].is_friend,
+                                 FriendRequestStatus(states[user.pk].request_sent).name,
+                                 states[user.pk].pending_friend_request_id) for user in users}
+        self.assertEqual(flags, {
+            'viewer': (True, False, False, 'NO_REQUEST_SENT', None),
+            'followed': (False, True, False, 'NO_REQUEST_SENT', None),
+            'friend': (False, True, True, 'NO_REQUEST_SENT', None),
+            'requested': (False, False, False, 'YOU_SENT_TO_THEM', None),
+            'requester': (False, False, False, 'THEM_SENT_TO_YOU', self.request.pk),
+            'stale': (False, False, True, 'NO_REQUEST_SENT', None),
+            'stranger': (False, False, False, 'NO_REQUEST_SENT', None),
+        })
+
+    def test_anonymous_viewer(self):
+        with CaptureQueriesContext(connection) as ctx:
+            states = resolve_relationships(AnonymousUser(), [self.friend.pk, self.followed.pk])
+        self.assertEqual(len(ctx), 0)
+        self.assertFalse(any(state.following or state.is_friend for state in states.values()))
+
+    def test_constant_queries(self):
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        resolve_relationships(self.viewer, user_ids)
+        with CaptureQueriesContext(connection) as small:
+            resolve_relationships(self.viewer, user_ids[:3])
+        self.add_users(20)
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as large:
+            states = resolve_relationships(self.viewer, user_ids)
+        # the follows and the pending requests, friendship comes from the in-memory graph
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), 2)
+        self.assertEqual(sum(state.following for state in states.values()), 22)
+        self.assertEqual(sum(state.pending_friend_request_id is not None for state in states.values()), 21)
+
+    def test_profile_list_view(self):
+        self.client.login(username='viewer', password='secret')
+        url = reverse('profile-list-view')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url)
+        self.add_users(20)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(large), len(small))
+
+        profiles = {profile.user.username: profile.relationship for profile in response.context['profiles']}
+        self.assertEqual(len(profiles), 26)
+        self.assertNotIn('viewer', profiles)
+        self.assertTrue(profiles['friend'].is_friend)
+        self.assertTrue(profiles['user7'].following)
+        self.assertEqual(profiles['requested'].request_sent, FriendRequestStatus.YOU_SENT_TO_THEM.value)
+        self.assertEqual(profiles['requester'].pending_friend_request_id, self.request.pk)
+        self.assertFalse(profiles['stranger'].following)
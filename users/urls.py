@@ -5,6 +5,8 @@ urlpatterns = [
     path('all/', views.ProfileListView.as_view(), name='profile-list-view'),
     path('follow/', views.follow_unfollow_profile, name='follow-unfollow-view'),
     path('<int:pk>/', views.ProfileDetailView.as_view(), name='profile-detail-view'),
+    path('<int:pk>/followers/', views.follow_list, {'direction': 'followers'}, name='profile-followers'),
+    path('<int:pk>/following/', views.follow_list, {'direction': 'following'}, name='profile-following'),
     path('public-profile/<str:username>/', views.public_profile, name='public-profile'),
     
 ]
\ No newline at end of file
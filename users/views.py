@@ -1,5 +1,6 @@
-from friend.models import FriendList, FriendRequest
-from django.shortcuts import render,redirect
+from friend.graph import friend_graph
+from friend.models import FriendRequest
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
@@ -9,22 +10,23 @@ from django.views.generic import ListView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.dispatch import receiver 
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from notification.models import Notification
+from notification.services import notify, retract
 import requests
 from django.conf import settings
-from friend.utils import get_friend_request_or_false
-from friend.friend_request_status import FriendRequestStatus
+from blog.pagination import CursorPaginationMixin, CursorPaginator
+from . import presence
+from .follows import FOLLOW_ORDERING, follow, followers, following, is_following, unfollow
+from .relationships import resolve_relationships
 
 
 @receiver(user_logged_in)
 def got_online(sender, user, request, **kwargs):    
-    user.profile.is_online = True
-    user.profile.save()
+    presence.heartbeat(user.pk)
 
 @receiver(user_logged_out)
 def got_offline(sender, user, request, **kwargs):   
-    user.profile.is_online = False
-    user.profile.save()
+    if user is not None:
+        presence.went_offline(user.pk)
 
 
 
@@ -34,20 +36,41 @@ def follow_unfollow_profile(request):
     if request.method == 'POST':
         my_profile = Profile.objects.get(user = request.user)
         pk = request.POST.get('profile_pk')
-        obj = Profile.objects.get(pk=pk)
-
-        if obj.user in my_profile.following.all():
-            my_profile.following.remove(obj.user)
-            notify = Notification.objects.filter(sender=request.user, notification_type=2)
-            notify.delete()
-        else:
-            my_profile.following.add(obj.user)
-            notify = Notification(sender=request.user, user=obj.user, notification_type=2)
-            notify.save()
-        return redirect(request.META.get('HTTP_REFERER'))
+        obj = get_object_or_404(Profile, pk=pk)
+
+        if is_following(request.user.pk, obj.user_id):
+            if unfollow(my_profile, obj.user_id):
+                retract(obj.user_id, request.user, 2)
+        elif follow(my_profile, obj.user_id):
+            notify(obj.user_id, request.user, 2)
+        return redirect(request.META.get('HTTP_REFERER') or 'profile-detail-view', pk=obj.pk)
     return redirect('profile-list-view')
 
 
+FOLLOWS_PER_PAGE = 50
+
+
+""" Followers / followed users of a profile, newest first """
+@login_required
+def follow_list(request, pk, direction):
+    profile = get_object_or_404(Profile.objects.select_related('user'), pk=pk)
+    if direction == 'followers':
+        rows = followers(profile.user_id)
+    else:
+        rows = following(profile.user_id)
+    page = CursorPaginator(rows, FOLLOWS_PER_PAGE, FOLLOW_ORDERING).page(request.GET.get('cursor'))
+    if direction == 'followers':
+        profiles = [row.profile for row in page]
+    else:
+        profiles = [row.user.profile for row in page]
+    return render(request, 'users/follow_list.html', {
+        'object': profile,
+        'direction': direction,
+        'profiles': profiles,
+        'page_obj': page,
+    })
+
+
 """ User account creation """
 def register(request):
     if request.method == 'POST':
@@ -110,13 +133,23 @@ def public_profile(request, username):
 
 
 """ All user profiles """
-class ProfileListView(LoginRequiredMixin,ListView):
+class ProfileListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Profile
     template_name = "users/all_profiles.html"
     context_object_name = "profiles"
+    paginate_by = 50
+    cursor_ordering = ('user__username', 'id')
 
     def get_queryset(self):
-        return Profile.objects.all().exclude(user=self.request.user)
+        return Profile.objects.select_related('user').exclude(user=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        profiles = context['profiles']
+        states = resolve_relationships(self.request.user, [profile.user_id for profile in profiles])
+        for profile in profiles:
+            profile.relationship = states[profile.user_id]
+        return context
 
 """ User profile details view """
 class ProfileDetailView(LoginRequiredMixin,DetailView):
@@ -129,62 +162,28 @@ class ProfileDetailView(LoginRequiredMixin,DetailView):
 
     def get_object(self,**kwargs):
         pk = self.kwargs.get("pk")
-        view_profile = Profile.objects.get(pk=pk)
-        return view_profile
+        return get_object_or_404(Profile.objects.select_related('user'), pk=pk)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        view_profile = self.get_object()
-        my_profile = Profile.objects.get(user=self.request.user)
-        if view_profile.user in my_profile.following.all():
-            follow = True
-        else:
-            follow = False
-        context["follow"] = follow
+        view_profile = self.object
+        account = view_profile.user
+        user = self.request.user
+        state = resolve_relationships(user, [account.pk])[account.pk]
+        context["follow"] = state.following
 
         # FRIENDS START
 
-        account = view_profile.user
-        try:
-            friend_list = FriendList.objects.get(user=account)
-        except FriendList.DoesNotExist:
-            friend_list = FriendList(user=account)
-            friend_list.save()
-        friends = friend_list.friends.all()
-        context['friends']=friends
-
-        is_self = True
-        is_friend = False
-        request_sent = FriendRequestStatus.NO_REQUEST_SENT.value
+        context['friend_count'] = friend_graph.friend_count(account.pk)
+        context['is_online'] = presence.is_online(account.pk)
         friend_requests = None
-        user=self.request.user
-        if user.is_authenticated and user!=account:
-            is_self = False
-            if friends.filter(pk=user.id):
-                is_friend = True
-            else:
-                is_friend = False
-                # CASE 1: request from them to you
-                if get_friend_request_or_false(sender=account, receiver=user) != False:
-                    request_sent = FriendRequestStatus.THEM_SENT_TO_YOU.value
-                    context['pending_friend_request_id'] = get_friend_request_or_false(sender=account, receiver=user).pk
-                # CASE 2: request you sent to them
-                elif get_friend_request_or_false(sender=user, receiver=account) != False:
-                    request_sent = FriendRequestStatus.YOU_SENT_TO_THEM.value
-                # CASE 3: no request has been sent
-                else:
-                    request_sent = FriendRequestStatus.NO_REQUEST_SENT.value
-
-        elif not user.is_authenticated:
-            is_self = False
-        else:
-            try:
-                friend_requests = FriendRequest.objects.filter(receiver=user, is_active=True)
-            except:
-                pass
-        context['request_sent'] = request_sent
-        context['is_friend'] = is_friend
-        context['is_self'] = is_self
+        if state.is_self:
+            friend_requests = FriendRequest.objects.filter(receiver=user, is_active=True)
+        if state.pending_friend_request_id is not None:
+            context['pending_friend_request_id'] = state.pending_friend_request_id
+        context['request_sent'] = state.request_sent
+        context['is_friend'] = state.is_friend
+        context['is_self'] = state.is_self
         context['friend_requests'] = friend_requests
         # FRIENDS END
         
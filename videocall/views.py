@@ -5,8 +5,10 @@ import random
 import time
 from agora_token_builder import RtcTokenBuilder
 
-from friend.models import FriendList
+from friend.graph import friend_graph
+from friend.models import friends_of
 from .models import RoomMember
+from users.presence import online_user_ids
 import json
 from django.views.decorators.csrf import csrf_exempt
 
@@ -14,9 +16,10 @@ from django.views.decorators.csrf import csrf_exempt
 # Create your views here.
 
 def lobby(request):
-    friends = FriendList.objects.filter(user=request.user)[0].friends.all()
+    friends = list(friends_of(request.user.id))
     context = {
-        'friends':friends
+        'friends':friends,
+        'online_user_ids':online_user_ids(friend.pk for friend in friends),
     }
     return render(request, 'videocall/lobby.html', context)
 
@@ -42,9 +45,7 @@ def room(request):
     #     redirect('vc-lobby')
 
 def validateVC(request,vc_to):
-    friends = FriendList.objects.filter(user=request.user)[0].friends.all()
-    id_list = list(friends.values_list('id',flat=True))
-    if vc_to in id_list:
+    if friend_graph.are_friends(request.user.id, vc_to):
         return True
     else:
         return False